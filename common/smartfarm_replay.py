@@ -0,0 +1,291 @@
+"""
+Format colonnaire des relevés SmartFarm, partagé par la gateway, send-data.py et les outils du service IA.
+
+    pip install ./common
+    python -m smartfarm_replay convert sensor_data_raw_dirty.csv sensor_data_raw_dirty.replay
+    python -m smartfarm_replay info sensor_data_raw_dirty.replay
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Format colonnaire : un dossier avec les valeurs brutes (memory-mappables) et l'index des timestamps
+#   meta.json       colonnes, nombre de lignes, liste des devices (écrit en dernier : dossier complet)
+#   values.bin      float64 [lignes x colonnes], triées par timestamp puis cluster_id
+#   devices.bin     int32 [lignes], indice du device dans meta.json
+#   timestamps.npy  int64 (ns) des timestamps distincts, triés
+#   offsets.npy     int64 [timestamps + 1], première ligne de chaque timestamp
+COLUMNAR_VERSION = 1
+ID_COLUMNS = ('cluster_id', 'timestamp')
+
+
+def is_columnar(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def read_columns(path):
+    """Colonnes du fichier, sans le charger"""
+    if is_columnar(path):
+        return list(ID_COLUMNS) + ColumnarReplay(path).columns
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def iter_timestamp_groups(path, chunksize=50000, reorder_window=0):
+    """
+    Lecture en streaming d'un CSV de relevés : génère (timestamp, DataFrame) dans l'ordre
+    chronologique, avec une mémoire bornée (un chunk + quelques paquets).
+
+    Le fichier est supposé trié par temps. `reorder_window` autorise un désordre borné :
+    les `reorder_window` derniers timestamps vus restent en attente avant d'être émis.
+    Les lignes qui arrivent après l'émission de leur timestamp sont ignorées (avec un avertissement).
+    """
+    pending = {}      # timestamp -> liste de morceaux de DataFrame
+    last_emitted = None
+    late_rows = 0
+
+    def emit(timestamps):
+        nonlocal last_emitted
+        for ts in timestamps:
+            parts = pending.pop(ts)
+            group = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+            last_emitted = ts
+            yield ts, group.sort_values('cluster_id', kind='stable')
+
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk['timestamp'] = pd.to_datetime(chunk['timestamp'])
+
+        if last_emitted is not None:
+            late = chunk['timestamp'] <= last_emitted
+            if late.any():
+                late_rows += int(late.sum())
+                print(f"⚠️ {int(late.sum())} lignes arrivées trop tard (<= {last_emitted}), ignorées")
+                chunk = chunk[~late]
+
+        for ts, part in chunk.groupby('timestamp', sort=False):
+            pending.setdefault(ts, []).append(part)
+
+        # On garde en attente le dernier timestamp (peut continuer dans le chunk suivant)
+        # plus la fenêtre de réordonnancement
+        ready = sorted(pending)[:max(0, len(pending) - (reorder_window + 1))]
+        yield from emit(ready)
+
+    yield from emit(sorted(pending))
+
+    if late_rows:
+        print(f"⚠️ Total des lignes ignorées (hors fenêtre de réordonnancement) : {late_rows}")
+
+
+def read_device_ids(path, chunksize=500000):
+    """Liste des clusters présents dans le fichier (lecture de la seule colonne cluster_id)"""
+    if is_columnar(path):
+        return sorted(ColumnarReplay(path).devices)
+    device_ids = set()
+    for chunk in pd.read_csv(path, usecols=['cluster_id'], chunksize=chunksize):
+        device_ids.update(chunk['cluster_id'].unique())
+    return sorted(device_ids)
+
+
+class ColumnarWriter:
+    """
+    Écriture en streaming d'un dossier colonnaire, paquet par paquet (timestamps croissants).
+    meta.json n'est écrit qu'à close() : un dossier interrompu reste invalide.
+    """
+
+    def __init__(self, out_dir, columns, source):
+        self.out_dir = out_dir
+        self.columns = list(columns)
+        self.source = os.path.abspath(source)
+        os.makedirs(out_dir, exist_ok=True)
+        self.meta_path = os.path.join(out_dir, "meta.json")
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)  # dossier invalide tant que l'écriture n'est pas terminée
+
+        self.devices = {}
+        self.timestamps = []
+        self.offsets = [0]
+        self.values_file = open(os.path.join(out_dir, "values.bin"), "wb")
+        self.devices_file = open(os.path.join(out_dir, "devices.bin"), "wb")
+
+    def add(self, timestamp, device_ids, values):
+        """Ajoute un paquet : un device par ligne de `values` [devices x colonnes]"""
+        codes = [self.devices.setdefault(device_id, len(self.devices)) for device_id in device_ids]
+        self.devices_file.write(np.asarray(codes, dtype=np.int32).tobytes())
+        self.values_file.write(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        self.timestamps.append(pd.Timestamp(timestamp).value)
+        self.offsets.append(self.offsets[-1] + len(codes))
+
+    def close(self):
+        self.values_file.close()
+        self.devices_file.close()
+        np.save(os.path.join(self.out_dir, "timestamps.npy"), np.asarray(self.timestamps, dtype=np.int64))
+        np.save(os.path.join(self.out_dir, "offsets.npy"), np.asarray(self.offsets, dtype=np.int64))
+
+        meta = {
+            "version": COLUMNAR_VERSION,
+            "source": self.source,
+            "columns": self.columns,
+            "rows": self.offsets[-1],
+            "devices": list(self.devices),
+        }
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp_path, self.meta_path)
+        return meta
+
+
+def convert_to_columnar(csv_path, out_dir, chunksize=50000, reorder_window=0):
+    """
+    Convertit un CSV de relevés au format colonnaire, en streaming (mêmes règles d'ordre que
+    iter_timestamp_groups). Le parsing du CSV n'est payé qu'une fois : les rejeux suivants
+    lisent directement les tableaux binaires.
+    """
+    columns = [c for c in read_columns(csv_path) if c not in ID_COLUMNS]
+    writer = ColumnarWriter(out_dir, columns, csv_path)
+    for ts, group in iter_timestamp_groups(csv_path, chunksize=chunksize, reorder_window=reorder_window):
+        writer.add(ts, group['cluster_id'], group[columns].to_numpy(dtype=np.float64))
+    return writer.close()
+
+
+class ColumnarReplay:
+    """
+    Lecture d'un dossier colonnaire : les valeurs sont memory-mappées (rien n'est chargé
+    à l'avance) et l'index des timestamps permet de démarrer à n'importe quel paquet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != COLUMNAR_VERSION:
+            raise ValueError(f"Version de format colonnaire non supportée : {meta.get('version')}")
+
+        self.columns = meta["columns"]
+        self.devices = np.asarray(meta["devices"], dtype=object)
+        self.timestamps = np.load(os.path.join(path, "timestamps.npy"))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+
+        rows = meta["rows"]
+        if rows:
+            self.values = np.memmap(os.path.join(path, "values.bin"), dtype=np.float64, mode="r",
+                                    shape=(rows, len(self.columns)))
+            self.device_codes = np.memmap(os.path.join(path, "devices.bin"), dtype=np.int32, mode="r",
+                                          shape=(rows,))
+        else:
+            self.values = np.empty((0, len(self.columns)))
+            self.device_codes = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        """Nombre de paquets (timestamps distincts)"""
+        return len(self.timestamps)
+
+    def seek(self, timestamp, after=False):
+        """Indice du premier paquet >= timestamp (> timestamp si after=True)"""
+        side = "right" if after else "left"
+        return int(np.searchsorted(self.timestamps, pd.Timestamp(timestamp).value, side=side))
+
+    def group(self, index):
+        """(timestamp, DataFrame) du paquet `index`, mêmes colonnes que la lecture CSV"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        timestamp = pd.Timestamp(int(self.timestamps[index]))
+        group = pd.DataFrame(np.asarray(self.values[start:end]), columns=self.columns)
+        group.insert(0, 'timestamp', timestamp)
+        group.insert(0, 'cluster_id', self.devices[self.device_codes[start:end]])
+        return timestamp, group
+
+    def iter_groups(self, start=0):
+        for index in range(start, len(self)):
+            yield self.group(index)
+
+
+def iter_replay(path, start=None, after=None, chunksize=50000, reorder_window=0):
+    """
+    Paquets (timestamp, DataFrame) d'un CSV ou d'un dossier colonnaire, à partir du timestamp
+    `start` (inclus) ou après `after` (exclu, pour une reprise). Le format colonnaire saute
+    directement au bon paquet, le CSV doit relire le début du fichier.
+    """
+    if is_columnar(path):
+        replay = ColumnarReplay(path)
+        index = 0
+        if after is not None:
+            index = replay.seek(after, after=True)
+        elif start is not None:
+            index = replay.seek(start)
+        yield from replay.iter_groups(index)
+        return
+
+    start = pd.Timestamp(start) if start is not None else None
+    after = pd.Timestamp(after) if after is not None else None
+    for ts, group in iter_timestamp_groups(path, chunksize=chunksize, reorder_window=reorder_window):
+        if (after is not None and ts <= after) or (start is not None and ts < start):
+            continue
+        yield ts, group
+
+
+class ReplayCursor:
+    """
+    Dernier paquet acquitté d'un rejeu (fichier JSON, écriture atomique), pour reprendre
+    après un arrêt brutal. Le curseur est rattaché au fichier rejoué.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self):
+        """Timestamp du dernier paquet acquitté, ou None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Curseur de rejeu illisible ({self.path}), ignoré : {e}")
+            return None
+        if data.get("source") != self.source:
+            print("ℹ️ Curseur de rejeu créé pour un autre fichier, ignoré.")
+            return None
+        return pd.Timestamp(data["timestamp"])
+
+    def ack(self, timestamp):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "timestamp": pd.Timestamp(timestamp).isoformat()}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversion des relevés au format colonnaire indexé")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="CSV -> dossier colonnaire")
+    convert.add_argument("csv")
+    convert.add_argument("output")
+    convert.add_argument("--chunksize", type=int, default=50000)
+    convert.add_argument("--reorder-window", type=int, default=0)
+
+    info = subparsers.add_parser("info", help="Résumé d'un dossier colonnaire")
+    info.add_argument("path")
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        meta = convert_to_columnar(args.csv, args.output, args.chunksize, args.reorder_window)
+        print(f"✅ {meta['rows']} lignes, {len(meta['devices'])} devices -> {args.output}")
+    else:
+        replay = ColumnarReplay(args.path)
+        print(f"📦 {args.path} : {len(replay.values)} lignes, {len(replay)} paquets, "
+              f"{len(replay.devices)} devices, colonnes {', '.join(replay.columns)}")
+        if len(replay):
+            first, last = pd.Timestamp(int(replay.timestamps[0])), pd.Timestamp(int(replay.timestamps[-1]))
+            print(f"   du {first} au {last}")
+
+
+if __name__ == "__main__":
+    main()
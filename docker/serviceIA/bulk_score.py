@@ -0,0 +1,346 @@
+"""
+Calcul du fieldState sur l'historique, hors ligne, avec le même prédicteur que le service IA.
+
+Sources (lues par morceaux, sans tout charger) :
+- CrateDB : table QuantumLeap mtopeniot.etcluster via /_sql, pagination par clé (time_index, entity_id)
+- fichiers : CSV ou dossier colonnaire (createData.py, smartfarm_replay), par paquets de timestamps entiers
+
+Les morceaux sont prédits en parallèle (--workers processus) puis écrits dans l'ordre :
+- csv     : fichier entity_id, timestamp, fieldState, modelVersion
+- table   : table CrateDB à part (mtopeniot.etcluster_fieldstate), upsert par (entity, time, version)
+- update  : réécriture de la colonne fieldstate de mtopeniot.etcluster (UPDATE groupés)
+
+Un curseur (JSON) est enregistré après chaque morceau écrit : relancer la même commande reprend
+là où elle s'était arrêtée. Il est supprimé à la fin du traitement.
+
+    python bulk_score.py crate --crate-url http://localhost:4200 --sink table --registry models
+    python bulk_score.py file saison.replay --sink csv --output saison_fieldstate.csv --workers 4
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+import numpy as np
+import pandas as pd
+from smartfarm_replay import ColumnarReplay, is_columnar, iter_replay
+
+import registry
+from predictor import MODEL_PATH, CentroidPredictor
+
+CRATE_URL = os.getenv("CRATE_URL", "http://localhost:4200")
+SOURCE_TABLE = "mtopeniot.etcluster"
+SIDE_TABLE = "mtopeniot.etcluster_fieldstate"
+CHUNK_ROWS = 50000
+
+
+# --- Prédiction (processus de calcul) ---
+
+_predictor = None
+
+
+def _init_worker(path):
+    global _predictor
+    _predictor = CentroidPredictor.load(path)
+
+
+def _score(values):
+    return _predictor.predict(values).astype(np.int8)
+
+
+class ParallelScorer:
+    """Prédit les morceaux dans un pool de processus, en gardant l'ordre et au plus 2 morceaux par processus en vol"""
+
+    def __init__(self, model_path, workers):
+        self.workers = workers
+        if workers > 1:
+            self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path,))
+        else:
+            self.pool = None
+            _init_worker(model_path)
+
+    def map(self, chunks):
+        """(morceau, labels) pour chaque morceau (ids, timestamps, valeurs, position)"""
+        if self.pool is None:
+            for chunk in chunks:
+                yield chunk, _score(chunk[2])
+            return
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, self.pool.submit(_score, chunk[2])))
+            if len(pending) >= 2 * self.workers:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+# --- Sources : morceaux (entity_ids, timestamps en ms, valeurs [n x features], position de reprise) ---
+
+def crate_sql(client, url, stmt, args=None, bulk_args=None):
+    body = {"stmt": stmt}
+    if bulk_args is not None:
+        body["bulk_args"] = bulk_args
+    elif args is not None:
+        body["args"] = args
+    response = client.post(f"{url}/_sql", json=body)
+    if response.status_code != 200:
+        raise RuntimeError(f"CrateDB {response.status_code}: {response.text}")
+    return response.json()
+
+
+def iter_crate(client, url, features, position, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    """Lignes de mtopeniot.etcluster triées par (time_index, entity_id), page après page"""
+    columns = [f.lower() for f in features]  # QuantumLeap met les noms de colonnes en minuscules
+    last_time, last_id = (position["time_index"], position["entity_id"]) if position else (None, None)
+    while True:
+        conditions, args = [], []
+        if last_time is not None:
+            conditions.append("(time_index > ? OR (time_index = ? AND entity_id > ?))")
+            args += [last_time, last_time, last_id]
+        if start is not None:
+            conditions.append("time_index >= ?")
+            args.append(start)
+        if end is not None:
+            conditions.append("time_index < ?")
+            args.append(end)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        stmt = (f"SELECT entity_id, time_index, {', '.join(columns)} FROM {SOURCE_TABLE} {where}"
+                f"ORDER BY time_index, entity_id LIMIT ?")
+        rows = crate_sql(client, url, stmt, args + [chunk_rows])["rows"]
+        if not rows:
+            return
+        page = pd.DataFrame(rows, columns=["entity_id", "time_index"] + columns)
+        last_time, last_id = int(page["time_index"].iloc[-1]), page["entity_id"].iloc[-1]
+        yield (page["entity_id"].to_numpy(dtype=object), page["time_index"].to_numpy(dtype=np.int64),
+               page[columns].to_numpy(dtype=float), {"time_index": last_time, "entity_id": last_id})
+        if len(rows) < chunk_rows:
+            return
+
+
+def iter_files(path, features, position, start=None, end=None, chunk_rows=CHUNK_ROWS):
+    """Relevés d'un CSV ou d'un dossier colonnaire, par morceaux d'au moins chunk_rows lignes (timestamps entiers)"""
+    after = pd.Timestamp(position["timestamp"]) if position else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    if is_columnar(path):
+        replay = ColumnarReplay(path)
+        columns = [replay.columns.index(f) for f in features]
+        first = replay.seek(after, after=True) if after is not None else (replay.seek(start) if start else 0)
+        last = replay.seek(end) if end is not None else len(replay)
+        index = first
+        while index < last:
+            stop = min(int(np.searchsorted(replay.offsets, replay.offsets[index] + chunk_rows, side="left")), last)
+            stop = max(stop, index + 1)
+            rows_start, rows_end = replay.offsets[index], replay.offsets[stop]
+            timestamps = np.repeat(replay.timestamps[index:stop] // 1_000_000, np.diff(replay.offsets[index:stop + 1]))
+            yield (replay.devices[replay.device_codes[rows_start:rows_end]], timestamps,
+                   np.asarray(replay.values[rows_start:rows_end])[:, columns],
+                   {"timestamp": pd.Timestamp(int(replay.timestamps[stop - 1])).isoformat()})
+            index = stop
+        return
+
+    groups, size = [], 0
+    for ts, group in iter_replay(path, start=start, after=after):
+        if end is not None and ts >= end:
+            break
+        groups.append(group)
+        size += len(group)
+        if size >= chunk_rows:
+            yield _file_chunk(groups, features)
+            groups, size = [], 0
+    if groups:
+        yield _file_chunk(groups, features)
+
+
+def _file_chunk(groups, features):
+    frame = pd.concat(groups, ignore_index=True)
+    timestamps = frame['timestamp'].to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    return (frame['cluster_id'].to_numpy(dtype=object), timestamps, frame[features].to_numpy(dtype=float),
+            {"timestamp": frame['timestamp'].iloc[-1].isoformat()})
+
+
+# --- Destinations ---
+
+class CsvSink:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def open(self, position):
+        """Reprise : le fichier est tronqué à la taille enregistrée avec le curseur"""
+        size = position.get("output_bytes", 0) if position else 0
+        if os.path.exists(self.path) and size:
+            with open(self.path, "r+b") as f:
+                f.truncate(size)
+        self.file = open(self.path, "a" if size else "w", encoding="utf-8", newline="")
+        if not size:
+            self.file.write("entity_id,timestamp,fieldState,modelVersion\n")
+
+    def write(self, entity_ids, timestamps, labels, version):
+        frame = pd.DataFrame({
+            "entity_id": entity_ids,
+            "timestamp": np.datetime_as_string(np.asarray(timestamps).astype("datetime64[ms]"), unit="ms"),
+            "fieldState": labels,
+            "modelVersion": version,
+        })
+        frame.to_csv(self.file, header=False, index=False)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def position(self):
+        return {"output_bytes": self.file.tell()}
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class CrateSink:
+    """Écritures groupées (bulk_args) dans CrateDB ; rejouer un morceau ne crée pas de doublon"""
+
+    def __init__(self, client, url, mode, batch_rows=5000):
+        self.client = client
+        self.url = url
+        self.mode = mode
+        self.batch_rows = batch_rows
+
+    def open(self, position):
+        if self.mode == "table":
+            crate_sql(self.client, self.url,
+                      f"CREATE TABLE IF NOT EXISTS {SIDE_TABLE} (entity_id TEXT, time_index TIMESTAMP WITH TIME ZONE, "
+                      "fieldstate INTEGER, model_version TEXT, PRIMARY KEY (entity_id, time_index, model_version))")
+
+    def write(self, entity_ids, timestamps, labels, version):
+        if self.mode == "table":
+            stmt = (f"INSERT INTO {SIDE_TABLE} (entity_id, time_index, fieldstate, model_version) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (entity_id, time_index, model_version) DO UPDATE SET fieldstate = excluded.fieldstate")
+            bulk = [[e, int(t), int(s), version] for e, t, s in zip(entity_ids, timestamps, labels)]
+        else:
+            stmt = f"UPDATE {SOURCE_TABLE} SET fieldstate = ? WHERE entity_id = ? AND time_index = ?"
+            bulk = [[int(s), e, int(t)] for e, t, s in zip(entity_ids, timestamps, labels)]
+        for start in range(0, len(bulk), self.batch_rows):
+            results = crate_sql(self.client, self.url, stmt, bulk_args=bulk[start:start + self.batch_rows])
+            failed = sum(1 for r in results.get("results", []) if r.get("rowcount", 0) < 0)
+            if failed:
+                print(f"⚠️ {failed} écritures refusées par CrateDB dans ce lot")
+
+    def position(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+# --- Curseur de reprise ---
+
+class BulkCursor:
+    """Position du dernier morceau écrit (fichier JSON, écriture atomique), propre à une source et un modèle"""
+
+    def __init__(self, path, source, model_version):
+        self.path = path
+        self.key = {"source": source, "model_version": model_version}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None, 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Curseur illisible ({self.path}), ignoré : {e}")
+            return None, 0
+        if {k: data.get(k) for k in self.key} != self.key:
+            print("ℹ️ Curseur créé pour une autre source ou un autre modèle, ignoré.")
+            return None, 0
+        return data["position"], data.get("rows", 0)
+
+    def save(self, position, rows):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**self.key, "position": position, "rows": rows}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def to_epoch_ms(value):
+    return None if value is None else int(pd.Timestamp(value).value // 1_000_000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fieldState de l'historique, par morceaux et en parallèle")
+    parser.add_argument("source", choices=["crate", "file"])
+    parser.add_argument("path", nargs="?", help="CSV ou dossier colonnaire (source file)")
+    parser.add_argument("--crate-url", default=CRATE_URL)
+    parser.add_argument("--sink", choices=["csv", "table", "update"], default="table")
+    parser.add_argument("--output", default="fieldstate_history.csv", help="Fichier de sortie (--sink csv)")
+    parser.add_argument("--model", default=MODEL_PATH, help="Prédicteur .npz (sans --registry)")
+    parser.add_argument("--registry", default=os.getenv("MODEL_REGISTRY"), help="Registre : version active")
+    parser.add_argument("--start", help="Premier instant traité (inclus)")
+    parser.add_argument("--end", help="Dernier instant traité (exclu)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processus de prédiction")
+    parser.add_argument("--cursor", default="bulk_score.cursor.json", help="Curseur de reprise")
+    parser.add_argument("--restart", action="store_true", help="Ignorer le curseur et tout recalculer")
+    args = parser.parse_args()
+
+    if args.source == "file" and not args.path:
+        parser.error("la source file attend un CSV ou un dossier colonnaire")
+
+    version, model_path = registry.active_model(args.registry) if args.registry else (None, None)
+    if model_path is None:
+        version, model_path = "local", args.model
+    features = CentroidPredictor.load(model_path).features
+    print(f"🧠 Modèle {version} ({model_path})")
+
+    source = f"crate:{args.crate_url}" if args.source == "crate" else os.path.abspath(args.path)
+    cursor = BulkCursor(args.cursor, source, version)
+    position, total = (None, 0) if args.restart else cursor.load()
+    if position:
+        print(f"♻️ Reprise après {total} lignes ({position})")
+
+    client = httpx.Client(timeout=60.0) if args.source == "crate" or args.sink != "csv" else None
+    sink = CsvSink(args.output) if args.sink == "csv" else CrateSink(client, args.crate_url, args.sink)
+    sink.open(position)
+
+    if args.source == "crate":
+        chunks = iter_crate(client, args.crate_url, features, position, to_epoch_ms(args.start),
+                            to_epoch_ms(args.end), args.chunk_rows)
+    else:
+        chunks = iter_files(args.path, features, position, args.start, args.end, args.chunk_rows)
+
+    scorer = ParallelScorer(model_path, args.workers)
+    started = time.perf_counter()
+    done = skipped = 0
+    try:
+        for (entity_ids, timestamps, values, chunk_position), labels in scorer.map(chunks):
+            valid = np.isfinite(values).all(axis=1)  # relevé incomplet : pas d'état calculé
+            sink.write(entity_ids[valid], timestamps[valid], labels[valid], version)
+            done += len(labels)
+            skipped += int((~valid).sum())
+            cursor.save({**chunk_position, **sink.position()}, total + done)
+            elapsed = time.perf_counter() - started
+            print(f"📦 {total + done} lignes ({done / elapsed:,.0f} lignes/s), {skipped} incomplètes ignorées")
+    finally:
+        scorer.close()
+        sink.close()
+        if client is not None:
+            client.close()
+
+    cursor.clear()
+    print(f"✅ {done} lignes traitées en {time.perf_counter() - started:.1f} s ({skipped} incomplètes)")
+
+
+if __name__ == "__main__":
+    main()
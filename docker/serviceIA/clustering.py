@@ -1,8 +1,13 @@
+import os
+
 import pandas as pd
 import joblib
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 
+from predictor import MODEL_PATH, export_model
+from registry import publish
+
 # 1. Chargement
 df = pd.read_csv('donnees_spatiales_cluster.csv')
 
@@ -29,6 +34,12 @@ kmeans.fit(X_scaled)
 # 5. Sauvegarde
 joblib.dump(kmeans, 'field_state_model_full.pkl')
 joblib.dump(scaler, 'field_scaler_full.pkl')
+# Version NumPy utilisée par le service (scaler intégré aux centroïdes)
+export_model(kmeans, scaler, features, MODEL_PATH)
+if os.getenv("MODEL_REGISTRY"):
+    # Publication dans le registre : le service IA bascule dessus sans redémarrer
+    version = publish(os.getenv("MODEL_REGISTRY"), MODEL_PATH, note="clustering.py")
+    print(f"📦 Modèle publié en {version} dans {os.getenv('MODEL_REGISTRY')}")
 
 print(f"✅ Modèle entraîné avec {len(features)} capteurs !")
 print("Centres des clusters (Moyennes par état) :")
@@ -1,215 +1,344 @@
+import argparse
+import math
+from datetime import datetime, timedelta
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from scipy.interpolate import Rbf  # Pour l'interpolation spatiale fluide
+
+from smartfarm_replay import ColumnarWriter, iter_replay
+
+from spatial import idw
 
 # ==========================================
 # 1. CONFIGURATION DE LA GRILLE
 # ==========================================
-np.random.seed(42)
+SEED = 42
 GRID_SIZE_X = 100  # Taille du champ en mètres
 GRID_SIZE_Y = 100
 N_CLUSTERS = 10    # Nombre de capteurs
+GRID_ROWS = 2      # Grille par défaut, agrandie automatiquement si elle ne suffit pas
+GRID_COLS = 5
+MAX_JITTER = 8     # Décalage max (m) d'un capteur autour du centre de sa case
+
+START_DATE = datetime(2025, 12, 10, 0, 0, 0)
+DURATION_DAYS = 4
+SAMPLES_PER_DAY = 48
+REWET_DAYS = 10    # Le sol sèche lentement puis est réhumidifié (pluie / irrigation) tous les N jours
+
+CHUNK_ROWS = 200000  # Lignes générées (et gardées en mémoire) par morceau
+OUTPUT_FILE = 'donnees_spatiales_cluster.csv'
+
+COLUMNS = [
+    'cluster_id', 'timestamp', 'x', 'y', 'temperature', 'soilTemperature', 'humidity', 'soilMoisture',
+    'azote_mg_kg', 'phosphore_mg_kg', 'potassium_mg_kg', 'ph',
+]
+# Noyau de l'inertie thermique du sol (moyenne glissante centrée de la température ambiante)
+SOIL_KERNEL = 5
+
+
+def grid_layout(n_clusters, size_x, size_y, grid=None):
+    """(lignes, colonnes) : la grille demandée, sinon la grille par défaut si elle suffit, sinon une grille au ratio du champ"""
+    if grid is not None:
+        return grid
+    if n_clusters <= GRID_ROWS * GRID_COLS:
+        return GRID_ROWS, GRID_COLS
+    cols = math.ceil(math.sqrt(n_clusters * size_x / size_y))
+    return math.ceil(n_clusters / cols), cols
+
+
+def place_clusters(n_clusters, size_x, size_y, rows, cols, rng):
+    """Un capteur par case (lignes puis colonnes), au centre de la case avec un petit jitter"""
+    if n_clusters > rows * cols:
+        raise ValueError(f"Grille {rows}x{cols} trop petite pour {n_clusters} capteurs")
+    cell_w = size_x / cols
+    cell_h = size_y / rows
+
+    idx = np.arange(n_clusters)
+    r, c = idx // cols, idx % cols
+    # 1. Trouver le centre théorique de la case
+    center_x = (c * cell_w) + (cell_w / 2)
+    center_y = (r * cell_h) + (cell_h / 2)
 
-rows = 2
-cols = 5
-cell_w = GRID_SIZE_X / cols
-cell_h = GRID_SIZE_Y / rows
-
-cluster_coords = {}
-idx = 0
-
-print("📍 Calcul des positions optimales des capteurs...")
-
-for r in range(rows):
-    for c in range(cols):
-        if idx >= N_CLUSTERS: break
-        
-        # 1. Trouver le centre théorique de la case
-        center_x = (c * cell_w) + (cell_w / 2)
-        center_y = (r * cell_h) + (cell_h / 2)
-        
-        # 2. Ajouter un petit "Jitter" (bruit) pour le réalisme
-        # Le capteur peut être décalé de ±8m autour du centre
-        # Ça évite l'effet "robotique" trop parfait
-        final_x = center_x + np.random.uniform(-8, 8)
-        final_y = center_y + np.random.uniform(-8, 8)
-        
-        # Bornage pour rester dans le champ
-        final_x = np.clip(final_x, 0, GRID_SIZE_X)
-        final_y = np.clip(final_y, 0, GRID_SIZE_Y)
-        
-        cluster_id = f'cluster_{idx+1:02d}'
-        cluster_coords[cluster_id] = (final_x, final_y)
-        print(f"   - {cluster_id}: ({final_x:.1f}, {final_y:.1f}) [Zone {r+1}-{c+1}]")
-        idx += 1
+    # 2. Ajouter un petit "Jitter" (bruit) pour le réalisme
+    # Ça évite l'effet "robotique" trop parfait, sans sortir de la case sur les grilles fines
+    jitter = min(MAX_JITTER, 0.4 * min(cell_w, cell_h))
+    x = np.clip(center_x + rng.uniform(-jitter, jitter, n_clusters), 0, size_x)
+    y = np.clip(center_y + rng.uniform(-jitter, jitter, n_clusters), 0, size_y)
+
+    # Largeur fixe des numéros : l'ordre alphabétique des cluster_id reste l'ordre des capteurs
+    width = max(2, len(str(n_clusters)))
+    ids = np.array([f'cluster_{i + 1:0{width}d}' for i in idx])
+    return ids, x, y, r, c
 
 # ==========================================
 # 2. DÉFINITION DES POINTS FORCÉS (ANCHORS)
 # ==========================================
 # C'est ici que vous dessinez votre carte de chaleur "logique".
-# Format: (x, y): {'valeur_ref_moyenne': float}
+# Format: (x, y) en fraction de la taille du champ: {'valeur_ref_moyenne': float}
 # Les autres capteurs s'interpoleront entre ces points.
 
 # SCÉNARIO : Une zone sèche en haut à gauche, une zone humide en bas à droite
 ANCHORS = {
     # Coin Haut-Gauche (Sec & Chaud)
-    (10, 90): {
+    (0.1, 0.9): {
         'temp_offset': 2.0,      # +2°C par rapport à la moyenne
         'hum_sol_offset': -10.0, # -10% d'humidité (Sec)
         'N_offset': -15.0        # Pauvre en Azote
     },
     # Coin Bas-Droit (Frais & Humide)
-    (90, 10): {
+    (0.9, 0.1): {
         'temp_offset': -1.5,     # -1.5°C
         'hum_sol_offset': 10.0,  # +10% d'humidité (Humide)
         'N_offset': 10.0         # Riche en Azote
     },
     # Centre (Neutre)
-    (50, 50): {
+    (0.5, 0.5): {
         'temp_offset': 0.0,
         'hum_sol_offset': 0.0,
         'N_offset': 0.0
     }
 }
 
-# ==========================================
-# 3. GÉNÉRATION TEMPORELLE (Base Cycle)
-# ==========================================
-start_date = datetime(2025, 12, 10, 0, 0, 0)
-duration_days = 4
-samples_per_day = 48
-total_samples = duration_days * samples_per_day
-timestamps = [start_date + timedelta(minutes=30*i) for i in range(total_samples)]
-hours = np.arange(total_samples) / 2
-
-# Fonction générique pour interpoler une valeur à une position (x,y)
-def get_spatial_offset(target_x, target_y, parameter):
+def get_spatial_offsets(x, y, parameter, size_x=GRID_SIZE_X, size_y=GRID_SIZE_Y):
     """
-    Calcule le décalage (offset) pour un point donné en fonction des ancres.
-    Utilise une pondération inverse à la distance (IDW simple).
+    Calcule le décalage (offset) de tous les capteurs d'un coup en fonction des ancres.
+    Utilise une pondération inverse à la distance (IDW simple, poids 1/d²).
     """
-    numerator = 0
-    denominator = 0
-    
-    for (ax, ay), offsets in ANCHORS.items():
-        # Distance euclidienne
-        dist = np.sqrt((target_x - ax)**2 + (target_y - ay)**2) + 0.1 # +0.1 éviter div/0
-        weight = 1 / (dist ** 2) # Poids décroit avec le carré de la distance
-        
-        # Si le paramètre n'est pas défini pour l'ancre, on suppose 0 (neutre)
-        val = offsets.get(parameter, 0.0)
-        
-        numerator += val * weight
-        denominator += weight
-        
-    return numerator / denominator
+    anchor_x = [ax * size_x for ax, _ in ANCHORS]
+    anchor_y = [ay * size_y for _, ay in ANCHORS]
+    # Si le paramètre n'est pas défini pour l'ancre, on suppose 0 (neutre)
+    values = [offsets.get(parameter, 0.0) for offsets in ANCHORS.values()]
+    return idw(x, y, anchor_x, anchor_y, values)
 
 # ==========================================
-# 4. GÉNÉRATION DES DONNÉES
+# 3. GÉNÉRATION DES DONNÉES (par morceaux)
 # ==========================================
-all_data = []
-
-# Base temporelle (Cycle Jour/Nuit standard)
-base_temp_cycle = 20 + 8 * np.sin(2*np.pi*(hours/24) - np.pi/2)
-base_hum_sol_cycle = 60 - (hours * 0.05) # Séchage lent naturel
-base_n_cycle = 135 - (hours * 0.01)
-
-print("Génération des données spatialisées...")
-
-for cluster_id, (cx, cy) in cluster_coords.items():
-    # 1. Calculer les "Personnalités" locales du cluster via interpolation
-    local_temp_offset = get_spatial_offset(cx, cy, 'temp_offset')
-    local_hum_sol_offset = get_spatial_offset(cx, cy, 'hum_sol_offset')
-    local_n_offset = get_spatial_offset(cx, cy, 'N_offset')
-    
-    # 2. Générer les séries temporelles en appliquant ces offsets
-    # On ajoute du bruit aléatoire pour que ce ne soit pas trop parfait
-    
-    # Température
-    temp_ambient = base_temp_cycle + local_temp_offset + np.random.normal(0, 0.5, total_samples)
-    temp_soil = np.convolve(temp_ambient, np.ones(5)/5, mode='same') # Inertie thermique
-    
-    # Humidité
-    # L'humidité ambiante varie peu spatialement (l'air circule), mais le sol oui
-    hum_ambient = 65 - 20 * np.sin(2*np.pi*(hours/24) - np.pi/2) + np.random.normal(0, 2, total_samples)
-    hum_soil = base_hum_sol_cycle + local_hum_sol_offset + np.random.normal(0, 1.0, total_samples)
-    hum_soil = np.clip(hum_soil, 0, 100) # Bornage 0-100%
-    
-    # Nutriments (Azote N, Phosphore P, Potassium K)
-    # On suppose que P et K suivent une logique similaire à N pour simplifier
-    n_val = base_n_cycle + local_n_offset + np.random.normal(0, 1, total_samples)
-    p_val = 30 + (local_n_offset * 0.2) + np.random.normal(0, 0.5, total_samples) # Corrélation légère
-    k_val = 200 + (local_n_offset * 0.5) + np.random.normal(0, 2, total_samples)
-    
-    ph_val = 6.8 + (local_hum_sol_offset * 0.01) + np.random.normal(0, 0.05, total_samples) # Sol humide souvent plus acide/basique selon contexte
-
-    # Création du DataFrame pour ce cluster
-    df_cluster = pd.DataFrame({
-        'cluster_id': cluster_id,
-        'timestamp': timestamps,
-        'x': round(cx, 1), # On garde la coordonnée pour la visualisation
-        'y': round(cy, 1),
-        'temperature': temp_ambient.round(1),
-        'soilTemperature': temp_soil.round(1),
-        'humidity': hum_ambient.round(1),
-        'soilMoisture': hum_soil.round(1),
-        'azote_mg_kg': n_val.round(1),
-        'phosphore_mg_kg': p_val.round(1),
-        'potassium_mg_kg': k_val.round(1),
-        'ph': ph_val.round(2)
-    })
-    
-    all_data.append(df_cluster)
+class FieldGenerator:
+    """
+    Génère les relevés tick par tick, par blocs [ticks x capteurs] vectorisés.
+    Chaque grandeur a son propre flux aléatoire : le résultat ne dépend que de la graine,
+    pas de la taille des morceaux. L'inertie thermique du sol (moyenne glissante centrée)
+    est raccordée d'un morceau à l'autre, comme une convolution sur toute la série.
+    """
+
+    def __init__(self, x, y, start_date, total_samples, samples_per_day, seed, size_x, size_y):
+        self.n = len(x)
+        self.start_date = start_date
+        self.total_samples = total_samples
+        self.step = timedelta(days=1) / samples_per_day
+        self.hours_per_sample = 24 / samples_per_day
+
+        # 1. Calculer les "Personnalités" locales du cluster via interpolation
+        self.temp_offset = get_spatial_offsets(x, y, 'temp_offset', size_x, size_y)
+        self.hum_sol_offset = get_spatial_offsets(x, y, 'hum_sol_offset', size_x, size_y)
+        self.n_offset = get_spatial_offsets(x, y, 'N_offset', size_x, size_y)
+
+        streams = np.random.SeedSequence(seed).spawn(7)
+        (self.rng_temp, self.rng_hum, self.rng_hum_sol, self.rng_n,
+         self.rng_p, self.rng_k, self.rng_ph) = (np.random.default_rng(s) for s in streams)
+
+        # Bords de la moyenne glissante : ticks précédents (0 au début, comme np.convolve mode='same')
+        # et ticks suivants déjà tirés
+        half = SOIL_KERNEL // 2
+        self.temp_before = np.zeros((half, self.n))
+        self.temp_ahead = np.empty((0, self.n))
+
+    def _hours(self, start, end):
+        return np.arange(start, end) * self.hours_per_sample
+
+    def _ambient_temperature(self, start, end):
+        hours = self._hours(start, end)
+        # Base temporelle (Cycle Jour/Nuit standard)
+        base_temp_cycle = 20 + 8 * np.sin(2*np.pi*(hours/24) - np.pi/2)
+        return base_temp_cycle[:, None] + self.temp_offset + self.rng_temp.normal(0, 0.5, (end - start, self.n))
+
+    def chunk(self, start, end):
+        """Relevés des ticks [start, end) : dict colonne -> tableau [ticks x capteurs]"""
+        ticks = end - start
+        half = SOIL_KERNEL // 2
+        hours = self._hours(start, end)
 
-# Fusion finale
-df_final = pd.concat(all_data, ignore_index=True)
-df_final = df_final.sort_values(['timestamp', 'cluster_id'])
+        # Température (tirée jusqu'à `half` ticks d'avance pour l'inertie du sol)
+        ahead_end = min(end + half, self.total_samples)
+        drawn = len(self.temp_ahead)
+        temp = np.vstack([self.temp_ahead, self._ambient_temperature(start + drawn, ahead_end)])
+        padded = np.vstack([self.temp_before, temp, np.zeros((end + half - ahead_end, self.n))])
+        temp_soil = sum(padded[i:i + ticks] for i in range(SOIL_KERNEL)) / SOIL_KERNEL  # Inertie thermique
+        temp_ambient = temp[:ticks]
+        self.temp_ahead = temp[ticks:]
+        self.temp_before = padded[ticks:ticks + half]
 
-# Export
-filename = 'donnees_spatiales_cluster.csv'
-df_final.to_csv(filename, index=False)
+        # Humidité
+        # L'humidité ambiante varie peu spatialement (l'air circule), mais le sol oui
+        hum_ambient = (65 - 20 * np.sin(2*np.pi*(hours/24) - np.pi/2))[:, None] + self.rng_hum.normal(0, 2, (ticks, self.n))
+        base_hum_sol_cycle = 60 - ((hours % (REWET_DAYS * 24)) * 0.05)  # Séchage lent naturel
+        hum_soil = base_hum_sol_cycle[:, None] + self.hum_sol_offset + self.rng_hum_sol.normal(0, 1.0, (ticks, self.n))
+        hum_soil = np.clip(hum_soil, 0, 100)  # Bornage 0-100%
 
-print(f"✅ Terminé ! Fichier '{filename}' généré.")
-print("\n--- Aperçu des offsets spatiaux calculés (Moyenne sur la période) ---")
-summary = df_final.groupby(['cluster_id', 'x', 'y'])[['temperature', 'soilMoisture', 'azote_mg_kg']].mean().reset_index()
-print(summary)
+        # Nutriments (Azote N, Phosphore P, Potassium K)
+        # On suppose que P et K suivent une logique similaire à N pour simplifier
+        base_n_cycle = 135 - (hours * 0.01)
+        n_val = base_n_cycle[:, None] + self.n_offset + self.rng_n.normal(0, 1, (ticks, self.n))
+        p_val = 30 + (self.n_offset * 0.2) + self.rng_p.normal(0, 0.5, (ticks, self.n))  # Corrélation légère
+        k_val = 200 + (self.n_offset * 0.5) + self.rng_k.normal(0, 2, (ticks, self.n))
+
+        ph_val = 6.8 + (self.hum_sol_offset * 0.01) + self.rng_ph.normal(0, 0.05, (ticks, self.n))  # Sol humide souvent plus acide/basique selon contexte
+
+        return {
+            'temperature': temp_ambient.round(1),
+            'soilTemperature': temp_soil.round(1),
+            'humidity': hum_ambient.round(1),
+            'soilMoisture': hum_soil.round(1),
+            'azote_mg_kg': n_val.round(1),
+            'phosphore_mg_kg': p_val.round(1),
+            'potassium_mg_kg': k_val.round(1),
+            'ph': ph_val.round(2),
+        }
+
+    def timestamps(self, start, end):
+        return pd.date_range(self.start_date + start * self.step, periods=end - start, freq=self.step)
+
+
+def generate(output, n_clusters=N_CLUSTERS, size_x=GRID_SIZE_X, size_y=GRID_SIZE_Y, grid=None,
+             start_date=START_DATE, days=DURATION_DAYS, samples_per_day=SAMPLES_PER_DAY, seed=SEED,
+             output_format="csv", chunk_rows=CHUNK_ROWS):
+    """Écrit le fichier morceau par morceau (CSV, ou dossier colonnaire lisible par la gateway)"""
+    rng = np.random.default_rng(seed)
+    rows, cols = grid_layout(n_clusters, size_x, size_y, grid)
+    print(f"📍 Calcul des positions optimales des {n_clusters} capteurs (grille {rows}x{cols})...")
+    ids, x, y, r, c = place_clusters(n_clusters, size_x, size_y, rows, cols, rng)
+    if n_clusters <= 50:
+        for i in range(n_clusters):
+            print(f"   - {ids[i]}: ({x[i]:.1f}, {y[i]:.1f}) [Zone {r[i]+1}-{c[i]+1}]")
+
+    total_samples = int(days * samples_per_day)
+    generator = FieldGenerator(x, y, start_date, total_samples, samples_per_day, seed, size_x, size_y)
+    x_col, y_col = x.round(1), y.round(1)  # On garde la coordonnée pour la visualisation
+    metrics = COLUMNS[4:]
+    sums = np.zeros((3, n_clusters))  # Moyennes par capteur (aperçu final)
+
+    chunk_ticks = max(1, chunk_rows // n_clusters)
+    print(f"Génération des données spatialisées ({total_samples} ticks x {n_clusters} capteurs, "
+          f"{chunk_ticks} ticks par morceau)...")
+
+    writer = None
+    if output_format == "columnar":
+        writer = ColumnarWriter(output, COLUMNS[2:], output)
+    else:
+        csv_file = open(output, "w", newline="")
+    try:
+        for start in range(0, total_samples, chunk_ticks):
+            end = min(start + chunk_ticks, total_samples)
+            values = generator.chunk(start, end)
+            timestamps = generator.timestamps(start, end)
+            sums += [values['temperature'].sum(axis=0), values['soilMoisture'].sum(axis=0),
+                     values['azote_mg_kg'].sum(axis=0)]
+
+            if writer is not None:
+                block = np.stack([np.broadcast_to(x_col, (end - start, n_clusters)),
+                                  np.broadcast_to(y_col, (end - start, n_clusters))]
+                                 + [values[m] for m in metrics], axis=-1)
+                for ts, tick_values in zip(timestamps, block):
+                    writer.add(ts, ids, tick_values)
+                continue
+
+            ticks = end - start
+            df_chunk = pd.DataFrame({
+                'cluster_id': np.tile(ids, ticks),
+                'timestamp': np.repeat(timestamps.strftime('%Y-%m-%d %H:%M:%S'), n_clusters),
+                'x': np.tile(x_col, ticks),
+                'y': np.tile(y_col, ticks),
+                **{m: values[m].ravel() for m in metrics},
+            })
+            df_chunk.to_csv(csv_file, index=False, header=(start == 0))
+    finally:
+        if writer is not None:
+            writer.close()
+        else:
+            csv_file.close()
+
+    print(f"✅ Terminé ! Fichier '{output}' généré ({total_samples * n_clusters} lignes).")
+    print("\n--- Aperçu des offsets spatiaux calculés (Moyenne sur la période) ---")
+    summary = pd.DataFrame({
+        'cluster_id': ids, 'x': x_col, 'y': y_col,
+        'temperature': sums[0] / total_samples, 'soilMoisture': sums[1] / total_samples,
+        'azote_mg_kg': sums[2] / total_samples,
+    })
+    print(summary.head(20))
 
 # ==========================================
-# 5. VISUALISATION (AJOUT)
+# 4. VISUALISATION (optionnelle : --plot)
 # ==========================================
-import plotly.express as px
-
-print("📊 Génération de la visualisation interactive...")
-
-# Conversion du timestamp en texte pour que Plotly le lise comme une séquence
-df_final['date_str'] = df_final['timestamp'].dt.strftime('%Y-%m-%d %H:%M')
-
-# Création du graphique animé
-fig = px.scatter(
-    df_final, 
-    x='x', 
-    y='y', 
-    animation_frame='date_str',    # C'est ça qui crée la barre de progression (Slider)
-    animation_group='cluster_id',  # Pour suivre les points d'une image à l'autre
-    color='soilMoisture',        # La couleur change avec l'humidité
-    size='temperature', # La taille change avec la température (optionnel)
-    hover_name='cluster_id',       # Affiche le nom "cluster_XX" au survol
-    hover_data=['azote_mg_kg', 'ph'], # Affiche les détails au survol
-    
-    # Esthétique
-    range_x=[-5, 105], # On fixe les marges de la carte
-    range_y=[-5, 105],
-    range_color=[30, 90], # Fixe l'échelle de couleur (30% sec -> 90% humide)
-    color_continuous_scale='RdYlBu', # Rouge (Sec) -> Bleu (Humide)
-    title="Évolution Spatio-Temporelle du Champ (Humidité Sol)",
-    template='plotly_dark'
-)
-
-# Force les points à être un peu plus gros
-fig.update_traces(marker=dict(size=15))
-
-# Affiche le résultat dans le navigateur
-fig.show()
-
-print("✅ Graphique ouvert dans le navigateur et sauvegardé sous 'simulation_champ.html'")
\ No newline at end of file
+def plot(path):
+    import plotly.express as px
+
+    print("📊 Génération de la visualisation interactive...")
+    df_final = pd.concat(group for _, group in iter_replay(path))
+
+    # Conversion du timestamp en texte pour que Plotly le lise comme une séquence
+    df_final['date_str'] = pd.to_datetime(df_final['timestamp']).dt.strftime('%Y-%m-%d %H:%M')
+
+    # Création du graphique animé
+    fig = px.scatter(
+        df_final,
+        x='x',
+        y='y',
+        animation_frame='date_str',    # C'est ça qui crée la barre de progression (Slider)
+        animation_group='cluster_id',  # Pour suivre les points d'une image à l'autre
+        color='soilMoisture',        # La couleur change avec l'humidité
+        size='temperature', # La taille change avec la température (optionnel)
+        hover_name='cluster_id',       # Affiche le nom "cluster_XX" au survol
+        hover_data=['azote_mg_kg', 'ph'], # Affiche les détails au survol
+
+        # Esthétique
+        range_x=[df_final['x'].min() - 5, df_final['x'].max() + 5], # On fixe les marges de la carte
+        range_y=[df_final['y'].min() - 5, df_final['y'].max() + 5],
+        range_color=[30, 90], # Fixe l'échelle de couleur (30% sec -> 90% humide)
+        color_continuous_scale='RdYlBu', # Rouge (Sec) -> Bleu (Humide)
+        title="Évolution Spatio-Temporelle du Champ (Humidité Sol)",
+        template='plotly_dark'
+    )
+
+    # Force les points à être un peu plus gros
+    fig.update_traces(marker=dict(size=15))
+
+    fig.write_html('simulation_champ.html')
+    # Affiche le résultat dans le navigateur
+    fig.show()
+
+    print("✅ Graphique ouvert dans le navigateur et sauvegardé sous 'simulation_champ.html'")
+
+
+def parse_grid(text):
+    """"2x5" -> (2, 5)"""
+    rows, cols = (int(v) for v in text.lower().split("x", 1))
+    return rows, cols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère des relevés synthétiques spatialisés pour tout un champ")
+    parser.add_argument("--clusters", type=int, default=N_CLUSTERS, help="Nombre de capteurs")
+    parser.add_argument("--grid", type=parse_grid, metavar="LIGNESxCOLONNES",
+                        help=f"Disposition des capteurs (défaut : {GRID_ROWS}x{GRID_COLS}, agrandie si besoin)")
+    parser.add_argument("--field-size", type=float, nargs=2, default=(GRID_SIZE_X, GRID_SIZE_Y), metavar=("X", "Y"),
+                        help="Taille du champ en mètres")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=START_DATE, help="Premier timestamp (ISO)")
+    parser.add_argument("--days", type=float, default=DURATION_DAYS, help="Durée en jours")
+    parser.add_argument("--samples-per-day", type=int, default=SAMPLES_PER_DAY)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--format", choices=("csv", "columnar"), default="csv",
+                        help="columnar : dossier au format smartfarm_replay (common/), rejouable sans parsing")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Lignes générées par morceau (mémoire)")
+    parser.add_argument("--plot", action="store_true", help="Ouvre la visualisation Plotly (petits fichiers)")
+    args = parser.parse_args()
+
+    generate(args.output, args.clusters, *args.field_size, grid=args.grid, start_date=args.start, days=args.days,
+             samples_per_day=args.samples_per_day, seed=args.seed, output_format=args.format,
+             chunk_rows=args.chunk_rows)
+    if args.plot:
+        plot(args.output)
+
+
+if __name__ == "__main__":
+    main()
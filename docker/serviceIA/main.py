@@ -1,25 +1,227 @@
-import joblib
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse
 import httpx
 import uvicorn
-import pandas as pd
-from typing import Dict, Any
+import numpy as np
+from typing import Dict, Any, List, Tuple
 
 
 
-app = FastAPI(title="Smart Field AI Service")
+import registry
+from online import OnlineClusterer
+from predictor import CentroidPredictor
+
+# Chargement du modèle (KMeans + StandardScaler exportés par predictor.py, sans sklearn)
+MODEL_PATH = os.getenv("MODEL_PATH", "field_state_model.npz")
+MODEL_REGISTRY = os.getenv("MODEL_REGISTRY", "")                  # Registre versionné (vide : MODEL_PATH seul)
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", 5))  # Relecture du manifeste (secondes)
+
+
+def load_model():
+    """(prédicteur, version, chemin) : version active du registre, sinon MODEL_PATH"""
+    version, path = registry.active_model(MODEL_REGISTRY) if MODEL_REGISTRY else (None, None)
+    if path is None:
+        version, path = "local", MODEL_PATH
+    return CentroidPredictor.load(path), version, path
+
 
-# Chargement des modèles
 print("Chargement des modèles...")
-model = joblib.load('field_state_model_full.pkl')
-scaler = joblib.load('field_scaler_full.pkl')
+model, model_version, model_path = load_model()
+model_loaded_at = datetime.now().isoformat()
+print(f"🧠 Modèle {model_version} chargé ({model_path})")
+
+# Apprentissage en ligne : scaler et centroïdes mis à jour avec les relevés prédits,
+# publiés périodiquement dans le registre (MODEL_REGISTRY) comme nouvelle version
+ONLINE_LEARNING = os.getenv("ONLINE_LEARNING", "false").lower() == "true"
+ONLINE_MAX_COUNT = int(os.getenv("ONLINE_MAX_COUNT", 10000))                  # Mémoire du modèle (relevés)
+ONLINE_SNAPSHOT_INTERVAL = float(os.getenv("ONLINE_SNAPSHOT_INTERVAL", 3600))  # Publication (secondes, 0 : jamais)
+ONLINE_ACTIVATE = os.getenv("ONLINE_ACTIVATE", "true").lower() == "true"       # Servir les snapshots publiés
+
+
+def load_online(path):
+    try:
+        return OnlineClusterer.load(path, ONLINE_MAX_COUNT)
+    except (ValueError, KeyError) as e:
+        print(f"⚠️ Apprentissage en ligne désactivé : {e}")
+        return None
+
 
-ORION_URL = "http://orion:1026"
+online_model = load_online(model_path) if ONLINE_LEARNING else None
+online_versions = set()   # versions publiées par l'apprentissage en ligne
+online_snapshot_seen = 0  # relevés appris au dernier snapshot
+
+ORION_URL = os.getenv("ORION_URL", "http://orion:1026")
 HEADERS = {
     "fiware-service": "openiot",
     "fiware-servicepath": "/"
 }
 
+# Écriture des fieldState : "concurrent" (un POST /attrs par entité, en parallèle) ou "batch" (/v2/op/update)
+ORION_WRITE_MODE = os.getenv("ORION_WRITE_MODE", "concurrent")
+ORION_MAX_CONCURRENCY = int(os.getenv("ORION_MAX_CONCURRENCY", 16))  # Écritures en vol au maximum
+ORION_BATCH_SIZE = int(os.getenv("ORION_BATCH_SIZE", 100))           # Entités par requête op/update
+
+# Cache du dernier fieldState écrit par entité : une prédiction inchangée n'est pas réécrite
+STATE_CACHE_SIZE = int(os.getenv("STATE_CACHE_SIZE", 10000))       # Entités gardées (LRU, 0 : pas de cache)
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", 3600))        # Oubli d'une entrée après N secondes
+FIELDSTATE_HEARTBEAT = float(os.getenv("FIELDSTATE_HEARTBEAT", 600))  # Réécriture forcée après N secondes (0 : jamais)
+
+# Réception des notifications : "sync" (réponse après les écritures Orion) ou "queue" (202 immédiat,
+# prédiction et écriture en micro-lots par une tâche de fond)
+NOTIFY_MODE = os.getenv("NOTIFY_MODE", "sync")
+QUEUE_BATCH_SIZE = int(os.getenv("QUEUE_BATCH_SIZE", 500))  # Lot traité dès N entités en attente
+QUEUE_WINDOW = float(os.getenv("QUEUE_WINDOW", 0.2))        # ... ou N secondes après la première
+
+# Client HTTP keep-alive partagé, créé au démarrage de l'application
+orion_client: httpx.AsyncClient = None
+orion_semaphore: asyncio.Semaphore = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global orion_client, orion_semaphore, notification_queue
+    limits = httpx.Limits(max_connections=ORION_MAX_CONCURRENCY, max_keepalive_connections=ORION_MAX_CONCURRENCY)
+    orion_client = httpx.AsyncClient(timeout=10.0, limits=limits)
+    orion_semaphore = asyncio.Semaphore(ORION_MAX_CONCURRENCY)
+    if NOTIFY_MODE == "queue":
+        # Créée ici, dans la boucle d'uvicorn : ses Events ne doivent pas dater de l'import (Python 3.9)
+        notification_queue = NotificationQueue()
+        notification_queue.start()
+    watcher = asyncio.create_task(watch_registry()) if MODEL_REGISTRY else None
+    snapshots = None
+    if online_model is not None and ONLINE_SNAPSHOT_INTERVAL > 0:
+        if MODEL_REGISTRY:
+            snapshots = asyncio.create_task(snapshot_loop())
+        else:
+            print("⚠️ MODEL_REGISTRY non défini : le modèle appris en ligne ne sera pas publié")
+    yield
+    for task in (watcher, snapshots):
+        if task is not None:
+            task.cancel()
+    if notification_queue is not None:
+        await notification_queue.stop()
+    if snapshots is not None:
+        snapshot_online_model()
+    await orion_client.aclose()
+
+
+app = FastAPI(title="Smart Field AI Service", lifespan=lifespan)
+
+# Ordre des colonnes vues par le modèle
+FEATURES = model.features
+
+def swap_model(predictor: CentroidPredictor, version: str, path: str):
+    """
+    Bascule sur un nouveau modèle. Chaque lot appelle model.predict une seule fois, sans await :
+    un lot en cours est donc entièrement prédit par l'ancienne version, le suivant par la nouvelle.
+    """
+    global model, model_version, model_path, model_loaded_at
+    model, model_version, model_path = predictor, version, path
+    model_loaded_at = datetime.now().isoformat()
+
+
+async def watch_registry():
+    """Relit le manifeste du registre et charge la version active quand elle change"""
+    rejected = None
+    while True:
+        await asyncio.sleep(MODEL_POLL_INTERVAL)
+        try:
+            version, path = registry.active_model(MODEL_REGISTRY)
+            if version is None or version in (model_version, rejected):
+                continue
+            predictor = await asyncio.to_thread(CentroidPredictor.load, path)
+            if predictor.features != FEATURES:
+                print(f"⚠️ Modèle {version} ignoré : features {predictor.features} au lieu de {FEATURES}")
+                rejected = version
+                continue
+            previous = model_version
+            swap_model(predictor, version, path)
+            print(f"🔁 Modèle {previous} → {version} ({path})")
+            if online_model is not None and version not in online_versions:
+                # Version publiée par ailleurs (réentraînement, retour arrière) : on repart d'elle
+                reset_online_model(path)
+        except Exception as e:
+            print(f"⚠️ Lecture du registre {MODEL_REGISTRY} impossible : {e}")
+
+
+def reset_online_model(path):
+    global online_model, online_snapshot_seen
+    online_model = load_online(path) or online_model
+    online_snapshot_seen = 0
+
+
+def snapshot_online_model():
+    """Publie le modèle appris en ligne dans le registre s'il a vu de nouveaux relevés"""
+    global online_snapshot_seen
+    if online_model.seen == online_snapshot_seen:
+        return None
+    tmp_path = os.path.join(MODEL_REGISTRY, "online_snapshot.npz.tmp")
+    online_model.save(tmp_path)
+    try:
+        version = registry.publish(MODEL_REGISTRY, tmp_path, activate=ONLINE_ACTIVATE,
+                                   note=f"apprentissage en ligne, {online_model.seen} relevés")
+    finally:
+        os.remove(tmp_path)
+    online_versions.add(version)
+    online_snapshot_seen = online_model.seen
+    print(f"📸 Modèle appris en ligne publié en {version} ({online_model.seen} relevés)")
+    return version
+
+
+async def snapshot_loop():
+    while True:
+        await asyncio.sleep(ONLINE_SNAPSHOT_INTERVAL)
+        try:
+            snapshot_online_model()
+        except Exception as e:
+            print(f"⚠️ Publication du modèle appris en ligne impossible : {e}")
+
+
+class StateCache:
+    """
+    Dernier état écrit dans Orion pour chaque entité, avec l'heure d'écriture.
+    Éviction LRU au-delà de `size` entités et oubli des entrées plus vieilles que `ttl` secondes.
+    """
+
+    def __init__(self, size=STATE_CACHE_SIZE, ttl=STATE_CACHE_TTL, heartbeat=FIELDSTATE_HEARTBEAT):
+        self.size = size
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.entries = OrderedDict()  # entity_id -> (état, heure d'écriture)
+
+    def is_fresh(self, entity_id, state, now=None):
+        """L'état est déjà dans Orion et le heartbeat n'est pas échu : l'écriture peut être sautée"""
+        entry = self.entries.get(entity_id)
+        if entry is None:
+            return False
+        now = time.monotonic() if now is None else now
+        cached_state, written_at = entry
+        if self.ttl and now - written_at >= self.ttl:
+            del self.entries[entity_id]
+            return False
+        self.entries.move_to_end(entity_id)
+        return cached_state == state and not (self.heartbeat and now - written_at >= self.heartbeat)
+
+    def store(self, entity_id, state, now=None):
+        if self.size <= 0:
+            return
+        self.entries[entity_id] = (state, time.monotonic() if now is None else now)
+        self.entries.move_to_end(entity_id)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def forget(self, entity_id):
+        self.entries.pop(entity_id, None)
+
+
+state_cache = StateCache()
+
 STATE_LABELS = {
     0: "Sec & Chaud",
     1: "Frais & Humide",
@@ -27,23 +229,23 @@ STATE_LABELS = {
 }
 
 async def update_orion_entity(entity_id: str, attributes: Dict[str, Any]) -> bool:
-    """Mise à jour d'une entité Orion avec retry"""
+    """Mise à jour d'une entité Orion (au plus ORION_MAX_CONCURRENCY en parallèle)"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
+        async with orion_semaphore:
+            response = await orion_client.post(
                 f"{ORION_URL}/v2/entities/{entity_id}/attrs",
                 json=attributes,
                 headers=HEADERS
             )
-            print(response.status_code, response.text)
-            
-            if response.status_code in [204, 200]:
-                print(f"✅ Orion mis à jour pour {entity_id}")
-                return True
-            else:
-                print(f"❌ Orion erreur {response.status_code}: {response.text}")
-                return False
-                
+        print(response.status_code, response.text)
+
+        if response.status_code in [204, 200]:
+            print(f"✅ Orion mis à jour pour {entity_id}")
+            return True
+        else:
+            print(f"❌ Orion erreur {response.status_code}: {response.text}")
+            return False
+
     except httpx.TimeoutException:
         print(f"⏱️ Timeout lors de la mise à jour de {entity_id}")
         return False
@@ -51,99 +253,275 @@ async def update_orion_entity(entity_id: str, attributes: Dict[str, Any]) -> boo
         print(f"❌ Erreur Orion pour {entity_id}: {e}")
         return False
 
-@app.post("/v2/notify")
-async def receive_notification(request: Request):
-    """Endpoint de notification NGSI-v2"""
-    processed = 0
+async def update_orion_batch(updates: List[Tuple[str, str, Dict[str, Any]]]) -> List[bool]:
+    """
+    Mise à jour groupée via /v2/op/update (ORION_BATCH_SIZE entités par requête).
+    Un lot refusé est rejoué entité par entité pour savoir lesquelles sont en erreur.
+    """
+    results = []
+    for start in range(0, len(updates), ORION_BATCH_SIZE):
+        chunk = updates[start:start + ORION_BATCH_SIZE]
+        body = {
+            "actionType": "append",
+            "entities": [{"id": entity_id, "type": entity_type, **attributes}
+                         for entity_id, entity_type, attributes in chunk],
+        }
+        try:
+            async with orion_semaphore:
+                response = await orion_client.post(f"{ORION_URL}/v2/op/update", json=body, headers=HEADERS)
+            if response.status_code in [204, 200]:
+                print(f"✅ Orion mis à jour pour {len(chunk)} entités")
+                results.extend([True] * len(chunk))
+                continue
+            print(f"❌ Orion erreur {response.status_code} sur le lot: {response.text}")
+        except Exception as e:
+            print(f"❌ Erreur Orion sur le lot de {len(chunk)} entités: {e}")
+        results.extend(await asyncio.gather(*(
+            update_orion_entity(entity_id, attributes) for entity_id, _, attributes in chunk
+        )))
+    return results
+
+async def write_back(updates: List[Tuple[str, str, Dict[str, Any]]]) -> List[bool]:
+    """Écrit les résultats dans Orion, sans attendre chaque entité l'une après l'autre"""
+    if ORION_WRITE_MODE == "batch":
+        return await update_orion_batch(updates)
+    return await asyncio.gather(*(
+        update_orion_entity(entity_id, attributes) for entity_id, _, attributes in updates
+    ))
+
+def parse_entities(data_list: List[Dict[str, Any]]):
+    """
+    Validation des entités notifiées. Retourne (ids, types, lignes de features, nombre d'erreurs) :
+    une entité invalide est écartée seule, pas toute la notification.
+    """
     errors = 0
-    
-    try:
-        body = await request.json()
-        data_list = body.get("data", [])
-        
-        print(f"🔔 Notification reçue avec {len(data_list)} entités")
+    entity_ids = []
+    entity_types = []
+    rows = []
+    for entity in data_list:
+        entity_id = entity.get("id")
+        if not entity_id:
+            print("❌ Entité sans ID")
+            errors += 1
+            continue
+
+        print(f"🔮 Analyse de {entity_id}...")
 
-        for entity in data_list:
-            entity_id = entity.get("id")
-            if not entity_id:
-                print("❌ Entité sans ID")
+        try:
+            # Extraction des features
+            # Validation et extraction des features
+            missing_fields = [field for field in FEATURES if field not in entity]
+
+            if missing_fields:
+                print(f"❌ Champs manquants pour {entity_id}: {missing_fields}")
                 errors += 1
                 continue
-                
-            print(f"🔮 Analyse de {entity_id}...")
 
             try:
-                # Extraction des features
-                # Validation et extraction des features
-                required_fields = ['temperature', 'soilTemperature', 'humidity', 'soilMoisture']
-                missing_fields = [field for field in required_fields if field not in entity]
-                
-                if missing_fields:
-                    print(f"❌ Champs manquants pour {entity_id}: {missing_fields}")
-                    errors += 1
-                    continue
-                
-                try:
-                    features = {
-                        'temperature': float(entity["temperature"]["value"]),
-                        'soilTemperature': float(entity["soilTemperature"]["value"]),
-                        'humidity': float(entity["humidity"]["value"]),
-                        'soilMoisture': float(entity["soilMoisture"]["value"]),
-                    }
-                except KeyError as e:
-                    print(f"❌ Champ sans attribut 'value' pour {entity_id}: {e}")
-                    errors += 1
-                    continue
-                except (ValueError, TypeError) as e:
-                    print(f"❌ Valeur non numérique pour {entity_id}: {e}")
-                    errors += 1
-                    continue
-                print(f"   📊 Features: {features}")
-                
-            except (KeyError, ValueError, TypeError) as e:
-                print(f"❌ Données invalides pour {entity_id}: {e}")
+                features = [float(entity[field]["value"]) for field in FEATURES]
+            except KeyError as e:
+                print(f"❌ Champ sans attribut 'value' pour {entity_id}: {e}")
                 errors += 1
                 continue
-
-            # Prédiction
-            try:
-                features_df = pd.DataFrame([features])
-                features_scaled = scaler.transform(features_df)
-                cluster_state = int(model.predict(features_scaled)[0])
-                
-                state_desc = STATE_LABELS.get(cluster_state, "Inconnu")
-                print(f"✅ Prédiction: {entity_id}, état {cluster_state} → {state_desc}")
-                
-            except Exception as e:
-                print(f"❌ Erreur de prédiction pour {entity_id}: {e}")
+            except (ValueError, TypeError) as e:
+                print(f"❌ Valeur non numérique pour {entity_id}: {e}")
                 errors += 1
                 continue
+            print(f"   📊 Features: {dict(zip(FEATURES, features))}")
+
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"❌ Données invalides pour {entity_id}: {e}")
+            errors += 1
+            continue
+
+        # Le modèle refuse NaN / inf : l'entité est écartée seule, pas tout le lot
+        if not all(np.isfinite(features)):
+            print(f"❌ Erreur de prédiction pour {entity_id}: valeur non finie {features}")
+            errors += 1
+            continue
+
+        entity_ids.append(entity_id)
+        entity_types.append(entity.get("type", "Cluster"))
+        rows.append(features)
+
+    return entity_ids, entity_types, rows, errors
 
-            # Mise à jour Orion
-            payload = {
-                "fieldState": {
-                    "value": cluster_state,
-                    "type": "Integer",
-                    "metadata": {
-                        "timestamp": {
-                            "type": "DateTime",
-                            "value": pd.Timestamp.now().isoformat()
-                        }
+async def score_and_write(entity_ids: List[str], entity_types: List[str], rows: List[List[float]]):
+    """Prédiction en une passe puis écriture dans Orion. Retourne (traitées, écritures évitées, erreurs)"""
+    processed = 0
+    errors = 0
+
+    # Prédiction : un seul predict pour tout le lot, par le modèle actif à cet instant
+    states = []
+    if rows:
+        try:
+            features_array = np.array(rows, dtype=float)
+            states = model.predict(features_array).tolist()
+        except Exception as e:
+            for entity_id in entity_ids:
+                print(f"❌ Erreur de prédiction pour {entity_id}: {e}")
+            errors += len(entity_ids)
+            entity_ids = []
+        else:
+            if online_model is not None:
+                online_model.partial_fit(features_array)
+
+    # Mise à jour Orion (toutes les entités en parallèle, ou par lots op/update)
+    updates = []
+    written_states = []
+    skipped = 0
+    for entity_id, entity_type, cluster_state in zip(entity_ids, entity_types, states):
+        state_desc = STATE_LABELS.get(cluster_state, "Inconnu")
+        print(f"✅ Prédiction: {entity_id}, état {cluster_state} → {state_desc}")
+
+        if state_cache.is_fresh(entity_id, cluster_state):
+            print(f"⏭️ État inchangé pour {entity_id}, pas d'écriture")
+            skipped += 1
+            continue
+
+        payload = {
+            "fieldState": {
+                "value": cluster_state,
+                "type": "Integer",
+                "metadata": {
+                    "timestamp": {
+                        "type": "DateTime",
+                        "value": datetime.now().isoformat()
                     }
                 }
             }
+        }
 
-            print(payload)
-            success = await update_orion_entity(entity_id, payload)
-            if success:
-                processed += 1
-            else:
-                errors += 1
+        print(payload)
+        updates.append((entity_id, entity_type, payload))
+        written_states.append(cluster_state)
+
+    results = await write_back(updates)
+    for (entity_id, _, _), cluster_state, success in zip(updates, written_states, results):
+        if success:
+            state_cache.store(entity_id, cluster_state)
+        else:
+            state_cache.forget(entity_id)
+    processed += sum(results) + skipped
+    errors += len(results) - sum(results)
+    return processed, skipped, errors
+
+
+class NotificationQueue:
+    """
+    File des entités notifiées, vidée par une tâche de fond en micro-lots : dès que `batch_size`
+    entités attendent, ou `window` secondes après la première. Une entité notifiée plusieurs fois
+    dans la même fenêtre n'est prédite et écrite qu'une fois, avec ses dernières valeurs.
+    """
+
+    def __init__(self, batch_size=QUEUE_BATCH_SIZE, window=QUEUE_WINDOW):
+        self.batch_size = batch_size
+        self.window = window
+        self.pending = {}  # entity_id -> (type, features)
+        self.wakeup = asyncio.Event()  # au moins une entité en attente
+        self.full = asyncio.Event()    # batch_size atteint
+        self.closing = False
+        self.task = None
+        self.batches = 0
+        self.deduplicated = 0
+
+    def put(self, entity_ids, entity_types, rows):
+        for entity_id, entity_type, features in zip(entity_ids, entity_types, rows):
+            if entity_id in self.pending:
+                self.deduplicated += 1
+            self.pending[entity_id] = (entity_type, features)
+        if self.pending:
+            self.wakeup.set()
+        if len(self.pending) >= self.batch_size:
+            self.full.set()
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            if not self.closing:
+                try:
+                    await asyncio.wait_for(self.full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush()
+            if self.closing and not self.pending:
+                return
+
+    async def flush(self):
+        batch, self.pending = self.pending, {}
+        self.wakeup.clear()
+        self.full.clear()
+        if not batch:
+            return
+        self.batches += 1
+        entity_types, rows = zip(*batch.values())
+        try:
+            processed, skipped, errors = await score_and_write(list(batch), list(entity_types), list(rows))
+            print(f"📦 Lot {self.batches}: {len(batch)} entités, {processed} traitées "
+                  f"({skipped} inchangées), {errors} erreurs")
+        except Exception as e:
+            print(f"💥 Erreur sur le lot {self.batches} ({len(batch)} entités): {e}")
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+        self.task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            exc = task.exception()
+            print(f"💥 Tâche de la file de notifications arrêtée : {exc!r}")
+            import traceback
+            print("".join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    async def stop(self):
+        """Traite les entités encore en attente puis arrête la tâche"""
+        self.closing = True
+        self.wakeup.set()
+        self.full.set()
+        if self.running:
+            await self.task
+        elif self.pending:
+            await self.flush()
+
+
+notification_queue: NotificationQueue = None  # créée au démarrage (lifespan) si NOTIFY_MODE=queue
+
+@app.post("/v2/notify")
+async def receive_notification(request: Request):
+    """Endpoint de notification NGSI-v2"""
+    try:
+        body = await request.json()
+        data_list = body.get("data", [])
+        
+        print(f"🔔 Notification reçue avec {len(data_list)} entités")
+
+        # 1. Validation : on garde les entités exploitables, chacune avec sa ligne de features
+        entity_ids, entity_types, rows, errors = parse_entities(data_list)
+
+        # Mode file : réponse immédiate, prédiction et écriture par la tâche de fond
+        if notification_queue is not None and not notification_queue.running:
+            print("⚠️ Tâche de la file de notifications arrêtée : traitement direct de la notification")
+        elif notification_queue is not None:
+            notification_queue.put(entity_ids, entity_types, rows)
+            return JSONResponse(status_code=202, content={
+                "status": "queued",
+                "queued": len(entity_ids),
+                "errors": errors,
+                "total": len(data_list)
+            })
+
+        # 2. Prédiction et 3. mise à jour Orion
+        processed, skipped, write_errors = await score_and_write(entity_ids, entity_types, rows)
 
         return {
             "status": "completed",
             "processed": processed,
-            "errors": errors,
+            "skipped": skipped,
+            "errors": errors + write_errors,
             "total": len(data_list)
         }
         
@@ -154,6 +532,23 @@ async def receive_notification(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/admin/model")
+async def model_info():
+    """Version du modèle servi"""
+    return {
+        "version": model_version,
+        "path": model_path,
+        "loaded_at": model_loaded_at,
+        "features": model.features,
+        "n_clusters": len(model.bias),
+        "registry": MODEL_REGISTRY or None,
+        "online": {
+            "samples": online_model.seen,
+            "published": sorted(online_versions)
+        } if online_model is not None else None
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -161,7 +556,10 @@ async def health_check():
         "status": "healthy",
         "service": "AI Field Analyzer",
         "model_loaded": model is not None,
-        "scaler_loaded": scaler is not None
+        "model_version": model_version,
+        "scaler_loaded": model is not None,  # scaler intégré au modèle exporté
+        "notify_mode": NOTIFY_MODE,
+        "queue_pending": len(notification_queue.pending) if notification_queue is not None else 0
     }
 
 
@@ -0,0 +1,108 @@
+"""
+Apprentissage en ligne du modèle d'état des clusters, à partir des relevés déjà prédits par le service.
+
+- scaler : moyenne et variance mises à jour par lot (Welford / Chan), comme StandardScaler.partial_fit
+- centroïdes : mise à jour MiniBatchKMeans (chaque centroïde se rapproche de la moyenne des relevés
+  qui lui sont attribués, avec un pas 1 / nombre de relevés vus)
+
+Les compteurs sont plafonnés à `max_count` : au-delà, les anciens relevés pèsent de moins en moins
+et le modèle suit les évolutions de saison. La mémoire est fixe (quelques tableaux [clusters x features]).
+Les centroïdes sont gardés en valeurs brutes pour rester comparables quand le scaler évolue.
+"""
+import itertools
+
+import numpy as np
+
+from predictor import CentroidPredictor, fold_scaler, save_model
+
+MAX_COUNT = 10000
+
+
+def stable_order(reference, centers, scale):
+    """Permutation des centroïdes la plus proche de `reference` (mêmes numéros d'état qu'avant)"""
+    best, best_cost = None, np.inf
+    for order in itertools.permutations(range(len(centers))):
+        cost = (((centers[list(order)] - reference) / scale) ** 2).sum()
+        if cost < best_cost:
+            best, best_cost = list(order), cost
+    return best
+
+
+class OnlineClusterer:
+    """Scaler et centroïdes d'un prédicteur exporté, mis à jour lot après lot par partial_fit()"""
+
+    def __init__(self, centers, mean, scale, features, max_count=MAX_COUNT):
+        self.features = list(features)
+        self.max_count = max_count
+        self.mean = np.asarray(mean, dtype=float).copy()
+        self.var = np.asarray(scale, dtype=float) ** 2
+        self.count = float(max_count)  # le scaler d'origine compte comme max_count relevés
+        # Centroïdes en valeurs brutes ; l'ordre de référence fixe la signification des états
+        self.centers = np.asarray(centers, dtype=float) * np.asarray(scale, dtype=float) + self.mean
+        self.reference = self.centers.copy()
+        self.center_counts = np.full(len(self.centers), float(max_count) / len(self.centers))
+        self.seen = 0  # relevés appris depuis le chargement
+
+    @classmethod
+    def load(cls, path, max_count=MAX_COUNT):
+        with np.load(path, allow_pickle=False) as data:
+            if "centers" not in data.files:
+                raise ValueError(f"{path} ne contient pas les centroïdes (réexporter avec predictor.py)")
+            return cls(data["centers"], data["mean"], data["scale"], data["features"].tolist(), max_count)
+
+    @property
+    def scale(self):
+        scale = np.sqrt(self.var)
+        return np.where(scale == 0, 1.0, scale)  # comme StandardScaler
+
+    def partial_fit(self, rows):
+        """Met à jour le scaler puis les centroïdes avec un lot de relevés bruts [n x features]"""
+        rows = np.asarray(rows, dtype=float).reshape(-1, len(self.features))
+        n = len(rows)
+        if n == 0:
+            return
+
+        # Scaler : fusion des moyennes / variances du modèle et du lot
+        batch_mean = rows.mean(axis=0)
+        batch_var = rows.var(axis=0)
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.var = (self.count * self.var + n * batch_var + delta ** 2 * self.count * n / total) / total
+        self.mean = self.mean + delta * n / total
+        self.count = min(total, self.max_count)
+
+        # Centroïdes : attribution avec le scaler à jour, puis pas MiniBatchKMeans
+        scale = self.scale
+        scaled_rows = rows / scale
+        scaled_centers = self.centers / scale
+        distances = ((scaled_rows[:, None, :] - scaled_centers[None, :, :]) ** 2).sum(axis=-1)
+        labels = distances.argmin(axis=1)
+        assigned = np.bincount(labels, minlength=len(self.centers)).astype(float)
+        sums = np.zeros_like(self.centers)
+        np.add.at(sums, labels, rows)
+        hit = assigned > 0
+        counts = self.center_counts[hit] + assigned[hit]
+        self.centers[hit] += (sums[hit] - assigned[hit, None] * self.centers[hit]) / counts[:, None]
+        self.center_counts[hit] = np.minimum(counts, self.max_count)
+        self.seen += n
+
+    def reorder(self):
+        """Remet les centroïdes dans l'ordre de référence si deux d'entre eux se sont croisés"""
+        order = stable_order(self.reference, self.centers, self.scale)
+        if order != list(range(len(self.centers))):
+            print(f"🔀 Centroïdes réordonnés {order} pour garder les numéros d'état")
+            self.centers = self.centers[order]
+            self.center_counts = self.center_counts[order]
+        return order
+
+    def save(self, path):
+        """Écrit l'état courant au format du prédicteur (registre, CentroidPredictor)"""
+        self.reorder()
+        scale = self.scale
+        return save_model(path, (self.centers - self.mean) / scale, self.mean, scale, self.features,
+                          online_samples=int(self.seen))
+
+    def predictor(self):
+        scale = self.scale
+        weights, bias = fold_scaler((self.centers - self.mean) / scale, self.mean, scale)
+        return CentroidPredictor(weights, bias, self.features)
@@ -0,0 +1,108 @@
+"""
+Prédicteur du plus proche centroïde en NumPy pur, sans sklearn ni joblib au démarrage du service.
+
+La normalisation du StandardScaler est intégrée aux centroïdes du KMeans. Pour un relevé brut x,
+avec z = (x - mean) / scale, le cluster retenu par KMeans.predict est :
+
+    argmin_k ||z - c_k||²  =  argmin_k  ||c_k||² - 2 z·c_k  =  argmin_k  bias_k + x·weights_k
+
+où weights_k = -2 c_k / scale et bias_k = ||c_k||² + 2 mean·(c_k / scale). Le modèle exporté
+est donc une matrice [clusters x features] et un vecteur [clusters] (quelques centaines d'octets).
+
+    python predictor.py export                       # .pkl -> field_state_model.npz
+    python predictor.py check donnees_spatiales_cluster.csv   # compare avec model.predict
+"""
+import argparse
+import json
+
+import numpy as np
+
+MODEL_PATH = 'field_state_model.npz'
+SKLEARN_MODEL_PATH = 'field_state_model_full.pkl'
+SKLEARN_SCALER_PATH = 'field_scaler_full.pkl'
+
+
+def fold_scaler(centers, mean, scale):
+    """(weights, bias) du plus proche centroïde directement sur les valeurs brutes"""
+    centers = np.asarray(centers, dtype=float)
+    scaled = centers / np.asarray(scale, dtype=float)
+    weights = -2 * scaled
+    bias = np.einsum('kf,kf->k', centers, centers) + 2 * scaled @ np.asarray(mean, dtype=float)
+    return weights, bias
+
+
+def save_model(path, centers, mean, scale, features, **meta):
+    """
+    Écrit le prédicteur (.npz) : weights et bias pour la prédiction, plus les centroïdes normalisés
+    et les statistiques du scaler, nécessaires à l'apprentissage en ligne (online.py).
+    """
+    weights, bias = fold_scaler(centers, mean, scale)
+    meta = {"n_clusters": int(len(bias)), **meta}
+    with open(path, "wb") as f:
+        np.savez(f, weights=weights, bias=bias, features=np.array(features, dtype=str),
+                 centers=np.asarray(centers, dtype=float), mean=np.asarray(mean, dtype=float),
+                 scale=np.asarray(scale, dtype=float), meta=np.array(json.dumps(meta)))
+    return path
+
+
+def export_model(model, scaler, features, path=MODEL_PATH):
+    """Écrit le KMeans et son StandardScaler sous forme de tableaux (fichier .npz)"""
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(len(features))
+    scale = scaler.scale_ if scaler.with_std else np.ones(len(features))
+    return save_model(path, model.cluster_centers_, mean, scale, features)
+
+
+class CentroidPredictor:
+    """Même résultat que scaler.transform puis model.predict, en une multiplication de matrices"""
+
+    def __init__(self, weights, bias, features):
+        self.weights = np.asarray(weights, dtype=float)
+        self.bias = np.asarray(bias, dtype=float)
+        self.features = list(features)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["weights"], data["bias"], data["features"].tolist())
+
+    def predict(self, rows):
+        """Numéro de cluster de chaque ligne (colonnes dans l'ordre de self.features)"""
+        rows = np.asarray(rows, dtype=float).reshape(-1, len(self.features))
+        return np.argmin(rows @ self.weights.T + self.bias, axis=1)
+
+
+def load_sklearn(model_path=SKLEARN_MODEL_PATH, scaler_path=SKLEARN_SCALER_PATH):
+    import joblib
+    return joblib.load(model_path), joblib.load(scaler_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export et vérification du prédicteur NumPy")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Convertit le modèle et le scaler sklearn en tableaux")
+    check = sub.add_parser("check", help="Compare avec model.predict sur un CSV de relevés")
+    check.add_argument("input")
+    for p in (export, check):
+        p.add_argument("--model", default=SKLEARN_MODEL_PATH)
+        p.add_argument("--scaler", default=SKLEARN_SCALER_PATH)
+        p.add_argument("--output", default=MODEL_PATH, help="Fichier du prédicteur NumPy")
+    args = parser.parse_args()
+
+    model, scaler = load_sklearn(args.model, args.scaler)
+    if args.command == "export":
+        features = list(scaler.feature_names_in_)
+        export_model(model, scaler, features, args.output)
+        print(f"✅ Prédicteur exporté : {args.output} ({len(model.cluster_centers_)} clusters, features {features})")
+        return
+
+    import pandas as pd
+    predictor = CentroidPredictor.load(args.output)
+    df = pd.read_csv(args.input, usecols=predictor.features)[predictor.features].dropna()
+    expected = model.predict(scaler.transform(df))
+    got = predictor.predict(df.to_numpy())
+    mismatches = int((expected != got).sum())
+    print(f"{'✅' if mismatches == 0 else '❌'} {len(df)} lignes, {mismatches} différence(s) avec model.predict")
+
+
+if __name__ == "__main__":
+    main()
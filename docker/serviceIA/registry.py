@@ -0,0 +1,127 @@
+"""
+Registre local de modèles versionnés (prédicteurs .npz de predictor.py).
+
+    models/
+      manifest.json                      {"active": "v2", "versions": {"v1": {...}, "v2": {...}}}
+      v1/field_state_model.npz
+      v2/field_state_model.npz
+
+Une version publiée n'est jamais réécrite. Le manifeste est remplacé de façon atomique : le
+service IA (MODEL_REGISTRY) le relit périodiquement et bascule sur la version active sans redémarrer.
+
+    python registry.py publish field_state_model.npz --registry models --note "réentraînement mars"
+    python registry.py activate v1 --registry models     # retour arrière
+    python registry.py list --registry models
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+
+MANIFEST = 'manifest.json'
+MODEL_FILE = 'field_state_model.npz'
+REGISTRY_DIR = 'models'
+
+
+def read_manifest(registry_dir):
+    path = os.path.join(registry_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"active": None, "versions": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(registry_dir, manifest):
+    """Écriture atomique : un lecteur voit l'ancien ou le nouveau manifeste, jamais un fichier partiel"""
+    path = os.path.join(registry_dir, MANIFEST)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def next_version(manifest):
+    numbers = [int(v[1:]) for v in manifest["versions"] if re.fullmatch(r"v\d+", v)]
+    return f"v{max(numbers, default=0) + 1}"
+
+
+def publish(registry_dir, model_file, version=None, activate=True, note=None):
+    """Copie un prédicteur dans le registre sous une nouvelle version. Retourne la version"""
+    os.makedirs(registry_dir, exist_ok=True)
+    manifest = read_manifest(registry_dir)
+    version = version or next_version(manifest)
+    if version in manifest["versions"]:
+        raise ValueError(f"La version {version} existe déjà dans {registry_dir}")
+
+    relative = os.path.join(version, MODEL_FILE)
+    os.makedirs(os.path.join(registry_dir, version))
+    shutil.copyfile(model_file, os.path.join(registry_dir, relative))
+    with open(model_file, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    manifest["versions"][version] = {
+        "file": relative,
+        "sha256": digest,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "note": note,
+    }
+    if activate or manifest["active"] is None:
+        manifest["active"] = version
+    write_manifest(registry_dir, manifest)
+    return version
+
+
+def activate(registry_dir, version):
+    manifest = read_manifest(registry_dir)
+    if version not in manifest["versions"]:
+        raise ValueError(f"Version inconnue : {version}")
+    manifest["active"] = version
+    write_manifest(registry_dir, manifest)
+
+
+def active_model(registry_dir):
+    """(version, chemin du fichier) de la version active, (None, None) si le registre est vide"""
+    manifest = read_manifest(registry_dir)
+    version = manifest.get("active")
+    if version is None:
+        return None, None
+    return version, os.path.join(registry_dir, manifest["versions"][version]["file"])
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--registry", default=os.getenv("MODEL_REGISTRY") or REGISTRY_DIR, help="Dossier du registre")
+    parser = argparse.ArgumentParser(description="Registre des modèles du service IA")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", parents=[common], help="Ajoute un prédicteur .npz (et l'active)")
+    pub.add_argument("model_file")
+    pub.add_argument("--version", help="Nom de la version (défaut : v<n+1>)")
+    pub.add_argument("--note")
+    pub.add_argument("--no-activate", action="store_true", help="Publier sans changer la version active")
+    act = sub.add_parser("activate", parents=[common], help="Change la version active")
+    act.add_argument("version")
+    sub.add_parser("list", parents=[common], help="Versions publiées")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "publish":
+            version = publish(args.registry, args.model_file, args.version, not args.no_activate, args.note)
+            print(f"✅ {args.model_file} publié en {version} dans {args.registry}")
+        elif args.command == "activate":
+            activate(args.registry, args.version)
+            print(f"✅ Version active : {args.version}")
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    if args.command == "list":
+        manifest = read_manifest(args.registry)
+        for version, info in manifest["versions"].items():
+            marker = "*" if version == manifest["active"] else " "
+            print(f"{marker} {version}  {info['created']}  {info['sha256'][:12]}  {info.get('note') or ''}")
+
+
+if __name__ == "__main__":
+    main()
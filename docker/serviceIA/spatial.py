@@ -0,0 +1,243 @@
+"""
+Interpolation spatiale des relevés : cartes (rasters) de tout le champ à partir des capteurs.
+
+- idw()                 : pondération inverse à la distance, vectorisée par broadcasting (peu de points sources)
+- SpatialInterpolator   : poids précalculés une fois pour une grille fixe, limités aux `neighbors`
+                          capteurs les plus proches (KD-tree scipy si disponible)
+- FieldRasters          : rasters par timestamp, mis à jour incrémentalement quand seuls quelques
+                          capteurs changent, avec un cache des derniers timestamps
+
+    python spatial.py donnees_spatiales_cluster.csv --resolution 2 --output rasters
+
+Le dossier produit contient, par métrique, `{métrique}.bin` (float32 [timestamps x y x x], lisible par
+np.memmap, écrit au fil de l'eau) ainsi que timestamps.npy, grid_x.npy et grid_y.npy.
+"""
+import argparse
+import itertools
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from smartfarm_replay import iter_replay, read_columns
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Recherche des voisins en NumPy pur (par blocs de cellules)
+    cKDTree = None
+
+POWER = 2.0        # Poids = 1 / distance^POWER
+SMOOTHING = 0.1    # Ajouté à la distance (évite la division par zéro sur un capteur)
+NEIGHBORS = 8      # Capteurs pris en compte par cellule (None : tous)
+RASTER_METRICS = ('soilMoisture', 'soilTemperature')
+
+
+def idw(target_x, target_y, source_x, source_y, source_values, power=POWER, smoothing=SMOOTHING):
+    """IDW de toutes les cibles à partir de toutes les sources : matrice de distances [cibles x sources]"""
+    dx = np.subtract.outer(np.asarray(target_x, dtype=float), np.asarray(source_x, dtype=float))
+    dy = np.subtract.outer(np.asarray(target_y, dtype=float), np.asarray(source_y, dtype=float))
+    weights = 1 / (np.sqrt(dx**2 + dy**2) + smoothing) ** power
+    return weights @ np.asarray(source_values, dtype=float) / weights.sum(axis=-1)
+
+
+def nearest_sensors(cells, sensors, k, block=4096):
+    """Indices et distances des k capteurs les plus proches de chaque cellule"""
+    if cKDTree is not None:
+        distances, indices = cKDTree(sensors).query(cells, k=k)
+        return indices.reshape(len(cells), k), distances.reshape(len(cells), k)
+
+    indices = np.empty((len(cells), k), dtype=np.int64)
+    distances = np.empty((len(cells), k))
+    for start in range(0, len(cells), block):
+        d = np.linalg.norm(cells[start:start + block, None, :] - sensors[None, :, :], axis=-1)
+        nearest = np.argpartition(d, k - 1, axis=1)[:, :k] if k < len(sensors) else np.argsort(d, axis=1)
+        indices[start:start + block] = nearest
+        distances[start:start + block] = np.take_along_axis(d, nearest, axis=1)
+    return indices, distances
+
+
+class SpatialInterpolator:
+    """
+    IDW d'un jeu de capteurs fixe vers une grille fixe. Les poids (cellule, capteur) sont calculés
+    une seule fois et rangés par capteur, ce qui permet de ne rejouer que la contribution des
+    capteurs qui ont changé. Un capteur sans valeur (NaN) est simplement ignoré : les poids
+    des autres capteurs sont renormalisés.
+    """
+
+    def __init__(self, sensor_x, sensor_y, grid_x, grid_y, power=POWER, smoothing=SMOOTHING, neighbors=NEIGHBORS):
+        self.grid_x = np.asarray(grid_x, dtype=float)
+        self.grid_y = np.asarray(grid_y, dtype=float)
+        self.shape = (len(self.grid_y), len(self.grid_x))
+        self.n_sensors = len(sensor_x)
+        self.n_cells = self.shape[0] * self.shape[1]
+
+        gx, gy = np.meshgrid(self.grid_x, self.grid_y)
+        cells = np.column_stack([gx.ravel(), gy.ravel()])
+        sensors = np.column_stack([np.asarray(sensor_x, dtype=float), np.asarray(sensor_y, dtype=float)])
+        k = self.n_sensors if neighbors is None else min(neighbors, self.n_sensors)
+        sensor_idx, distances = nearest_sensors(cells, sensors, k)
+        weights = 1 / (distances + smoothing) ** power
+
+        # Poids au format COO, triés par capteur (CSR par capteur pour les mises à jour partielles)
+        cell_idx = np.repeat(np.arange(self.n_cells), k)
+        sensor_idx = sensor_idx.ravel()
+        order = np.argsort(sensor_idx, kind="stable")
+        self.cell_idx = cell_idx[order]
+        self.sensor_idx = sensor_idx[order]
+        self.weights = weights.ravel()[order]
+        self.sensor_offsets = np.searchsorted(self.sensor_idx, np.arange(self.n_sensors + 1))
+
+    def accumulate(self, values):
+        """(numérateur, dénominateur) par cellule pour un vecteur de valeurs [capteurs]"""
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        contrib = self.weights * valid[self.sensor_idx]
+        numerator = np.bincount(self.cell_idx, contrib * np.where(valid, values, 0)[self.sensor_idx],
+                                minlength=self.n_cells)
+        denominator = np.bincount(self.cell_idx, contrib, minlength=self.n_cells)
+        return numerator, denominator
+
+    def delta(self, sensors, old_values, new_values):
+        """Variation (numérateur, dénominateur) quand seuls `sensors` passent de old_values à new_values"""
+        # Entrées des capteurs modifiés : plages [offsets[s], offsets[s + 1]) concaténées
+        starts = self.sensor_offsets[sensors]
+        lengths = self.sensor_offsets[np.asarray(sensors) + 1] - starts
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        cells = self.cell_idx[entries]
+        weights = self.weights[entries]
+        old, new = np.asarray(old_values, dtype=float), np.asarray(new_values, dtype=float)
+        s = self.sensor_idx[entries]
+        old_valid, new_valid = ~np.isnan(old[s]), ~np.isnan(new[s])
+        d_num = weights * (np.where(new_valid, new[s], 0) - np.where(old_valid, old[s], 0))
+        d_den = weights * (new_valid.astype(float) - old_valid)
+        return (np.bincount(cells, d_num, minlength=self.n_cells),
+                np.bincount(cells, d_den, minlength=self.n_cells))
+
+    def raster(self, numerator, denominator):
+        """Raster [y x x] ; NaN là où aucun capteur voisin n'a de valeur"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = numerator / denominator
+        values[denominator <= 1e-12 * self.weights.max()] = np.nan  # reste d'arrondi des mises à jour
+        return values.reshape(self.shape)
+
+    def interpolate(self, values):
+        """Raster [y x x] complet pour un vecteur de valeurs [capteurs]"""
+        return self.raster(*self.accumulate(values))
+
+
+class FieldRasters:
+    """
+    Rasters de plusieurs métriques, tick après tick. D'un tick au suivant, seuls les capteurs
+    dont la valeur a changé sont rejoués ; au-delà de `full_ratio` capteurs modifiés (ou toutes
+    les `refresh_every` mises à jour, pour borner l'erreur d'arrondi), le raster est recalculé.
+    Les rasters des `cache_size` derniers timestamps restent disponibles via get().
+    """
+
+    def __init__(self, interpolator, metrics=RASTER_METRICS, cache_size=64, full_ratio=0.5, refresh_every=500):
+        self.interpolator = interpolator
+        self.metrics = list(metrics)
+        self.cache_size = cache_size
+        self.full_ratio = full_ratio
+        self.refresh_every = refresh_every
+        self.cache = OrderedDict()  # timestamp -> {métrique: raster}
+        self.values = {}            # métrique -> dernières valeurs des capteurs
+        self.sums = {}              # métrique -> (numérateur, dénominateur)
+        self.updates = 0
+        self.full = 0
+        self.incremental = 0
+
+    def update(self, timestamp, values):
+        """`values` : {métrique: tableau [capteurs]}. Retourne {métrique: raster}"""
+        cached = self.cache.get(timestamp)
+        if cached is not None:
+            self.cache.move_to_end(timestamp)
+            return cached
+
+        self.updates += 1
+        refresh = self.refresh_every and self.updates % self.refresh_every == 0
+        rasters = {}
+        for metric in self.metrics:
+            new = np.asarray(values[metric], dtype=float)
+            old = self.values.get(metric)
+            changed = None
+            if old is not None and not refresh:
+                changed = np.flatnonzero(~((new == old) | (np.isnan(new) & np.isnan(old))))
+            if changed is None or len(changed) > self.full_ratio * len(new):
+                self.sums[metric] = self.interpolator.accumulate(new)
+                self.full += 1
+            elif len(changed):
+                d_num, d_den = self.interpolator.delta(changed, old, new)
+                numerator, denominator = self.sums[metric]
+                self.sums[metric] = (numerator + d_num, denominator + d_den)
+                self.incremental += 1
+            self.values[metric] = new.copy()
+            rasters[metric] = self.interpolator.raster(*self.sums[metric])
+
+        self.cache[timestamp] = rasters
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return rasters
+
+    def get(self, timestamp):
+        return self.cache.get(timestamp)
+
+
+def grid_for(x, y, resolution, margin=0.0):
+    """Centres des cellules couvrant les capteurs (pas de `resolution` mètres)"""
+    grid_x = np.arange(min(x) - margin, max(x) + margin + resolution / 2, resolution)
+    grid_y = np.arange(min(y) - margin, max(y) + margin + resolution / 2, resolution)
+    return grid_x, grid_y
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rasters du champ par timestamp (fichier avec colonnes x, y)")
+    parser.add_argument("input", help="CSV ou dossier colonnaire (createData.py)")
+    parser.add_argument("--resolution", type=float, default=2.0, help="Taille d'une cellule en mètres")
+    parser.add_argument("--neighbors", type=int, default=NEIGHBORS, help="Capteurs par cellule (0 : tous)")
+    parser.add_argument("--metrics", nargs="+", default=list(RASTER_METRICS))
+    parser.add_argument("--output", default="rasters", help="Dossier des rasters")
+    args = parser.parse_args()
+
+    missing = [c for c in ('cluster_id', 'x', 'y', *args.metrics) if c not in read_columns(args.input)]
+    if missing:
+        parser.error(f"colonnes manquantes dans {args.input} : {', '.join(missing)} "
+                     f"(positions x, y des capteurs requises, voir createData.py)")
+
+    ticks = iter_replay(args.input)
+    first_ts, first = next(ticks)
+    x, y = first['x'].to_numpy(), first['y'].to_numpy()
+    sensors = first['cluster_id'].to_numpy()
+    grid_x, grid_y = grid_for(x, y, args.resolution)
+    start = time.perf_counter()
+    interpolator = SpatialInterpolator(x, y, grid_x, grid_y, neighbors=args.neighbors or None)
+    print(f"🗺️ Grille {len(grid_x)}x{len(grid_y)} pour {len(sensors)} capteurs "
+          f"(poids calculés en {time.perf_counter() - start:.2f} s)")
+
+    rasters = FieldRasters(interpolator, args.metrics, cache_size=1)
+    os.makedirs(args.output, exist_ok=True)
+    files = {metric: open(os.path.join(args.output, f"{metric}.bin"), "wb") for metric in args.metrics}
+    timestamps = []
+    start = time.perf_counter()
+    try:
+        for ts, group in itertools.chain([(first_ts, first)], ticks):
+            # Capteur absent d'un paquet : NaN, ignoré par l'interpolation
+            if not np.array_equal(group['cluster_id'].to_numpy(), sensors):
+                group = group.set_index('cluster_id').reindex(sensors).reset_index()
+            result = rasters.update(ts, {metric: group[metric].to_numpy() for metric in args.metrics})
+            for metric, f in files.items():
+                f.write(result[metric].astype(np.float32).tobytes())
+            timestamps.append(ts.value)
+    finally:
+        for f in files.values():
+            f.close()
+
+    elapsed = time.perf_counter() - start
+    np.save(os.path.join(args.output, "timestamps.npy"), np.asarray(timestamps, dtype=np.int64))
+    np.save(os.path.join(args.output, "grid_x.npy"), grid_x)
+    np.save(os.path.join(args.output, "grid_y.npy"), grid_y)
+    print(f"✅ {len(timestamps)} timestamps en {elapsed:.2f} s ({rasters.full} calculs complets, "
+          f"{rasters.incremental} mises à jour partielles) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+import zlib
+
+import httpx
+
+from sender import is_accepted, is_retryable, text_headers
+
+# Politiques quand la file d'envoi est pleine
+POLICIES = ("block", "drop_newest", "drop_oldest")
+
+
+def _abandoned(entry):
+    _, on_result = entry
+    if on_result is not None:
+        on_result(None)
+
+
+class AsyncSendPipeline:
+    """
+    Étage d'envoi asynchrone, séparé du nettoyage.
+    - une boucle asyncio dans un thread dédié, avec un client httpx keep-alive
+    - `workers` envois en vol au maximum (un worker par partition)
+    - une file bornée par worker : les envois d'une même clé (device) restent ordonnés
+    - file pleine : "block" bloque le producteur (backpressure), "drop_newest" rejette
+      le nouvel envoi, "drop_oldest" remplace le plus ancien envoi en attente
+    - `on_result` (optionnel, par envoi) est appelé depuis la boucle asyncio avec True (accepté),
+      False (refusé ou injoignable) ou None (envoi abandonné par la politique de file)
+    """
+
+    def __init__(self, workers=8, queue_size=1000, policy="block", timeout=1, quiet=False):
+        if policy not in POLICIES:
+            raise ValueError(f"Politique de file inconnue : {policy}")
+        self.workers = workers
+        self.queue_size = max(1, queue_size // workers)
+        self.policy = policy
+        self.timeout = timeout
+        self.quiet = quiet  # pas d'affichage par envoi en erreur : compteurs sent / failed / dropped
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+        # Même rôle que HttpSender.on_failure (appelé depuis la boucle asyncio)
+        self.on_failure = None
+        # Même rôle que HttpSender.on_response
+        self.on_response = None
+
+        self.loop = None
+        self.thread = None
+        self.queues = []
+        self.tasks = []
+        self.client = None
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self._setup())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="async-sender", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    async def _setup(self):
+        limits = httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+        self.client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        self.queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self.tasks = [asyncio.create_task(self._worker(queue)) for queue in self.queues]
+
+    async def _worker(self, queue):
+        while True:
+            entry = await queue.get()
+            try:
+                if entry is None:
+                    return
+                item, on_result = entry
+                url, payload, headers, label, key, ok_statuses = item
+                start = time.perf_counter()
+                try:
+                    if isinstance(payload, str):
+                        res = await self.client.post(url, content=payload.encode(), headers=text_headers(headers))
+                    else:
+                        res = await self.client.post(url, json=payload, headers=headers)
+                    status = res.status_code
+                    if self.on_response is not None:
+                        self.on_response(url, status, time.perf_counter() - start)
+                    if is_accepted(status, ok_statuses):
+                        self.sent += 1
+                        if on_result is not None:
+                            on_result(True)
+                        continue
+                    if not self.quiet:
+                        print(f"⚠️ Erreur {label} (HTTP {status}): {res.text}")
+                except Exception as e:
+                    status = None
+                    if self.on_response is not None:
+                        self.on_response(url, status, time.perf_counter() - start)
+                    if not self.quiet:
+                        print(f"⚠️ Erreur lors de l'envoi {label}: {e!r}")
+                self.failed += 1
+                if on_result is not None:
+                    on_result(False)
+                if is_retryable(status) and self.on_failure is not None:
+                    self.on_failure(item)
+            finally:
+                queue.task_done()
+
+    async def _enqueue(self, queue, entry):
+        if self.policy == "block":
+            await queue.put(entry)
+            return True
+        if queue.full():
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                _abandoned(entry)
+                return False
+            _abandoned(queue.get_nowait())
+            queue.task_done()
+            self.dropped += 1
+        queue.put_nowait(entry)
+        return True
+
+    def queue_depth(self):
+        return sum(queue.qsize() for queue in self.queues)
+
+    def post(self, url, payload, headers=None, label="", key=None, ok_statuses=None, on_result=None):
+        """
+        Soumet un POST JSON sans attendre la réponse.
+        Retourne False si l'envoi a été rejeté par la politique de file.
+        """
+        partition = zlib.crc32(str(key if key is not None else url).encode()) % self.workers
+        entry = ((url, payload, headers, label, key, ok_statuses), on_result)
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(self.queues[partition], entry), self.loop)
+        return future.result()
+
+    def close(self):
+        """Vide les files, attend les envois en vol puis arrête la boucle"""
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            for queue in self.queues:
+                await queue.put(None)
+            await asyncio.gather(*self.tasks)
+            await self.client.aclose()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop = None
+        print(f"📤 Envois asynchrones : {self.sent} ok, {self.failed} en erreur, {self.dropped} abandonnés")
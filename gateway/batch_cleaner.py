@@ -0,0 +1,228 @@
+import numpy as np
+
+from rolling_stats import MIN_STD
+
+# Codes de statut (index dans STATUSES), identiques aux chaînes de SensorGateway.clean_value
+STATUSES = ("OK", "DEFAULT", "FIXED_NAN", "FIXED_BROKEN", "FIXED_OUTLIER", "CLIPPED", "FIXED_FREEZE",
+            "FIXED_STAT_OUTLIER")
+(OK, DEFAULT, FIXED_NAN, FIXED_BROKEN, FIXED_OUTLIER, CLIPPED, FIXED_FREEZE,
+ FIXED_STAT_OUTLIER) = range(len(STATUSES))
+
+FAULT_VALUE = -0.001  # Valeur forcée pour un capteur cassé / gelé
+FAULT_LIMIT = 5       # Nombre de cycles défectueux tolérés
+
+
+class BatchSensorCleaner:
+    """
+    Nettoyage vectorisé d'un paquet complet (devices x métriques) pour un timestamp.
+    Reproduit SensorGateway.clean_value (mêmes statuts, mêmes valeurs aux arrondis près),
+    mais sur des buffers circulaires préalloués au lieu d'une fenêtre par device/métrique.
+    """
+
+    def __init__(self, metrics, thresholds, window=5, capacity=64, stat_sigma=0):
+        self.metrics = list(metrics)
+        self.window = window
+        self.stat_sigma = stat_sigma  # 0 = détection statistique désactivée
+
+        n_metrics = len(self.metrics)
+        # Seuils d'outliers (défaut large si la métrique n'a pas de seuil)
+        self.t_min = np.array([thresholds.get(m, (-999, 999))[0] for m in self.metrics], dtype=float)
+        self.t_max = np.array([thresholds.get(m, (-999, 999))[1] for m in self.metrics], dtype=float)
+        # Valeur par défaut quand aucun historique n'existe (milieu de la plage)
+        self.defaults = np.array([sum(thresholds.get(m, (0, 0))) / 2 for m in self.metrics], dtype=float)
+
+        # Index des devices -> ligne dans les buffers
+        self.device_index = {}
+        self.device_ids = []
+
+        # Buffers circulaires : historique, position d'écriture, taille, compteur de défauts
+        self.history = np.zeros((capacity, n_metrics, window))
+        self.heads = np.zeros((capacity, n_metrics), dtype=np.int64)
+        self.lengths = np.zeros((capacity, n_metrics), dtype=np.int64)
+        self.defects = np.zeros((capacity, n_metrics), dtype=np.int64)
+
+    def _grow(self, needed):
+        """Double la capacité des buffers si nécessaire"""
+        capacity = len(self.history)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - len(self.history)
+        self.history = np.concatenate([self.history, np.zeros((extra,) + self.history.shape[1:])])
+        self.heads = np.concatenate([self.heads, np.zeros((extra,) + self.heads.shape[1:], dtype=np.int64)])
+        self.lengths = np.concatenate([self.lengths, np.zeros((extra,) + self.lengths.shape[1:], dtype=np.int64)])
+        self.defects = np.concatenate([self.defects, np.zeros((extra,) + self.defects.shape[1:], dtype=np.int64)])
+
+    def rows_for(self, device_ids):
+        """Retourne les lignes des devices (en les enregistrant au premier passage)"""
+        rows = np.empty(len(device_ids), dtype=np.int64)
+        for i, device_id in enumerate(device_ids):
+            row = self.device_index.get(device_id)
+            if row is None:
+                row = len(self.device_ids)
+                self.device_index[device_id] = row
+                self.device_ids.append(device_id)
+            rows[i] = row
+        self._grow(len(self.device_ids))
+        return rows
+
+    def get_state(self):
+        """Buffers des devices connus (copie), pour un checkpoint"""
+        n = len(self.device_ids)
+        return {
+            "metrics": np.array(self.metrics),
+            "device_ids": np.array(self.device_ids, dtype=str),
+            "history": self.history[:n].copy(),
+            "heads": self.heads[:n].copy(),
+            "lengths": self.lengths[:n].copy(),
+            "defects": self.defects[:n].copy(),
+        }
+
+    def set_state(self, state):
+        """Restaure un état produit par get_state (mêmes métriques et même fenêtre)"""
+        if list(state["metrics"]) != self.metrics or state["history"].shape[2:] != (self.window,):
+            raise ValueError("Checkpoint incompatible (métriques ou fenêtre différentes)")
+        self.device_ids = [str(d) for d in state["device_ids"]]
+        self.device_index = {device_id: row for row, device_id in enumerate(self.device_ids)}
+        n = len(self.device_ids)
+        self._grow(n)
+        self.history[:n] = state["history"]
+        self.heads[:n] = state["heads"]
+        self.lengths[:n] = state["lengths"]
+        self.defects[:n] = state["defects"]
+        for buffer in (self.history, self.heads, self.lengths, self.defects):
+            buffer[n:] = 0
+
+    def _ordered(self, rows):
+        """Historique remis dans l'ordre chronologique, cases vides à 0"""
+        lengths = self.lengths[rows]
+        start = (self.heads[rows] - lengths) % self.window
+        order = (start[..., None] + np.arange(self.window)) % self.window
+        ordered = np.take_along_axis(self.history[rows], order, axis=-1)
+        ordered[np.arange(self.window) >= lengths[..., None]] = 0.0
+        return ordered, lengths
+
+    def _means(self, rows):
+        """Moyenne de l'historique, sommée dans l'ordre chronologique (comme np.mean sur le deque)"""
+        ordered, lengths = self._ordered(rows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return ordered.sum(axis=-1) / lengths
+
+    def _stds(self, rows, means):
+        """Écart type de population de l'historique"""
+        ordered, lengths = self._ordered(rows)
+        filled = np.arange(self.window) < lengths[..., None]
+        deviations = np.where(filled, ordered - means[..., None], 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt((deviations ** 2).sum(axis=-1) / lengths)
+
+    def _push(self, rows, cols, values):
+        """Ajoute des valeurs dans les buffers circulaires (cellules uniques)"""
+        pos = self.heads[rows, cols]
+        self.history[rows, cols, pos] = values
+        self.heads[rows, cols] = (pos + 1) % self.window
+        self.lengths[rows, cols] = np.minimum(self.lengths[rows, cols] + 1, self.window)
+
+    def clean(self, device_ids, values, rows=None):
+        """
+        Nettoie une matrice (devices x métriques).
+        Retourne (valeurs nettoyées, codes de statut). `rows` : résultat de rows_for, s'il est déjà connu.
+        """
+        values = np.asarray(values, dtype=float)
+        if rows is None:
+            rows = self.rows_for(device_ids)
+
+        # Un device présent plusieurs fois dans le paquet : traitement séquentiel par vagues
+        if len(np.unique(rows)) != len(rows):
+            return self._clean_in_waves(device_ids, values)
+
+        n, m = values.shape
+        cleaned = np.empty((n, m))
+        statuses = np.full((n, m), OK, dtype=np.int8)
+
+        lengths = self.lengths[rows]
+        defects = self.defects[rows]
+        has_history = lengths > 0
+        means = self._means(rows)
+
+        # 1. Gestion des NaN
+        is_nan = np.isnan(values)
+        nan_hist = is_nan & has_history
+        defects[nan_hist] += 1
+        broken = nan_hist & (defects > FAULT_LIMIT)
+        fixed_nan = nan_hist & ~broken
+        cleaned[broken] = FAULT_VALUE
+        statuses[broken] = FIXED_BROKEN
+        cleaned[fixed_nan] = means[fixed_nan]
+        statuses[fixed_nan] = FIXED_NAN
+
+        default = is_nan & ~has_history
+        cleaned[default] = np.broadcast_to(self.defaults, (n, m))[default]
+        statuses[default] = DEFAULT
+
+        valid = ~is_nan
+        defects[valid] = 0
+
+        # 2. Gestion des Outliers
+        with np.errstate(invalid='ignore'):
+            outlier = valid & ((values < self.t_min) | (values > self.t_max))
+        fixed_outlier = outlier & has_history
+        cleaned[fixed_outlier] = means[fixed_outlier]
+        statuses[fixed_outlier] = FIXED_OUTLIER
+        clipped = outlier & ~has_history
+        cleaned[clipped] = np.clip(values, self.t_min, self.t_max)[clipped]
+        statuses[clipped] = CLIPPED
+
+        normal = valid & ~outlier
+
+        # 3. Gestion des valeurs hors de portée statistique
+        if self.stat_sigma > 0:
+            stds = self._stds(rows, means)
+            with np.errstate(invalid='ignore'):
+                stat_outlier = normal & (lengths >= 2) & (stds > MIN_STD) & (np.abs(values - means) > self.stat_sigma * stds)
+            cleaned[stat_outlier] = means[stat_outlier]
+            statuses[stat_outlier] = FIXED_STAT_OUTLIER
+            normal &= ~stat_outlier
+
+        # 4. Gestion du Freeze (Capteur bloqué)
+        tracked = normal & has_history
+        r, c = np.nonzero(tracked)
+        last_pos = (self.heads[rows[r], c] - 1) % self.window
+        last_vals = self.history[rows[r], c, last_pos]
+        same = values[r, c] == last_vals
+        defects[r, c] = np.where(same, defects[r, c] + 1, 0)
+        self._push(rows[r], c, values[r, c])
+
+        frozen = tracked & (defects > FAULT_LIMIT)
+        cleaned[frozen] = FAULT_VALUE
+        statuses[frozen] = FIXED_FREEZE
+
+        # 5. Lissage du Bruit
+        smooth = normal & ~frozen
+        means_after = self._means(rows)
+        smoothed = np.where(has_history, (0.7 * values) + (0.3 * means_after), values)
+        cleaned[smooth] = smoothed[smooth]
+        r, c = np.nonzero(smooth)
+        self._push(rows[r], c, smoothed[r, c])
+
+        self.defects[rows] = defects
+        return cleaned, statuses
+
+    def _clean_in_waves(self, device_ids, values):
+        """Traite les doublons d'un même paquet dans l'ordre d'arrivée"""
+        seen = {}
+        waves = []
+        for i, device_id in enumerate(device_ids):
+            wave = seen.get(device_id, 0)
+            seen[device_id] = wave + 1
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(i)
+
+        cleaned = np.empty(values.shape)
+        statuses = np.empty(values.shape, dtype=np.int8)
+        for idx in waves:
+            idx = np.array(idx)
+            cleaned[idx], statuses[idx] = self.clean([device_ids[i] for i in idx], values[idx])
+        return cleaned, statuses
@@ -0,0 +1,159 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from rolling_stats import RollingWindow
+
+CHECKPOINT_VERSION = 2
+
+
+def checkpoint_timestamp(path):
+    """Timestamp du dernier paquet inclus dans un checkpoint, sans le charger entièrement"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Checkpoint illisible ({path}), ignoré : {e}")
+        return None
+    return pd.Timestamp(meta["timestamp"]) if meta.get("timestamp") else None
+
+
+class GatewayCheckpoint:
+    """
+    Sauvegarde périodique (fichier .npz non compressé, écriture atomique) de tout l'état de nettoyage :
+    - nettoyage vectorisé : buffers circulaires de BatchSensorCleaner
+    - nettoyage valeur par valeur : fenêtres glissantes et compteurs de défauts
+    - états techniques déjà signalés et devices ayant reçu leur premier envoi
+    Restauré au démarrage, l'état reprend exactement au dernier paquet sauvegardé : les paquets
+    suivants sont rejoués et nettoyés comme si la gateway ne s'était pas arrêtée.
+    """
+
+    def __init__(self, path, every, gateway, batch_cleaner, sensor_cols, initial_device_sent,
+                 shard=None, n_shards=1):
+        self.path = path
+        self.every = every
+        self.gateway = gateway
+        self.batch_cleaner = batch_cleaner
+        self.sensor_cols = list(sensor_cols)
+        self.initial_device_sent = initial_device_sent
+        self.shard = shard
+        self.n_shards = n_shards
+
+        self.timestamp = None   # dernier paquet traité
+        self.saved = None       # dernier paquet sauvegardé
+        self.ticks = 0
+
+    def due(self):
+        """Le prochain paquet déclenchera une sauvegarde"""
+        return self.every > 0 and (self.ticks + 1) % self.every == 0
+
+    def tick(self, timestamp):
+        """À appeler après chaque paquet traité"""
+        self.timestamp = timestamp
+        self.ticks += 1
+        if self.every > 0 and self.ticks % self.every == 0:
+            self.save()
+
+    def _memory_arrays(self):
+        memory = self.gateway.memory
+        defects = self.gateway.defects_counters
+        devices = sorted(set(memory) | set(defects))
+        window = self.batch_cleaner.window  # même fenêtre pour les deux chemins de nettoyage
+        shape = (len(devices), len(self.sensor_cols))
+
+        values = np.full(shape + (window,), np.nan)
+        lengths = np.zeros(shape, dtype=np.int64)
+        counters = np.zeros(shape, dtype=np.int64)
+        for i, device_id in enumerate(devices):
+            for j, metric in enumerate(self.sensor_cols):
+                history = memory[device_id].get(metric) if device_id in memory else None
+                if history is not None:
+                    window_values = history.get_state()
+                    values[i, j, :len(window_values)] = window_values
+                    lengths[i, j] = len(window_values)
+                if device_id in defects:
+                    counters[i, j] = defects[device_id].get(metric, 0)
+
+        return {
+            "memory_devices": np.array(devices, dtype=str),
+            "memory_values": values,
+            "memory_lengths": lengths,
+            "memory_defects": counters,
+        }
+
+    def save(self):
+        if self.timestamp is None or self.timestamp == self.saved:
+            return
+        arrays = {f"batch_{k}": v for k, v in self.batch_cleaner.get_state().items()}
+        arrays.update(self._memory_arrays())
+        meta = {
+            "version": CHECKPOINT_VERSION,
+            "timestamp": self.timestamp.isoformat(),
+            "shard": self.shard,
+            "n_shards": self.n_shards,
+            "sensor_cols": self.sensor_cols,
+            "initial_device_sent": sorted(self.initial_device_sent),
+            "faults": self.gateway.state_events.faults,
+            "reported": self.gateway.state_events.reported,
+        }
+        arrays["meta"] = np.array(json.dumps(meta))
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.path)
+        self.saved = self.timestamp
+
+    def restore(self):
+        """Recharge le checkpoint s'il existe et correspond à la configuration. Retourne son timestamp"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                arrays = {key: data[key] for key in data.files}
+            meta = json.loads(str(arrays["meta"]))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Checkpoint illisible ({self.path}), ignoré : {e}")
+            return None
+
+        if (meta.get("version") != CHECKPOINT_VERSION or meta["sensor_cols"] != self.sensor_cols
+                or meta["shard"] != self.shard or meta["n_shards"] != self.n_shards):
+            print(f"ℹ️ Checkpoint {self.path} créé pour une autre configuration, ignoré.")
+            return None
+
+        try:
+            self.batch_cleaner.set_state({k[len("batch_"):]: v for k, v in arrays.items() if k.startswith("batch_")})
+        except ValueError as e:
+            print(f"ℹ️ {e}, checkpoint ignoré.")
+            return None
+
+        memory = self.gateway.memory
+        defects = self.gateway.defects_counters
+        window = arrays["memory_values"].shape[-1]
+        for i, device_id in enumerate(arrays["memory_devices"].tolist()):
+            for j, metric in enumerate(self.sensor_cols):
+                length = int(arrays["memory_lengths"][i, j])
+                if length:
+                    memory[device_id][metric] = RollingWindow.from_state(
+                        window, arrays["memory_values"][i, j, :length].tolist(),
+                    )
+                if arrays["memory_defects"][i, j]:
+                    defects[device_id][metric] = int(arrays["memory_defects"][i, j])
+
+        state_events = self.gateway.state_events
+        state_events.faults = {device: dict(metrics) for device, metrics in meta["faults"].items()}
+        state_events.reported = dict(meta["reported"])
+        self.initial_device_sent.update(dict.fromkeys(meta["initial_device_sent"], True))
+
+        self.timestamp = self.saved = pd.Timestamp(meta["timestamp"])
+        print(f"♻️ État de nettoyage restauré depuis {self.path} (paquet {meta['timestamp']})")
+        return self.timestamp
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.saved = None
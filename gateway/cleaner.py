@@ -4,20 +4,51 @@ import numpy as np
 import requests
 import time
 import math
-import keyboard
-from collections import deque, defaultdict
+from collections import defaultdict, deque, Counter
 from dotenv import load_dotenv
 import os
+import queue
+
+from batch_cleaner import BatchSensorCleaner, STATUSES, OK, DEFAULT, FIXED_BROKEN, FIXED_FREEZE
+from sender import HttpSender, TickBatcher
+from async_sender import AsyncSendPipeline
+from smartfarm_replay import iter_replay, read_columns, read_device_ids, ReplayCursor
+from device_registry import DeviceRegistry
+from spool import Spool, SpoolingSender
+from rolling_stats import RollingWindow, MIN_STD
+from sharding import ShardedRunner
+from device_state import DeviceStateEvents
+from metrics import Metrics
+from checkpoint import GatewayCheckpoint, checkpoint_timestamp
 
 load_dotenv()  # charge le .env à la racine
 
 API_KEY = os.getenv("API_KEY")
 
 
-INPUT_DIRTY_FILE = 'sensor_data_raw_dirty.csv'
-IOTA_HTTP_URL = "http://localhost:7896/iot/json"      # Pour envoyer les données
-IOTA_ADMIN_URL = "http://localhost:4041/iot/devices"  # Pour créer les devices
-ORION_URL = "http://localhost:1026/v2/entities"  # Pour vérifier l'existence des devices
+# CSV ou dossier colonnaire (python -m smartfarm_replay convert sensor_data_raw_dirty.csv sensor_data_raw_dirty.replay)
+INPUT_DIRTY_FILE = os.getenv("INPUT_DIRTY_FILE", 'sensor_data_raw_dirty.csv')
+REPLAY_CHUNKSIZE = int(os.getenv("REPLAY_CHUNKSIZE", 50000))          # Lignes lues par chunk
+REPLAY_REORDER_WINDOW = int(os.getenv("REPLAY_REORDER_WINDOW", 0))    # Timestamps tolérés en désordre
+REPLAY_START = os.getenv("REPLAY_START", "")                          # Premier timestamp rejoué (ISO)
+# Dernier paquet acquitté, pour reprendre après un arrêt brutal (ex. replay_cursor.json ; "" = désactivé)
+REPLAY_CURSOR_FILE = os.getenv("REPLAY_CURSOR_FILE", "")
+# Format des mesures envoyées à l'IoT Agent : "json" (IoT Agent JSON, /iot/json) ou "ultralight"
+# (UltraLight 2.0 `ta|12.3|ts|7.8`, IoT Agent UL, /iot/d) : corps plus courts, sans encodage JSON
+PAYLOAD_FORMAT = os.getenv("PAYLOAD_FORMAT", "json")
+IOTA_RESOURCE = "/iot/d" if PAYLOAD_FORMAT == "ultralight" else "/iot/json"
+# Mesures d'un même device regroupées dans une requête multi-mesures (1 = une requête par tick)
+MEASURES_PER_POST = int(os.getenv("MEASURES_PER_POST", 1))
+# Surchargeables pour viser une autre plateforme (ex : scripts/fiware_standin.py en local)
+IOTA_HTTP_URL = os.getenv("IOTA_HTTP_URL", f"http://localhost:7896{IOTA_RESOURCE}")      # Pour envoyer les données
+IOTA_ADMIN_URL = os.getenv("IOTA_ADMIN_URL", "http://localhost:4041/iot/devices")  # Pour créer les devices
+ORION_URL = os.getenv("ORION_URL", "http://localhost:1026/v2/entities")  # Pour vérifier l'existence des devices
+ORION_BATCH_URL = os.getenv("ORION_BATCH_URL", "http://localhost:1026/v2/op/update")  # Envoi groupé de plusieurs entités
+
+# Provisioning groupé au démarrage : "positions" (sensors_positions), "file" (clusters du fichier) ou "none"
+PROVISION_SOURCE = os.getenv("PROVISION_SOURCE", "positions")
+PROVISION_BATCH_SIZE = int(os.getenv("PROVISION_BATCH_SIZE", 500))  # Devices par requête
+DEVICE_REGISTRY_FILE = os.getenv("DEVICE_REGISTRY_FILE", "devices_registry.json")
 
 FIWARE_HEADERS = {
     'fiware-service': 'openiot',
@@ -26,6 +57,8 @@ FIWARE_HEADERS = {
 }
 
 
+# Pause au clavier (ESPACE). PAUSE_KEY=false pour les exécutions sans terminal (benchmark, CI)
+PAUSE_KEY = os.getenv("PAUSE_KEY", "true").lower() == "true"
 is_paused = False
 initial_device_sent: Dict[str, bool] = {}
 
@@ -41,6 +74,90 @@ def toggle_pause(e):
 
 SEND_TO_ORION = True  
 
+# "iota" : un POST par device vers l'IoT Agent / "orion_batch" : POST /v2/op/update groupés par tick
+# "iota" reste le défaut : l'IoT Agent n'accepte qu'un device par requête, et op/update contourne l'agent
+# (correspondance object_id -> attribut, horodatage de l'agent). Le groupage se fait sur la session
+# keep-alive partagée, avec ASYNC_SEND (requêtes en parallèle) et MEASURES_PER_POST.
+SEND_MODE = os.getenv("SEND_MODE", "iota")
+ORION_BATCH_SIZE = int(os.getenv("ORION_BATCH_SIZE", 200))  # Entités par requête op/update
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))       # Connexions keep-alive
+
+# Mode silencieux : plus d'affichage par valeur / par device dans la boucle de traitement
+QUIET = os.getenv("QUIET", "false").lower() == "true"
+
+def debug_print(message):
+    """Affichage du chemin critique (nettoyage, envois), coupé par QUIET=true"""
+    if not QUIET:
+        print(message)
+
+# Session HTTP partagée par tous les envois de la gateway
+# (QUIET : pas d'affichage par envoi en erreur, les compteurs et métriques restent)
+http_sender = HttpSender(pool_size=HTTP_POOL_SIZE, timeout=1, quiet=QUIET)
+
+# Envoi asynchrone : le nettoyage n'attend plus les réponses HTTP
+ASYNC_SEND = os.getenv("ASYNC_SEND", "false").lower() == "true"
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", 8))              # Envois en vol au maximum
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", 1000))     # Taille totale des files d'envoi
+SEND_QUEUE_POLICY = os.getenv("SEND_QUEUE_POLICY", "block")   # block | drop_newest | drop_oldest
+
+# Store-and-forward : envois en échec conservés sur disque puis rejoués dans l'ordre ("" = désactivé)
+SPOOL_FILE = os.getenv("SPOOL_FILE", "spool.db")
+SPOOL_MAX_ITEMS = int(os.getenv("SPOOL_MAX_ITEMS", 100000))
+SPOOL_EVICTION = os.getenv("SPOOL_EVICTION", "drop_oldest")     # drop_oldest | drop_newest
+SPOOL_DRAIN_INTERVAL = float(os.getenv("SPOOL_DRAIN_INTERVAL", 2.0))  # Secondes entre deux tentatives
+SPOOL_DRAIN_BATCH = int(os.getenv("SPOOL_DRAIN_BATCH", 100))
+
+# Transport utilisé par tous les envois (synchrone par défaut, remplacé au démarrage si ASYNC_SEND)
+transport = http_sender
+# Étages de la chaîne d'envoi, gardés pour les métriques (file asynchrone, spool)
+send_pipeline = None
+send_spool = None
+
+# Détection statistique des outliers : |valeur - moyenne| > STAT_OUTLIER_SIGMA écarts types (0 = désactivée)
+STAT_OUTLIER_SIGMA = float(os.getenv("STAT_OUTLIER_SIGMA", 0))
+
+# Mode multi-processus : les clusters sont répartis entre GATEWAY_SHARDS workers (1 = un seul processus)
+GATEWAY_SHARDS = int(os.getenv("GATEWAY_SHARDS", 1))
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", 8))  # Paquets en attente par worker
+
+TICK_INTERVAL = float(os.getenv("TICK_INTERVAL", 1.5))  # Secondes entre deux paquets rejoués
+
+# Nettoyage vectorisé de tout un paquet (devices x métriques) au lieu de clean_value valeur par valeur
+BATCH_CLEANING = os.getenv("BATCH_CLEANING", "true").lower() == "true"
+
+# Métriques au format Prometheus : GET /metrics sur METRICS_PORT (0 = désactivé) et/ou fichier METRICS_FILE
+# En multi-processus, le worker N utilise METRICS_PORT + N et METRICS_FILE.N
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", 5))  # Secondes entre deux écritures
+
+# Checkpoint de l'état de nettoyage (fenêtres, compteurs de défauts, états), restauré au démarrage
+# (ex. gateway_state.npz ; "" = désactivé). En multi-processus, un fichier par worker : CHECKPOINT_FILE.N
+CHECKPOINT_FILE = os.getenv("CHECKPOINT_FILE", "")
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", 20))  # Paquets entre deux sauvegardes
+
+# Toujours collectées (coût négligeable), exposées seulement si METRICS_PORT / METRICS_FILE
+metrics = Metrics()
+metrics.histogram("gateway_tick_duration_seconds", "Durée de traitement d'un paquet par étape (clean, send, total)")
+metrics.counter("gateway_ticks_total", "Paquets traités")
+metrics.counter("gateway_tick_overruns_total", "Paquets traités en plus de TICK_INTERVAL secondes")
+metrics.histogram("gateway_http_request_duration_seconds", "Latence des requêtes HTTP par destination")
+metrics.counter("gateway_http_requests_total", "Requêtes HTTP par destination et code (error : serveur injoignable)")
+
+def http_target(url):
+    if url.startswith(IOTA_ADMIN_URL):
+        return "iota_admin"
+    if url.startswith(IOTA_HTTP_URL):
+        return "iota"
+    return "orion"
+
+def observe_http(url, status, seconds):
+    target = http_target(url)
+    metrics.observe("gateway_http_request_duration_seconds", seconds, {"target": target})
+    metrics.inc("gateway_http_requests_total", {"target": target, "code": status or "error"})
+
+http_sender.on_response = observe_http
+
 LAT_ORIGIN=46.194814
 LON_ORIGIN=1.190861
 
@@ -82,19 +199,121 @@ THRESHOLDS = {
     'ph': (4, 9)                   # pH
 }
 
+# Mapping object_id (payload IoT Agent) -> attribut NGSI, commun à tous les clusters
+DEVICE_ATTRIBUTES = [
+    {"object_id": "date", "name": "TimeInstant", "type": "DateTime"},
+    {"object_id": "ta", "name": "temperature", "type": "Number"},
+    {"object_id": "ts", "name": "soilTemperature", "type": "Number"},
+    {"object_id": "ha", "name": "humidity", "type": "Number"},
+    {"object_id": "hs", "name": "soilMoisture", "type": "Number"},
+    {"object_id": "n",  "name": "n", "type": "Number"},
+    {"object_id": "p",  "name": "p", "type": "Number"},
+    {"object_id": "k",  "name": "k", "type": "Number"},
+    {"object_id": "ph", "name": "ph", "type": "Number"},
+    {"object_id": "state", "name": "state", "type": "String"},
+    {"object_id": "recomm", "name": "irrigationrecommendation", "type": "String"},
+    {"object_id": "fs", "name": "fieldState", "type": "Integer"},
+]
+
+ENTITY_PREFIX = "urn:ngsi-ld:Cluster:"
+ENTITY_TYPE = "Cluster"
+
+def build_device_config(device_id, lat, lon):
+    """Configuration de provisioning d'un cluster pour l'IoT Agent"""
+    return {
+        "device_id": device_id,
+        "apikey": API_KEY,
+        "entity_name": ENTITY_PREFIX + device_id,
+        "entity_type": ENTITY_TYPE,
+        "protocol": "PDI-IoTA-UltraLight" if PAYLOAD_FORMAT == "ultralight" else "IoTA-JSON",
+        "transport": "HTTP",
+        "endpoint": f"http://iot-agent:7896{IOTA_RESOURCE}",
+        "attributes": DEVICE_ATTRIBUTES,
+        "static_attributes": [
+            {"name": "longitude", "type": "Number", "value": lon}, 
+            {"name": "latitude", "type": "Number", "value": lat},
+        ]
+    }
+
+def device_config_for(device_id):
+    """Configuration de provisioning à partir de la position connue du capteur"""
+    x, y = sensors_positions.get(device_id, (0, 0))
+    lat, lon = calculate_gps_coords(x, y)
+    return build_device_config(device_id, lat, lon)
+
 class SensorGateway:
-    def __init__(self):
-        # Mémoire tampon : dictionnaire de deques (historique des 5 dernières valeurs valides)
-        self.memory = defaultdict(lambda: defaultdict(lambda: deque(maxlen=5)))
+    def __init__(self, registry=None):
+        # Mémoire tampon : historique des 5 dernières valeurs valides (moyenne/écart type comme np.mean / np.std)
+        self.memory = defaultdict(lambda: defaultdict(lambda: RollingWindow(maxlen=5)))
         
         # Pour détecter les capteurs defectueux (Freeze)
         self.defects_counters = defaultdict(lambda: defaultdict(int))
         
-        # Conserver la liste des devices déjà provisionnés
-        self.known_devices = set()
+        # États techniques (ACTIVE / ERROR_*) : signalés pendant le nettoyage, envoyés en fin de tick
+        self.state_events = DeviceStateEvents()
+
+        # Conserver la liste des devices déjà provisionnés (persistée dans le registre local)
+        self.registry = registry
+        self.known_devices = set(registry.devices) if registry is not None else set()
+        # Envoi asynchrone : devices en cours de provisioning, et résultats remontés par le thread d'envoi
+        self.provisioning = set()
+        self.provision_results = queue.SimpleQueue()
+
+    def _mark_registered(self, device_ids):
+        self.known_devices.update(device_ids)
+        if self.registry is not None:
+            self.registry.add(device_ids)
+
+    def apply_provision_results(self):
+        """
+        Résultats des provisionings asynchrones (thread principal) : accepté -> registre local,
+        refusé -> nouvel essai au prochain paquet, inconnu (spool, file pleine) -> connu pour cette session
+        """
+        registered = []
+        while not self.provision_results.empty():
+            device_id, accepted = self.provision_results.get()
+            self.provisioning.discard(device_id)
+            if accepted:
+                registered.append(device_id)
+            elif accepted is None:
+                self.known_devices.add(device_id)
+            else:
+                print(f"❌ Échec provisioning {device_id}, nouvel essai au prochain paquet")
+        if registered:
+            self._mark_registered(registered)
+
+    def provision_devices(self, device_ids):
+        """Provisioning groupé : un seul tableau `devices` par requête pour tous les devices inconnus"""
+        missing = [d for d in device_ids if d not in self.known_devices]
+        if not missing:
+            print(f"✅ {len(device_ids)} devices déjà enregistrés (registre local)")
+            return
+
+        print(f"🆕 Provisioning groupé de {len(missing)} devices...")
+        for start in range(0, len(missing), PROVISION_BATCH_SIZE):
+            chunk = missing[start:start + PROVISION_BATCH_SIZE]
+            provisioning_payload = {"devices": [device_config_for(d) for d in chunk]}
+            try:
+                response = requests.post(IOTA_ADMIN_URL, json=provisioning_payload, headers=FIWARE_HEADERS)
+            except Exception as e:
+                print(f"❌ Erreur connexion Admin API: {e}")
+                return
+
+            if response.status_code in [201, 200]:
+                print(f"✅ {len(chunk)} devices enregistrés (Code {response.status_code})")
+                self._mark_registered(chunk)
+            elif response.status_code == 409:
+                # Au moins un device existe déjà : l'IoT Agent rejette le lot, on repasse device par device
+                print("ℹ️ Devices déjà existants dans le lot, enregistrement individuel...")
+                for device_id in chunk:
+                    self.ensure_device_exists(device_id)
+            else:
+                print(f"❌ Échec provisioning groupé: {response.text}")
 
     def ensure_device_exists(self, device_id):
-        if device_id in self.known_devices:
+        if not self.provision_results.empty():
+            self.apply_provision_results()
+        if device_id in self.known_devices or device_id in self.provisioning:
             return True
 
         print(f"🆕 Nouveau device détecté : {device_id}. Tentative d'enregistrement...")
@@ -103,43 +322,21 @@ class SensorGateway:
         lat, lon = calculate_gps_coords(x, y)
         print(f"   📍 Position GPS calculée : lat={lat}, lon={lon}")
         
-        provisioning_payload = {
-            "devices": [
-                {
-                    "device_id": device_id,
-                    "apikey": API_KEY,
-                    "entity_name": "urn:ngsi-ld:Cluster:" + device_id,
-                    "entity_type": "Cluster",
-                    "protocol": "IoTA-JSON",
-                    "transport": "HTTP",
-                    "endpoint": "http://iot-agent:7896/iot/json",
-                    "attributes": [
-                        {"object_id": "date", "name": "TimeInstant", "type": "DateTime"},
-                        {"object_id": "ta", "name": "temperature", "type": "Number"},
-                        {"object_id": "ts", "name": "soilTemperature", "type": "Number"},
-                        {"object_id": "ha", "name": "humidity", "type": "Number"},
-                        {"object_id": "hs", "name": "soilMoisture", "type": "Number"},
-                        {"object_id": "n",  "name": "n", "type": "Number"},
-                        {"object_id": "p",  "name": "p", "type": "Number"},
-                        {"object_id": "k",  "name": "k", "type": "Number"},
-                        {"object_id": "ph", "name": "ph", "type": "Number"},
-                        {"object_id": "state", "name": "state", "type": "String"},
-                        {"object_id": "recomm", "name": "irrigationrecommendation", "type": "String"},
-                        {"object_id": "fs", "name": "fieldState", "type": "Integer"},
-                    ],
-                    "static_attributes": [
-                        {"name": "longitude", "type": "Number", "value": lon}, 
-                        {"name": "latitude", "type": "Number", "value": lat},
-                    ]
-                }
-            ]
-        }
+        provisioning_payload = {"devices": [build_device_config(device_id, lat, lon)]}
+
+        if ASYNC_SEND:
+            # Même partition que les mesures du device : l'enregistrement passe avant elles
+            self.provisioning.add(device_id)
+            transport.post(IOTA_ADMIN_URL, provisioning_payload, headers=FIWARE_HEADERS,
+                           label=f"provisioning {device_id}", key=device_id, ok_statuses=(200, 201, 409),
+                           on_result=lambda accepted: self.provision_results.put((device_id, accepted)))
+            return True
 
         try:
             response = requests.post(IOTA_ADMIN_URL, json=provisioning_payload, headers=FIWARE_HEADERS)
             if response.status_code in [201, 200, 409]:
                 print(f"✅ Device {device_id} enregistré (Code {response.status_code})")
-                self.known_devices.add(device_id)
+                self._mark_registered([device_id])
                 return True
             else:
                 print(f"❌ Échec provisioning {device_id}: {response.text}")
@@ -150,37 +347,28 @@ class SensorGateway:
 
 
     def clean_value(self, device_id, metric, value):
+        clean_val, status = self._clean_value(device_id, metric, value)
+        self.state_events.record(device_id, metric, status)
+        return clean_val, status
+
+    def _clean_value(self, device_id, metric, value):
+        history = self.memory[device_id][metric]
+
         # 1. Gestion des NaN
         if pd.isna(value):
-            if len(self.memory[device_id][metric]) > 0:
+            if len(history) > 0:
                 self.defects_counters[device_id][metric] += 1
                 count = self.defects_counters[device_id][metric]
                 
-                print(f"   ⚠️ Capteur {device_id} metric {metric} est NaN ({count}/5)")
+                debug_print(f"   ⚠️ Capteur {device_id} metric {metric} est NaN ({count}/5)")
 
                 if count > 5:
                     fixed_value = -0.001
-                    print(f"   ❄️ Capteur {device_id} metric {metric} CASSÉ. Forçage à {fixed_value}.")
-                    
-                    # Update state in Orion for maintenance
-                    payload = {
-                        "state": {
-                            "value": "ERROR_BROKEN",
-                            "type": "String",
-                            "metadata": {
-                                "timestamp": {
-                                    "value": pd.Timestamp.now().isoformat(),
-                                    "type": "DateTime"
-                                }
-                            }
-                        }
-                    }
-                    send_to_orion(device_id, payload)
-                    
+                    debug_print(f"   ❄️ Capteur {device_id} metric {metric} CASSÉ. Forçage à {fixed_value}.")
                     return fixed_value, "FIXED_BROKEN"
                 
                 else:
-                    corrected = np.mean(self.memory[device_id][metric])
+                    corrected = history.mean()
                     return corrected, "FIXED_NAN"
 
             else:
@@ -193,162 +381,470 @@ class SensorGateway:
         # 2. Gestion des Outliers
         t_min, t_max = THRESHOLDS.get(metric, (-999, 999))
         if value < t_min or value > t_max:
-            if len(self.memory[device_id][metric]) > 0:
-                corrected = np.mean(self.memory[device_id][metric])
+            if len(history) > 0:
+                corrected = history.mean()
                 return corrected, "FIXED_OUTLIER"
             else:
                 corrected = max(t_min, min(value, t_max))
                 return corrected, "CLIPPED"
         
-        #3. gestion des valeurs hors de portée statistique (3 écarts types)
-    #    if len(self.memory[device_id][metric]) >= 2:
-    #        mean_hist = np.mean(self.memory[device_id][metric])
-    #        std_hist = np.std(self.memory[device_id][metric])
-    #        if std_hist > 0:
-    #            if abs(value - mean_hist) > 5 * std_hist:
-    #                corrected = mean_hist
-    #                return corrected, "FIXED_STAT_OUTLIER"
+        # 3. Gestion des valeurs hors de portée statistique (STAT_OUTLIER_SIGMA écarts types)
+        if STAT_OUTLIER_SIGMA > 0 and len(history) >= 2:
+            mean_hist = history.mean()
+            std_hist = history.std()
+            if std_hist > MIN_STD:
+                if abs(value - mean_hist) > STAT_OUTLIER_SIGMA * std_hist:
+                    corrected = mean_hist
+                    return corrected, "FIXED_STAT_OUTLIER"
 
         # 4. Gestion du Freeze (Capteur bloqué)
-        if len(self.memory[device_id][metric]) > 0:
-            last_val = self.memory[device_id][metric][-1]
+        if len(history) > 0:
+            last_val = history[-1]
             if value == last_val:
                 self.defects_counters[device_id][metric] += 1
             else:
                 self.defects_counters[device_id][metric] = 0
             
-            self.memory[device_id][metric].append(value)
+            history.append(value)
 
             # Si bloqué depuis plus de 5 cycles
             if self.defects_counters[device_id][metric] > 5:
                 value = -0.001
-                print(f"   ❄️ Capteur {device_id} metric {metric} gelé. Forçage valeur à {value}.")
-                
-                # Update state in Orion for maintenance
-                payload = {
-                    "state": {
-                        "value": "ERROR_FROZEN",
-                        "type": "String",
-                        "metadata": {
-                            "timestamp": {
-                                "value": pd.Timestamp.now().isoformat(),
-                                "type": "DateTime"
-                            }
-                        }
-                    }
-                }
-                send_to_orion(device_id, payload)
-                
+                debug_print(f"   ❄️ Capteur {device_id} metric {metric} gelé. Forçage valeur à {value}.")
                 return value, "FIXED_FREEZE"
 
         # 5. Lissage du Bruit
-        if len(self.memory[device_id][metric]) > 0:
-            avg_history = np.mean(self.memory[device_id][metric])
+        if len(history) > 0:
+            avg_history = history.mean()
             smoothed_value = (0.7 * value) + (0.3 * avg_history)
         else:
             smoothed_value = value
 
-        self.memory[device_id][metric].append(smoothed_value)
+        history.append(smoothed_value)
         return smoothed_value, "OK"
 
 
+def build_state_payload(state):
+    """Payload Orion de mise à jour de l'état technique d'un cluster"""
+    return {
+        "state": {
+            "value": state,
+            "type": "String",
+            "metadata": {
+                "timestamp": {
+                    "value": pd.Timestamp.now().isoformat(),
+                    "type": "DateTime"
+                }
+            }
+        }
+    }
+
+def build_iota_payload(iso_date, payload_clean):
+    """Conversion des métriques nettoyées vers les object_id de l'IoT Agent"""
+    return {
+        "date": iso_date,
+        "ta": payload_clean.get('temperature'),
+        "ts": payload_clean.get('soilTemperature'),
+        "ha": payload_clean.get('humidity'),
+        "hs": payload_clean.get('soilMoisture'),
+        "n": payload_clean.get('azote_mg_kg'),
+        "p": payload_clean.get('phosphore_mg_kg'),
+        "k": payload_clean.get('potassium_mg_kg'),
+        "ph": payload_clean.get('ph'),
+    }
+
+def clean_group_per_value(gateway, group, sensor_cols, iso_date, stats):
+    """Nettoyage historique : une valeur à la fois via clean_value"""
+    cleaned = []
+    for _, row in group.iterrows():
+        device_id = row['cluster_id']
+        payload_clean = {"date": iso_date}
+        
+        debug_msg = []
+        
+        for metric in sensor_cols:
+            raw_val = row[metric]
+            clean_val, status = gateway.clean_value(device_id, metric, raw_val)
+            # Arrondi NumPy (comme le nettoyage vectorisé et np.mean d'origine), pas round() de Python
+            payload_clean[metric] = float(np.round(clean_val, 2))
+            stats[(metric, status)] += 1
+            
+            if status != "OK" and status != "DEFAULT":
+                debug_msg.append(f"{metric}: {raw_val} -> {clean_val:.2f} ({status})")
+
+        if debug_msg:
+            debug_print(f"   🔧 {device_id} corrections : {', '.join(debug_msg)}")
+
+        cleaned.append((device_id, payload_clean))
+    return cleaned
+
+def clean_group_batch(batch_cleaner, state_events, group, sensor_cols, iso_date, stats):
+    """Nettoyage vectorisé : tout le paquet en une seule matrice"""
+    device_ids = group['cluster_id'].tolist()
+    raw = group[sensor_cols].to_numpy(dtype=float)
+    rows = batch_cleaner.rows_for(device_ids)
+    values, statuses = batch_cleaner.clean(device_ids, raw, rows)
+
+    for j, metric in enumerate(sensor_cols):
+        codes, counts = np.unique(statuses[:, j], return_counts=True)
+        for code, count in zip(codes, counts):
+            stats[(metric, STATUSES[code])] += int(count)
+
+    # Capteurs en panne : signalés au canal des états (envoi éventuel en fin de tick)
+    state_events.record_batch(device_ids, sensor_cols, statuses, rows, batch_cleaner.device_index)
+
+    if not QUIET:
+        for i, j in zip(*np.nonzero((statuses == FIXED_BROKEN) | (statuses == FIXED_FREEZE))):
+            device_id, metric = device_ids[i], sensor_cols[j]
+            if statuses[i, j] == FIXED_BROKEN:
+                print(f"   ❄️ Capteur {device_id} metric {metric} CASSÉ. Forçage à {values[i, j]}.")
+            else:
+                print(f"   ❄️ Capteur {device_id} metric {metric} gelé. Forçage valeur à {values[i, j]}.")
+
+        # Corrections à afficher (uniquement les lignes concernées)
+        for i in np.nonzero(((statuses != OK) & (statuses != DEFAULT)).any(axis=1))[0]:
+            debug_msg = [
+                f"{metric}: {raw[i, j]} -> {values[i, j]:.2f} ({STATUSES[statuses[i, j]]})"
+                for j, metric in enumerate(sensor_cols)
+                if statuses[i, j] not in (OK, DEFAULT)
+            ]
+            print(f"   🔧 {device_ids[i]} corrections : {', '.join(debug_msg)}")
+
+    rounded = values.round(2).tolist()
+    cleaned = []
+    for device_id, row_values in zip(device_ids, rounded):
+        payload_clean = {"date": iso_date}
+        payload_clean.update(zip(sensor_cols, row_values))
+        cleaned.append((device_id, payload_clean))
+    return cleaned
+
 def send_to_iota(device_id, payload):
     if SEND_TO_ORION:
-        try:
-            url = f"{IOTA_HTTP_URL}?k={API_KEY}&i={device_id}"
-            requests.post(url, json=payload, timeout=1)
-        except Exception as e:
-            print(f"⚠️ Erreur lors de l'envoi à l'iota pour le device {device_id}: {e}")
+        url = f"{IOTA_HTTP_URL}?k={API_KEY}&i={device_id}"
+        transport.post(url, payload, label=f"iota {device_id}", key=device_id)
 
 def send_to_orion(device_id, payload):
     if SEND_TO_ORION:
-        try:
-            print(f"   🚀 Envoi à Orion pour {device_id}: {payload}")
-            url = f"{ORION_URL}/urn:ngsi-ld:Cluster:{device_id}/attrs"
-            print(f"   🚀 URL Orion: {url}")
-            res = requests.post(url, json=payload, headers=FIWARE_HEADERS, timeout=1)
-            if res.status_code >= 400:
-                print(f"⚠️ Erreur update Orion {device_id} (HTTP {res.status_code}): {res.text}")
-        except Exception as e:
-            print(f"⚠️ Erreur lors de l'envoi à Orion pour le device {device_id}: {e}")
+        debug_print(f"   🚀 Envoi à Orion pour {device_id}: {payload}")
+        url = f"{ORION_URL}/{ENTITY_PREFIX}{device_id}/attrs"
+        debug_print(f"   🚀 URL Orion: {url}")
+        transport.post(url, payload, headers=FIWARE_HEADERS, label=f"update Orion {device_id}", key=device_id)
+
+
+def open_transport(spool_file):
+    """Construit la chaîne d'envoi selon la configuration (asynchrone et/ou spool)"""
+    global transport, send_pipeline, send_spool
+    if ASYNC_SEND:
+        transport = send_pipeline = AsyncSendPipeline(
+            workers=SEND_WORKERS, queue_size=SEND_QUEUE_SIZE, policy=SEND_QUEUE_POLICY, timeout=1, quiet=QUIET,
+        )
+        transport.on_response = observe_http
+        transport.start()
+    if spool_file:
+        send_spool = Spool(spool_file, max_items=SPOOL_MAX_ITEMS, eviction=SPOOL_EVICTION)
+        drain_sender = HttpSender(pool_size=1, timeout=1, quiet=QUIET)
+        drain_sender.on_response = observe_http
+        transport = SpoolingSender(
+            transport, send_spool, drain_sender,
+            interval=SPOOL_DRAIN_INTERVAL, batch_size=SPOOL_DRAIN_BATCH, quiet=QUIET,
+        ).start()
+    return transport
+
+def send_queue_depth():
+    if send_pipeline is None or send_pipeline.loop is None:
+        return 0
+    return send_pipeline.queue_depth()
+
+def spool_pending():
+    return len(send_spool) if send_spool is not None else 0
+
+def send_dropped():
+    return {
+        (("reason", "queue_full"),): send_pipeline.dropped if send_pipeline is not None else 0,
+        (("reason", "spool_full"),): send_spool.evicted if send_spool is not None else 0,
+    }
+
+def start_metrics(shard=None):
+    """Démarre l'exposition des métriques (un port / fichier par worker en multi-processus)"""
+    port, path = METRICS_PORT, METRICS_FILE
+    if shard is not None:
+        metrics.const_labels = (("shard", str(shard)),)
+        port = port + shard if port else 0
+        path = f"{path}.{shard}" if path else ""
+
+    metrics.gauge("gateway_send_queue_depth", "Envois en attente dans la file asynchrone", send_queue_depth)
+    metrics.gauge("gateway_spool_pending", "Envois en attente dans le spool", spool_pending)
+    metrics.counter("gateway_send_dropped_total", "Envois abandonnés (file pleine, spool plein)", send_dropped)
+    if port:
+        metrics.serve(port)
+    if path:
+        metrics.start_file_writer(path, METRICS_FILE_INTERVAL)
+
+def close_transport():
+    global transport
+    if transport is not http_sender:
+        transport.close()
+    http_sender.close()
+    transport = http_sender
+
+
+class TickProcessor:
+    """Nettoyage puis envoi d'un paquet (un timestamp), avec le bilan des corrections"""
+
+    def __init__(self, gateway, sensor_cols, checkpoint_file="", shard=None):
+        self.gateway = gateway
+        self.sensor_cols = sensor_cols
+        self.batch_cleaner = BatchSensorCleaner(sensor_cols, THRESHOLDS, stat_sigma=STAT_OUTLIER_SIGMA)
+        self.checkpoint = None
+        if checkpoint_file:
+            self.checkpoint = GatewayCheckpoint(
+                checkpoint_file, CHECKPOINT_EVERY, gateway, self.batch_cleaner, sensor_cols,
+                initial_device_sent, shard=shard, n_shards=GATEWAY_SHARDS,
+            )
+        self.batcher = TickBatcher(
+            transport, SEND_MODE, IOTA_HTTP_URL, ORION_BATCH_URL, API_KEY, FIWARE_HEADERS,
+            DEVICE_ATTRIBUTES, ENTITY_PREFIX, ENTITY_TYPE, batch_size=ORION_BATCH_SIZE,
+            payload_format=PAYLOAD_FORMAT, measures_per_post=MEASURES_PER_POST,
+        )
+        # (métrique, statut) -> nombre de valeurs
+        self.stats = Counter()
+        metrics.counter(
+            "gateway_corrections_total", "Valeurs nettoyées par métrique et statut de correction",
+            lambda: {(("metric", m), ("status", s)): n for (m, s), n in dict(self.stats).items()},
+        )
+
+    def process(self, timestamp, group):
+        start = time.perf_counter()
+        iso_date = timestamp.isoformat()
+        debug_print(f"\n  Réception paquet : {iso_date}")
+
+        if BATCH_CLEANING:
+            cleaned = clean_group_batch(
+                self.batch_cleaner, self.gateway.state_events, group, self.sensor_cols, iso_date, self.stats,
+            )
+        else:
+            cleaned = clean_group_per_value(self.gateway, group, self.sensor_cols, iso_date, self.stats)
+        cleaned_at = time.perf_counter()
+        
+        for device_id, payload_clean in cleaned:
+            payload = build_iota_payload(iso_date, payload_clean)
+
+            # ENVOI VERS ORION
+            if SEND_TO_ORION:
+                if not self.gateway.ensure_device_exists(device_id):
+                    continue
+                static_attributes = ()
+                if device_id not in initial_device_sent:
+                    debug_print("Uniquement les premières données de chaque device sont envoyées pour éviter que CrateDB fasse n'importe quoi...")
+                    initial_device_sent[device_id] = True
+                    payload["state"] = "ACTIVE"
+                    payload["fieldState"] = 2  # Standard par défaut
+                    payload["irrigationrecommendation"] = "NO_IRRIGATION"
+                    if SEND_MODE == "orion_batch":
+                        # Sans IoT Agent, la position n'est pas ajoutée automatiquement à l'entité
+                        static_attributes = device_config_for(device_id)["static_attributes"]
+                self.batcher.add(device_id, payload, static_attributes)
+
+        # Envoi groupé de tout le paquet (mesures accumulées comprises avant un checkpoint)
+        self.batcher.flush(force=self.checkpoint is not None and self.checkpoint.due())
+
+        # Changements d'état technique : un seul envoi par device, uniquement sur transition
+        for device_id, previous, state in self.gateway.state_events.flush():
+            debug_print(f"   🔁 État {device_id} : {previous} -> {state}")
+            send_to_orion(device_id, build_state_payload(state))
+
+        end = time.perf_counter()
+        metrics.observe("gateway_tick_duration_seconds", cleaned_at - start, {"stage": "clean"})
+        metrics.observe("gateway_tick_duration_seconds", end - cleaned_at, {"stage": "send"})
+        metrics.observe("gateway_tick_duration_seconds", end - start, {"stage": "total"})
+        metrics.inc("gateway_ticks_total")
+        if TICK_INTERVAL > 0 and end - start > TICK_INTERVAL:
+            metrics.inc("gateway_tick_overruns_total")
+
+        if self.checkpoint is not None:
+            self.checkpoint.tick(timestamp)
+
+    def restore(self):
+        """Restaure l'état du dernier checkpoint. Retourne le timestamp du dernier paquet inclus"""
+        return self.checkpoint.restore() if self.checkpoint is not None else None
+
+    def close(self, completed):
+        """
+        Fin de rejeu : envoi des mesures encore accumulées, puis checkpoint effacé si le fichier
+        a été entièrement traité, sauvegardé sinon
+        """
+        self.batcher.flush(force=True)
+        if self.checkpoint is None:
+            return
+        if completed:
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save()
+
+
+def print_stats(stats):
+    """Bilan des corrections par métrique"""
+    print("\n📊 Bilan des corrections :")
+    for metric in THRESHOLDS:
+        counts = {status: n for (m, status), n in stats.items() if m == metric}
+        if counts:
+            total = sum(counts.values())
+            details = ", ".join(f"{status}={n}" for status, n in sorted(counts.items()))
+            print(f"   {metric}: {total} valeurs ({details})")
+
+
+def run_shard(shard, inbox, outbox, sensor_cols, known_devices):
+    """Worker du mode multi-processus : nettoie et envoie sa partition de clusters"""
+    stats = Counter()
+    processor = None
+    completed = False
+    try:
+        # Un spool par worker (le compteur du spool n'est pas partagé entre processus)
+        open_transport(f"{SPOOL_FILE}.{shard}" if SPOOL_FILE else "")
+        # Registre par worker, comme le spool et le checkpoint : les devices provisionnés à la volée
+        # par ce worker sont retrouvés au prochain démarrage (hachage stable cluster -> worker)
+        gateway = SensorGateway(DeviceRegistry(f"{DEVICE_REGISTRY_FILE}.{shard}", IOTA_ADMIN_URL, API_KEY))
+        gateway.known_devices.update(known_devices)
+        processor = TickProcessor(gateway, sensor_cols, f"{CHECKPOINT_FILE}.{shard}" if CHECKPOINT_FILE else "", shard)
+        restored = processor.restore()
+        start_metrics(shard)
+        while True:
+            item = inbox.get()
+            if item is None:
+                completed = True
+                break
+            # Reprise au checkpoint le plus ancien des workers : on saute ce qui est déjà dans le nôtre
+            if restored is not None and item[0] <= restored:
+                continue
+            processor.process(*item)
+        stats = processor.stats
+    finally:
+        if processor is not None:
+            processor.close(completed)
+        close_transport()
+        if processor is not None:
+            processor.gateway.apply_provision_results()
+        metrics.close()
+        outbox.put((shard, stats))
 
 
 # --- MAIN LOOP (SIMULATION DU TEMPS) ---
 def run_simulation():
     global initial_device_sent
+    runner = None
+    processor = None
+    completed = False
+    keyboard = None  # importé seulement si la pause clavier est activée
+    replay_from_start = False  # checkpoints multi-processus incomplets : le curseur est ignoré
     try:
-        df_dirty = pd.read_csv(INPUT_DIRTY_FILE)
-        df_dirty['timestamp'] = pd.to_datetime(df_dirty['timestamp'])
-        df_dirty = df_dirty.sort_values(by=['timestamp', 'cluster_id'])
+        columns = read_columns(INPUT_DIRTY_FILE)
         
-        gateway = SensorGateway()
+        registry = DeviceRegistry(DEVICE_REGISTRY_FILE, IOTA_ADMIN_URL, API_KEY)
+        gateway = SensorGateway(registry)
+        sensor_cols = [c for c in THRESHOLDS.keys() if c in columns]
         
-        print(f" Démarrage de la Gateway de Nettoyage ({len(df_dirty)} mesures)...")
-        print(" ASTUCE : Appuyez sur la touche ESPACE pour mettre en pause/reprendre.")
+        print(f" Démarrage de la Gateway de Nettoyage (lecture en continu de {INPUT_DIRTY_FILE})...")
+        if PAUSE_KEY:
+            print(" ASTUCE : Appuyez sur la touche ESPACE pour mettre en pause/reprendre.")
+
+        # --- PROVISIONING GROUPÉ AU DÉMARRAGE ---
+        if SEND_TO_ORION and PROVISION_SOURCE != "none":
+            if PROVISION_SOURCE == "file":
+                device_ids = read_device_ids(INPUT_DIRTY_FILE)
+            else:
+                device_ids = list(sensors_positions)
+            gateway.provision_devices(device_ids)
+
+        if GATEWAY_SHARDS > 1:
+            print(f" Mode multi-processus : {GATEWAY_SHARDS} workers")
+            runner = ShardedRunner(
+                GATEWAY_SHARDS, run_shard, (sensor_cols, set(gateway.known_devices)), queue_size=SHARD_QUEUE_SIZE,
+            ).start()
+            handle_tick = runner.submit
+            restored = None
+            if CHECKPOINT_FILE:
+                timestamps = [checkpoint_timestamp(f"{CHECKPOINT_FILE}.{shard}") for shard in range(GATEWAY_SHARDS)]
+                missing = [str(shard) for shard, ts in enumerate(timestamps) if ts is None]
+                if not missing:
+                    restored = min(timestamps)
+                elif len(missing) < GATEWAY_SHARDS:
+                    # Un worker sans état doit tout revoir : les autres sautent ce qui est déjà dans leur checkpoint
+                    print(f"⚠️ Checkpoint absent pour le(s) worker(s) {', '.join(missing)} : rejeu depuis le début")
+                    replay_from_start = True
+        else:
+            open_transport(SPOOL_FILE)
+            processor = TickProcessor(gateway, sensor_cols, CHECKPOINT_FILE)
+            handle_tick = processor.process
+            restored = processor.restore()
+            start_metrics()
 
         # --- ACTIVATION DE L'ECOUTE DU CLAVIER ---
-        keyboard.on_press_key("space", toggle_pause)
-
-        for timestamp, group in df_dirty.groupby('timestamp'):
+        if PAUSE_KEY:
+            import keyboard
+            keyboard.on_press_key("space", toggle_pause)
+
+        # --- REPRISE / POSITIONNEMENT DANS LE FICHIER ---
+        cursor = ReplayCursor(REPLAY_CURSOR_FILE, INPUT_DIRTY_FILE) if REPLAY_CURSOR_FILE else None
+        resume_after = cursor.load() if cursor is not None and not replay_from_start else None
+        if restored is not None:
+            # L'état restauré date du checkpoint : on rejoue à partir de là, même si le curseur est plus loin
+            resume_after = restored
+            print(f" Reprise après le dernier paquet sauvegardé : {resume_after.isoformat()}")
+        elif resume_after is not None:
+            print(f" Reprise après le dernier paquet acquitté : {resume_after.isoformat()}")
+        elif REPLAY_START:
+            print(f" Démarrage du rejeu à {REPLAY_START}")
+        # En multi-processus, un paquet n'est traité qu'après son passage dans les files des workers :
+        # on n'acquitte qu'avec ce retard (reprise "au moins une fois")
+        pending_acks = deque(maxlen=SHARD_QUEUE_SIZE + 2 if runner is not None else 1)
+
+        groups = iter_replay(
+            INPUT_DIRTY_FILE, start=REPLAY_START or None, after=resume_after,
+            chunksize=REPLAY_CHUNKSIZE, reorder_window=REPLAY_REORDER_WINDOW,
+        )
+        for timestamp, group in groups:
             
             # --- BOUCLE DE PAUSE ---
             while is_paused:
                 time.sleep(0.1) # Petite pause pour ne pas surcharger le CPU
 
-            iso_date = timestamp.isoformat()
-            print(f"\n  Réception paquet : {iso_date}")
-            
-            for _, row in group.iterrows():
-                device_id = row['cluster_id']
-                payload_clean = {"date": iso_date}
-                sensor_cols = [c for c in THRESHOLDS.keys() if c in df_dirty.columns]
-                
-                debug_msg = []
-                
-                for metric in sensor_cols:
-                    raw_val = row[metric]
-                    clean_val, status = gateway.clean_value(device_id, metric, raw_val)
-                    payload_clean[metric] = round(clean_val, 2)
-                    
-                    if status != "OK" and status != "DEFAULT":
-                        debug_msg.append(f"{metric}: {raw_val} -> {clean_val:.2f} ({status})")
-
-                if debug_msg:
-                    print(f"   🔧 {device_id} corrections : {', '.join(debug_msg)}")
-
-                payload = {
-                    "date": iso_date,
-                    "ta": payload_clean.get('temperature'),
-                    "ts": payload_clean.get('soilTemperature'),
-                    "ha": payload_clean.get('humidity'),
-                    "hs": payload_clean.get('soilMoisture'),
-                    "n": payload_clean.get('azote_mg_kg'),
-                    "p": payload_clean.get('phosphore_mg_kg'),
-                    "k": payload_clean.get('potassium_mg_kg'),
-                    "ph": payload_clean.get('ph'),
-                }
+            handle_tick(timestamp, group)
 
-                # ENVOI VERS ORION
-                if SEND_TO_ORION:
-                    if not gateway.ensure_device_exists(device_id):
-                        continue
-                    if device_id not in initial_device_sent:
-                        print("Uniquement les premières données de chaque device sont envoyées pour éviter que CrateDB fasse n'importe quoi...")
-                        initial_device_sent[device_id] = True
-                        payload["state"] = "ACTIVE"
-                        payload["fieldState"] = 2  # Standard par défaut
-                        payload["irrigationrecommendation"] = "NO_IRRIGATION"
-                    send_to_iota(device_id, payload)
+            if cursor is not None:
+                pending_acks.append(timestamp)
+                if len(pending_acks) == pending_acks.maxlen:
+                    cursor.ack(pending_acks[0])
             
-            time.sleep(1.5)
+            time.sleep(TICK_INTERVAL)
+
+        if runner is not None:
+            stats = runner.finish()
+            runner = None
+        else:
+            stats = processor.stats
+        print_stats(stats)
 
+        # Rejeu complet : le prochain démarrage repart du début
+        completed = True
+        if cursor is not None:
+            cursor.clear()
         print("\n✅ Simulation terminée. Données nettoyées et envoyées.")
 
     except FileNotFoundError:
         print(f"❌ Erreur: Fichier {INPUT_DIRTY_FILE} introuvable.")
     finally:
         # Nettoyage : on arrête d'écouter le clavier à la fin
-        keyboard.unhook_all()
+        if keyboard is not None:
+            keyboard.unhook_all()
+        if runner is not None:
+            runner.terminate()
+        if processor is not None:
+            processor.close(completed)
+        close_transport()
+        if processor is not None:
+            # Provisionings asynchrones acceptés pendant la vidange de la file -> registre local
+            processor.gateway.apply_provision_results()
+        metrics.close()
 
 if __name__ == "__main__":
-    run_simulation()
\ No newline at end of file
+    run_simulation()
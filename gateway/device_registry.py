@@ -0,0 +1,52 @@
+import json
+import os
+from datetime import datetime
+
+
+class DeviceRegistry:
+    """
+    Registre local (fichier JSON) des devices déjà provisionnés auprès de l'IoT Agent,
+    pour ne pas les réenregistrer à chaque redémarrage de la gateway.
+    Le registre est rattaché à une URL d'administration et une API key : si l'une change,
+    les devices sont considérés comme inconnus.
+    """
+
+    def __init__(self, path, admin_url, api_key):
+        self.path = path
+        self.scope = f"{admin_url}|{api_key}"
+        self.devices = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Registre des devices illisible ({self.path}), ignoré : {e}")
+            return
+        if data.get("scope") == self.scope:
+            self.devices = data.get("devices", {})
+        else:
+            print("ℹ️ Registre des devices créé pour une autre IoT Agent / API key, ignoré.")
+
+    def save(self):
+        """Écriture atomique (fichier temporaire puis renommage)"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"scope": self.scope, "devices": self.devices}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def __contains__(self, device_id):
+        return device_id in self.devices
+
+    def add(self, device_ids):
+        registered_at = datetime.now().isoformat(timespec="seconds")
+        for device_id in device_ids:
+            self.devices[device_id] = {"registered_at": registered_at}
+        self.save()
+
+    def clear(self):
+        self.devices = {}
+        self.save()
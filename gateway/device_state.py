@@ -0,0 +1,92 @@
+import numpy as np
+
+from batch_cleaner import STATUSES, FIXED_BROKEN, FIXED_FREEZE
+
+ACTIVE = "ACTIVE"
+
+# Statut de nettoyage -> état technique du cluster
+FAULT_STATES = {"FIXED_BROKEN": "ERROR_BROKEN", "FIXED_FREEZE": "ERROR_FROZEN"}
+
+# Le plus grave l'emporte quand plusieurs métriques sont en défaut
+SEVERITY = {ACTIVE: 0, "ERROR_FROZEN": 1, "ERROR_BROKEN": 2}
+
+
+class DeviceStateEvents:
+    """
+    Canal latéral des états techniques : le nettoyage y signale les défauts (sans appel réseau),
+    et flush() renvoie en fin de tick uniquement les vraies transitions, une par device.
+    """
+
+    def __init__(self):
+        self.faults = {}      # device -> {métrique: état de défaut}
+        self.reported = {}    # device -> dernier état envoyé à Orion (ACTIVE par défaut)
+        self.changed = set()  # devices dont les défauts ont changé pendant le tick
+
+    def fault(self, device_id, metric, state):
+        metrics = self.faults.setdefault(device_id, {})
+        if metrics.get(metric) != state:
+            metrics[metric] = state
+            self.changed.add(device_id)
+
+    def clear(self, device_id, metric):
+        metrics = self.faults.get(device_id)
+        if metrics and metric in metrics:
+            del metrics[metric]
+            if not metrics:
+                del self.faults[device_id]
+            self.changed.add(device_id)
+
+    def record(self, device_id, metric, status):
+        """Appelé pour chaque valeur nettoyée (chemin valeur par valeur)"""
+        state = FAULT_STATES.get(status)
+        if state is not None:
+            self.fault(device_id, metric, state)
+        elif device_id in self.faults:
+            self.clear(device_id, metric)
+
+    def record_batch(self, device_ids, metrics, statuses, rows, device_index):
+        """
+        Même chose pour une matrice de codes de statut (chemin vectorisé). `rows` et `device_index`
+        sont les lignes stables de BatchSensorCleaner (paquet -> ligne, device -> ligne).
+        """
+        is_fault = (statuses == FIXED_BROKEN) | (statuses == FIXED_FREEZE)
+        for i, j in zip(*np.nonzero(is_fault)):
+            self.fault(device_ids[i], metrics[j], FAULT_STATES[STATUSES[statuses[i, j]]])
+
+        if self.faults:
+            # Seuls les devices déjà en défaut sont examinés, pas tout le paquet :
+            # ligne stable -> position dans le paquet, puis masque des défauts terminés
+            position = np.full(len(device_index), -1, dtype=np.int64)
+            position[rows] = np.arange(len(rows))
+            faulted = [(device_id, position[device_index[device_id]])
+                       for device_id in self.faults if device_id in device_index]
+            faulted = [(device_id, i) for device_id, i in faulted if i >= 0]
+            if not faulted:
+                return
+            columns = {metric: j for j, metric in enumerate(metrics)}
+            was_fault = np.zeros((len(faulted), len(metrics)), dtype=bool)
+            for k, (device_id, _) in enumerate(faulted):
+                for metric in self.faults[device_id]:
+                    if metric in columns:
+                        was_fault[k, columns[metric]] = True
+            ended = was_fault & ~is_fault[[i for _, i in faulted]]
+            for k, j in zip(*np.nonzero(ended)):
+                self.clear(faulted[k][0], metrics[j])
+
+    def state_of(self, device_id):
+        metrics = self.faults.get(device_id)
+        if not metrics:
+            return ACTIVE
+        return max(metrics.values(), key=SEVERITY.get)
+
+    def flush(self):
+        """Transitions du tick : [(device, ancien état, nouvel état), ...]"""
+        transitions = []
+        for device_id in self.changed:
+            state = self.state_of(device_id)
+            previous = self.reported.get(device_id, ACTIVE)
+            if state != previous:
+                self.reported[device_id] = state
+                transitions.append((device_id, previous, state))
+        self.changed.clear()
+        return transitions
@@ -0,0 +1,166 @@
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes des histogrammes (secondes) : de la requête HTTP rapide au tick qui dépasse son budget
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.5, 5.0, 10.0)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    Registre minimal de métriques au format texte Prometheus, sans dépendance.
+    - compteurs et histogrammes alimentés par inc() / observe()
+    - compteurs et jauges "à la lecture" : une fonction appelée au rendu qui retourne
+      {labels (dict ou tuple de paires): valeur}, pour exposer un état existant sans coût à chaud
+    Exposition au choix : serveur HTTP (GET /metrics) et/ou fichier réécrit périodiquement
+    (format textfile de node_exporter).
+    """
+
+    def __init__(self, const_labels=None):
+        self.lock = threading.Lock()
+        self.const_labels = _labels_key(const_labels)
+        self.help = {}
+        self.types = {}
+        self.counters = {}    # nom -> {labels: valeur}
+        self.histograms = {}  # nom -> (bornes, {labels: [compteurs par borne..., somme, total]})
+        self.callbacks = {}   # nom -> fonction
+        self.server = None
+        self.file_thread = None
+        self.stop_event = threading.Event()
+
+    def _declare(self, name, kind, help_text):
+        self.help.setdefault(name, help_text)
+        self.types.setdefault(name, kind)
+
+    def counter(self, name, help_text, fn=None):
+        self._declare(name, "counter", help_text)
+        if fn is not None:
+            self.callbacks[name] = fn
+        else:
+            self.counters.setdefault(name, {})
+
+    def gauge(self, name, help_text, fn):
+        self._declare(name, "gauge", help_text)
+        self.callbacks[name] = fn
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._declare(name, "histogram", help_text)
+        self.histograms.setdefault(name, (tuple(buckets), {}))
+
+    def inc(self, name, labels=None, value=1):
+        key = _labels_key(labels)
+        with self.lock:
+            series = self.counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = _labels_key(labels)
+        buckets, series = self.histograms[name]
+        with self.lock:
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(buckets) + 2)
+            counts[bisect.bisect_left(buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name in self.types:
+                lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {self.types[name]}")
+                if name in self.histograms:
+                    lines.extend(self._render_histogram(name))
+                    continue
+                if name in self.callbacks:
+                    result = self.callbacks[name]()
+                    series = result if isinstance(result, dict) else {(): result}
+                else:
+                    series = self.counters[name]
+                for labels, value in series.items():
+                    key = _labels_key(labels) if isinstance(labels, dict) else tuple(labels)
+                    lines.append(f"{name}{_format_labels(self.const_labels + key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _render_histogram(self, name):
+        buckets, series = self.histograms[name]
+        for key, counts in series.items():
+            key = self.const_labels + key
+            cumulative = 0
+            for bound, count in zip(buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}"
+            yield f"{name}_sum{_format_labels(key)} {_format_value(counts[-2])}"
+            yield f"{name}_count{_format_labels(key)} {counts[-1]}"
+
+    def write(self, path):
+        """Écriture atomique du fichier de métriques"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host="0.0.0.0"):
+        """Expose GET /metrics dans un thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"📈 Métriques exposées sur http://{host}:{port}/metrics")
+        return self
+
+    def start_file_writer(self, path, interval=5.0):
+        """Réécrit le fichier toutes les `interval` secondes (et une dernière fois à l'arrêt)"""
+        def run():
+            while not self.stop_event.wait(interval):
+                self.write(path)
+            self.write(path)
+
+        self.file_thread = threading.Thread(target=run, name="metrics-file", daemon=True)
+        self.file_thread.start()
+        print(f"📈 Métriques écrites dans {path} toutes les {interval:g} s")
+        return self
+
+    def close(self):
+        self.stop_event.set()
+        if self.file_thread is not None:
+            self.file_thread.join()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,71 @@
+import math
+from collections import deque
+
+# En dessous, un écart type n'est que du bruit d'arrondi (fenêtre quasi constante)
+MIN_STD = 1e-6
+
+
+class RollingWindow:
+    """
+    Fenêtre glissante des dernières valeurs d'un capteur, avec moyenne et écart type.
+    Pas de sommes glissantes : les statistiques sont recalculées depuis la fenêtre, en O(taille de la
+    fenêtre), au premier appel qui suit un append (clean_value ajoute avant presque chaque mean()).
+    Le calcul suit l'ordre d'opérations de np.mean / np.std : résultats identiques au bit près pour
+    les fenêtres de moins de 8 valeurs, sans dérive d'arrondi ni tableau NumPy créé à chaque appel.
+    S'utilise comme le deque d'origine (append, len, [-1], itération).
+    """
+
+    __slots__ = ("values", "_mean", "_std")
+
+    def __init__(self, maxlen=5, values=()):
+        self.values = deque(values, maxlen=maxlen)
+        self._mean = None
+        self._std = None
+
+    @property
+    def maxlen(self):
+        return self.values.maxlen
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def append(self, value):
+        self.values.append(value)
+        self._mean = self._std = None
+
+    def get_state(self):
+        """Valeurs de la fenêtre : les statistiques s'en déduisent exactement"""
+        return list(self.values)
+
+    @classmethod
+    def from_state(cls, maxlen, values):
+        return cls(maxlen=maxlen, values=values)
+
+    def mean(self):
+        if not self.values:
+            return float("nan")
+        if self._mean is None:
+            total = 0.0
+            for value in self.values:
+                total += value
+            self._mean = total / len(self.values)
+        return self._mean
+
+    def std(self):
+        """Écart type de population (comme np.std)"""
+        if not self.values:
+            return float("nan")
+        if self._std is None:
+            mean = self.mean()
+            total = 0.0
+            for value in self.values:
+                delta = value - mean
+                total += delta * delta
+            self._std = math.sqrt(total / len(self.values))
+        return self._std
@@ -0,0 +1,195 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def is_accepted(status, ok_statuses=None):
+    return status in ok_statuses if ok_statuses else status < 400
+
+
+def text_headers(headers):
+    """En-têtes d'un corps texte brut (UltraLight) : le Content-Type JSON éventuel est remplacé"""
+    return {**(headers or {}), "Content-Type": "text/plain"}
+
+
+def is_retryable(status):
+    """Échec transitoire (serveur injoignable ou en erreur) : l'envoi peut être rejoué plus tard"""
+    return status is None or status >= 500
+
+
+class HttpSender:
+    """Client HTTP partagé : une seule session keep-alive avec un pool de connexions"""
+
+    def __init__(self, pool_size=10, timeout=1, quiet=False):
+        self.timeout = timeout
+        self.quiet = quiet  # pas d'affichage par envoi en erreur (les métriques restent)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Appelé avec le job (url, payload, headers, label, key, ok_statuses) quand l'envoi
+        # échoue faute de serveur joignable (réseau, timeout, HTTP 5xx)
+        self.on_failure = None
+        # Appelé avec (url, code HTTP ou None, durée en secondes) après chaque requête (métriques)
+        self.on_response = None
+
+    def send(self, url, payload, headers=None):
+        """
+        POST brut : JSON, ou texte tel quel si le payload est une chaîne (UltraLight).
+        Retourne (code HTTP, texte), ou (None, erreur) si le serveur est injoignable
+        """
+        start = time.perf_counter()
+        try:
+            if isinstance(payload, str):
+                res = self.session.post(url, data=payload.encode(), headers=text_headers(headers),
+                                        timeout=self.timeout)
+            else:
+                res = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+            status, text = res.status_code, res.text
+        except Exception as e:
+            status, text = None, str(e)
+        if self.on_response is not None:
+            self.on_response(url, status, time.perf_counter() - start)
+        return status, text
+
+    def post(self, url, payload, headers=None, label="", key=None, ok_statuses=None, on_result=None):
+        """
+        POST JSON (ou texte, voir send). Retourne True si le serveur a accepté la requête.
+        `key` (clé d'ordonnancement) n'est utile qu'aux envois asynchrones.
+        `on_result` est appelé avec True (accepté) ou False (refusé, injoignable), comme en asynchrone.
+        """
+        status, text = self.send(url, payload, headers)
+        accepted = status is not None and is_accepted(status, ok_statuses)
+        if on_result is not None:
+            on_result(accepted)
+        if accepted:
+            return True
+        if not self.quiet:
+            if status is None:
+                print(f"⚠️ Erreur lors de l'envoi {label}: {text}")
+            else:
+                print(f"⚠️ Erreur {label} (HTTP {status}): {text}")
+
+        if is_retryable(status) and self.on_failure is not None:
+            self.on_failure((url, payload, headers, label, key, ok_statuses))
+        return False
+
+    def close(self):
+        self.session.close()
+
+
+def to_ngsi_entity(entity_id, entity_type, payload, attributes, static_attributes=()):
+    """
+    Traduit un payload IoT Agent en entité NGSI-v2, avec le même mapping que le provisioning
+    du device. Comme l'IoT Agent, les clés non mappées sont transmises telles quelles.
+    """
+    by_object_id = {attr["object_id"]: attr for attr in attributes}
+    by_name = {attr["name"]: attr for attr in attributes}
+
+    entity = {"id": entity_id, "type": entity_type}
+    for key, value in payload.items():
+        if value is None:
+            continue
+        attr = by_object_id.get(key) or by_name.get(key)
+        if attr is not None:
+            entity[attr["name"]] = {"type": attr["type"], "value": value}
+        else:
+            attr_type = "Number" if isinstance(value, (int, float)) else "Text"
+            entity[key] = {"type": attr_type, "value": value}
+    for attr in static_attributes:
+        entity[attr["name"]] = {"type": attr["type"], "value": attr["value"]}
+    return entity
+
+
+def to_ultralight(payload, object_ids):
+    """
+    Encode un payload IoT Agent en mesure UltraLight 2.0 (`ta|12.3|ts|7.8|...`).
+    `object_ids` (nom d'attribut -> object_id, issu du provisioning) raccourcit les clés déjà
+    exprimées en nom NGSI ; les autres clés sont transmises telles quelles.
+    """
+    fields = []
+    for key, value in payload.items():
+        if value is None:
+            continue
+        text = str(value)
+        if "|" in text or "#" in text:
+            raise ValueError(f"Valeur non encodable en UltraLight pour {key} : {text!r}")
+        fields.append(f"{object_ids.get(key, key)}|{text}")
+    return "|".join(fields)
+
+
+class TickBatcher:
+    """
+    Regroupe tous les payloads nettoyés d'un timestamp et les envoie en fin de tick.
+    - mode "iota"        : un POST par device vers l'IoT Agent, sur la session partagée, en JSON ou
+                           en UltraLight 2.0 (payload_format). Avec measures_per_post > 1, les mesures
+                           d'un device sont accumulées sur plusieurs ticks et envoyées en une requête
+                           multi-mesures (tableau JSON, ou groupes séparés par `#` en UltraLight)
+    - mode "orion_batch" : quelques POST /v2/op/update vers Orion (batch_size entités par requête)
+    """
+
+    def __init__(self, sender, mode, iota_url, orion_batch_url, api_key, headers,
+                 attributes, entity_prefix, entity_type, batch_size=200,
+                 payload_format="json", measures_per_post=1):
+        if mode not in ("iota", "orion_batch"):
+            raise ValueError(f"Mode d'envoi inconnu : {mode}")
+        if payload_format not in ("json", "ultralight"):
+            raise ValueError(f"Format de payload inconnu : {payload_format}")
+        self.sender = sender
+        self.mode = mode
+        self.iota_url = iota_url
+        self.orion_batch_url = orion_batch_url
+        self.api_key = api_key
+        self.headers = headers
+        self.attributes = attributes
+        self.entity_prefix = entity_prefix
+        self.entity_type = entity_type
+        self.batch_size = batch_size
+        self.payload_format = payload_format
+        self.measures_per_post = max(1, measures_per_post)
+        self.object_ids = {attr["name"]: attr["object_id"] for attr in attributes}
+        self.pending = []
+        self.buffered = {}  # device -> payloads pas encore envoyés (mode iota)
+
+    def add(self, device_id, payload, static_attributes=()):
+        self.pending.append((device_id, payload, static_attributes))
+
+    def encode(self, payloads):
+        """Corps d'une requête IoT Agent pour une ou plusieurs mesures d'un même device"""
+        if self.payload_format == "ultralight":
+            return "#".join(to_ultralight(payload, self.object_ids) for payload in payloads)
+        return payloads[0] if len(payloads) == 1 else payloads
+
+    def flush(self, force=False):
+        """
+        Envoie le tick courant. Retourne le nombre de mesures acceptées.
+        `force` envoie aussi les mesures accumulées incomplètes (checkpoint, arrêt).
+        """
+        pending, self.pending = self.pending, []
+        if self.mode == "iota":
+            for device_id, payload, _ in pending:
+                self.buffered.setdefault(device_id, []).append(payload)
+            ready = [d for d, payloads in self.buffered.items() if force or len(payloads) >= self.measures_per_post]
+            sent = 0
+            for device_id in ready:
+                payloads = self.buffered.pop(device_id)
+                url = f"{self.iota_url}?k={self.api_key}&i={device_id}"
+                if self.sender.post(url, self.encode(payloads), label=f"iota {device_id}", key=device_id):
+                    sent += len(payloads)
+            return sent
+
+        sent = 0
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            entities = [
+                to_ngsi_entity(self.entity_prefix + device_id, self.entity_type, payload,
+                               self.attributes, static_attributes)
+                for device_id, payload, static_attributes in chunk
+            ]
+            body = {"actionType": "append", "entities": entities}
+            if self.sender.post(self.orion_batch_url, body, headers=self.headers,
+                                label=f"orion batch ({len(entities)} entités)", key=f"batch-{start}"):
+                sent += len(chunk)
+        return sent
@@ -0,0 +1,89 @@
+import multiprocessing as mp
+import queue
+import zlib
+from collections import Counter
+
+
+def shard_of(device_id, n_shards):
+    """Partition stable d'un cluster (identique d'un démarrage à l'autre, contrairement à hash())"""
+    return zlib.crc32(str(device_id).encode()) % n_shards
+
+
+class ShardedRunner:
+    """
+    Coordinateur multi-processus : chaque worker possède une partition fixe des clusters
+    (état de nettoyage et envois compris). Le coordinateur découpe chaque paquet par partition
+    et l'envoie au worker concerné via une file bornée, ce qui conserve l'ordre par device.
+
+    `worker_target(shard, inbox, outbox, *worker_args)` doit consommer l'inbox jusqu'à None
+    puis déposer (shard, Counter de statistiques) dans l'outbox.
+    """
+
+    def __init__(self, n_shards, worker_target, worker_args=(), queue_size=8):
+        self.n_shards = n_shards
+        self.shard_cache = {}
+        self.outbox = mp.Queue()
+        self.inboxes = [mp.Queue(maxsize=queue_size) for _ in range(n_shards)]
+        self.processes = [
+            mp.Process(target=worker_target, args=(shard, inbox, self.outbox) + tuple(worker_args),
+                       name=f"gateway-shard-{shard}")
+            for shard, inbox in enumerate(self.inboxes)
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        return self
+
+    def _shards(self, device_ids):
+        shards = []
+        for device_id in device_ids:
+            shard = self.shard_cache.get(device_id)
+            if shard is None:
+                shard = self.shard_cache[device_id] = shard_of(device_id, self.n_shards)
+            shards.append(shard)
+        return shards
+
+    def _put(self, shard, item):
+        """Dépôt bloquant dans l'inbox d'un worker, en vérifiant qu'il est toujours vivant"""
+        while True:
+            try:
+                self.inboxes[shard].put(item, timeout=1)
+                return
+            except queue.Full:
+                if not self.processes[shard].is_alive():
+                    raise RuntimeError(f"Le worker {shard} s'est arrêté (code {self.processes[shard].exitcode})")
+
+    def submit(self, timestamp, group):
+        """Route un paquet vers les workers (bloque si un worker a trop de retard)"""
+        shards = self._shards(group['cluster_id'])
+        for shard, part in group.groupby(shards, sort=False):
+            self._put(shard, (timestamp, part))
+
+    def finish(self):
+        """Termine les workers et fusionne leurs statistiques"""
+        for shard in range(self.n_shards):
+            if self.processes[shard].is_alive():
+                self._put(shard, None)
+
+        stats = Counter()
+        pending = self.n_shards
+        while pending:
+            try:
+                _, shard_stats = self.outbox.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in self.processes):
+                    print(f"⚠️ {pending} worker(s) arrêté(s) sans bilan, statistiques incomplètes")
+                    break
+                continue
+            stats.update(shard_stats)
+            pending -= 1
+
+        for process in self.processes:
+            process.join()
+        return stats
+
+    def terminate(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,147 @@
+import json
+import sqlite3
+import threading
+import time
+
+from sender import is_accepted, is_retryable
+
+# Politiques quand le spool atteint sa taille maximale
+EVICTION_POLICIES = ("drop_oldest", "drop_newest")
+
+
+class Spool:
+    """
+    File persistante (SQLite en mode WAL, en ajout seul) des envois qui n'ont pas pu partir.
+    Un job = (url, payload, headers, label, key, ok_statuses), rejoué dans l'ordre d'arrivée.
+    """
+
+    def __init__(self, path, max_items=100000, eviction="drop_oldest"):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Politique d'éviction inconnue : {eviction}")
+        self.max_items = max_items
+        self.eviction = eviction
+        self.evicted = 0
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created REAL NOT NULL,"
+            " job TEXT NOT NULL)"
+        )
+        self.count = self.db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def __len__(self):
+        return self.count
+
+    def append(self, job):
+        """Ajoute un job. Retourne False s'il a été rejeté (spool plein, politique drop_newest)"""
+        with self.lock:
+            if self.count >= self.max_items:
+                if self.eviction == "drop_newest":
+                    self.evicted += 1
+                    return False
+                overflow = self.count - self.max_items + 1
+                self.db.execute(
+                    "DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)", (overflow,)
+                )
+                self.count -= overflow
+                self.evicted += overflow
+            self.db.execute("INSERT INTO spool (created, job) VALUES (?, ?)", (time.time(), json.dumps(job)))
+            self.count += 1
+            return True
+
+    def peek(self, limit):
+        """Les `limit` jobs les plus anciens : [(id, job), ...]"""
+        with self.lock:
+            rows = self.db.execute("SELECT id, job FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, json.loads(job)) for row_id, job in rows]
+
+    def ack(self, ids):
+        """Supprime les jobs rejoués"""
+        if not ids:
+            return
+        with self.lock:
+            cursor = self.db.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+            self.count -= cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class SpoolingSender:
+    """
+    Store-and-forward devant un transport (HttpSender ou AsyncSendPipeline) :
+    - un envoi en échec transitoire est écrit dans le spool au lieu d'être perdu
+    - tant que le spool n'est pas vide, les nouveaux envois y vont directement
+      (ordre conservé, et plus d'attente du timeout à chaque appel)
+    - un thread de fond rejoue le spool par lots, dans l'ordre, dès que le serveur répond
+    """
+
+    def __init__(self, inner, spool, drain_sender, interval=2.0, batch_size=100, quiet=False):
+        self.inner = inner
+        self.quiet = quiet  # pas d'affichage par envoi (taille du spool dans les métriques)
+        self.spool = spool
+        self.drain_sender = drain_sender
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self.inner.on_failure = self.on_failure
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._drain_loop, name="spool-drain", daemon=True)
+
+    def start(self):
+        if len(self.spool):
+            print(f"📦 {len(self.spool)} envois en attente dans le spool, reprise de la vidange...")
+        self.thread.start()
+        return self
+
+    def on_failure(self, job):
+        if self.spool.append(list(job)) and not self.quiet:
+            print(f"   📦 Envoi {job[3]} mis en attente dans le spool ({len(self.spool)} en attente)")
+
+    def post(self, url, payload, headers=None, label="", key=None, ok_statuses=None, on_result=None):
+        if len(self.spool):
+            # Résultat connu seulement à la vidange du spool
+            if on_result is not None:
+                on_result(None)
+            return self.spool.append([url, payload, headers, label, key, ok_statuses])
+        return self.inner.post(url, payload, headers=headers, label=label, key=key, ok_statuses=ok_statuses,
+                               on_result=on_result)
+
+    def drain_once(self):
+        """Rejoue un lot. Retourne False si le serveur est toujours injoignable"""
+        acked = []
+        try:
+            for row_id, (url, payload, headers, label, key, ok_statuses) in self.spool.peek(self.batch_size):
+                status, text = self.drain_sender.send(url, payload, headers)
+                if is_retryable(status):
+                    return False
+                if not is_accepted(status, ok_statuses) and not self.quiet:
+                    print(f"⚠️ Envoi {label} rejeté lors de la reprise (HTTP {status}): {text}")
+                acked.append(row_id)
+            return True
+        finally:
+            self.spool.ack(acked)
+
+    def _drain_loop(self):
+        while not self.stop_event.is_set():
+            if not len(self.spool) or not self.drain_once():
+                self.stop_event.wait(self.interval)
+            elif not len(self.spool):
+                print("📦 Spool vidé, reprise des envois directs.")
+
+    def close(self):
+        """Termine les envois en cours puis arrête la vidange (le reste sera repris au prochain démarrage)"""
+        self.inner.close()
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.drain_sender.close()
+        if len(self.spool):
+            print(f"📦 {len(self.spool)} envois restent dans le spool pour le prochain démarrage.")
+        self.spool.close()
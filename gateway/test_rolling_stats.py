@@ -0,0 +1,54 @@
+"""
+Le nettoyage valeur par valeur doit rester identique à celui d'origine (deque + np.mean / np.std)
+sur les données d'exemple :  cd gateway && python -m pytest test_rolling_stats.py
+"""
+import os
+from collections import Counter, defaultdict, deque
+
+import numpy as np
+import pytest
+from smartfarm_replay import iter_replay
+
+import cleaner
+from rolling_stats import RollingWindow
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensor_data_raw_dirty.csv")
+
+
+class BaselineWindow(deque):
+    """Fenêtre du nettoyage d'origine : statistiques recalculées par NumPy à chaque appel"""
+
+    def mean(self):
+        return np.mean(list(self))
+
+    def std(self):
+        return np.std(list(self))
+
+
+def clean_sample(memory_factory):
+    gateway = cleaner.SensorGateway()
+    gateway.memory = defaultdict(lambda: defaultdict(memory_factory))
+    sensor_cols = [c for c in cleaner.THRESHOLDS if c in cleaner.read_columns(SAMPLE_FILE)]
+    output, stats = [], Counter()
+    for ts, group in iter_replay(SAMPLE_FILE):
+        output.extend(cleaner.clean_group_per_value(gateway, group, sensor_cols, ts.isoformat(), stats))
+    return output, stats
+
+
+@pytest.mark.parametrize("sigma", [0, 1.5])
+def test_per_value_cleaning_matches_baseline(monkeypatch, sigma):
+    monkeypatch.setattr(cleaner, "STAT_OUTLIER_SIGMA", sigma)
+    expected, expected_stats = clean_sample(lambda: BaselineWindow(maxlen=5))
+    got, got_stats = clean_sample(lambda: RollingWindow(maxlen=5))
+    assert got == expected
+    assert got_stats == expected_stats
+
+
+def test_window_statistics_match_numpy():
+    rng = np.random.default_rng(0)
+    window, baseline = RollingWindow(maxlen=5), deque(maxlen=5)
+    for value in np.round(rng.normal(50, 30, 20000), 2).tolist():
+        window.append(value)
+        baseline.append(value)
+        assert window.mean() == np.mean(baseline)
+        assert window.std() == np.std(baseline)
@@ -1,83 +1,135 @@
+import argparse
+
 import pandas as pd
 import numpy as np
-import random
 
 INPUT_FILE = '../docker/serviceIA/donnees_spatiales_cluster.csv'
 OUTPUT_FILE = 'sensor_data_raw_dirty.csv'
 
 PROB_OUTLIER = 0.02   # Valeur extrême
 PROB_MISSING = 0.03   # Valeur manquante (NaN)
-PROB_FREEZE = 0.05    # Capteur bloqué (répète la valeur précédente)
-
-
-def introduce_chaos(df):
-    df_dirty = df.copy()
-    
-    if 'x' in df_dirty.columns:
-        df_dirty = df_dirty.drop(columns=['x'])
-    if 'y' in df_dirty.columns:
-        df_dirty = df_dirty.drop(columns=['y'])
-    
-    sensor_cols = [
-        'temperature', 'soilTemperature', 'humidity', 'soilMoisture', 
-        'azote_mg_kg', 'phosphore_mg_kg', 'potassium_mg_kg', 'ph'
-    ]
-    
-    actual_cols = [c for c in sensor_cols if c in df.columns]
-    
+
+OUTLIER_FACTORS = np.array([-1, 0.2, 5])  # Soit negatif, soit tres petit, soit tres grand
+NOISE_RATIO = 0.1                          # Bruit de fond : 10% de l'écart type de la colonne
+
+FROZEN_CLUSTERS = 1   # Capteurs bloqués (répètent la même valeur)
+FREEZE_LENGTH = 0     # Durée du blocage en timestamps (0 : jusqu'à la fin du fichier)
+
+SENSOR_COLS = [
+    'temperature', 'soilTemperature', 'humidity', 'soilMoisture',
+    'azote_mg_kg', 'phosphore_mg_kg', 'potassium_mg_kg', 'ph'
+]
+
+
+def freeze_sensors(df, values, actual_cols, rng, frozen_clusters=FROZEN_CLUSTERS, freeze_length=FREEZE_LENGTH):
+    """
+    Bloque une colonne de `frozen_clusters` clusters tirés au hasard, chacun à partir d'un timestamp
+    aléatoire et pendant `freeze_length` timestamps (un entier, ou un intervalle (min, max) tiré par
+    cluster ; 0 : jusqu'à la fin). La valeur gelée est la première de la fenêtre.
+    """
+    cluster_codes, clusters = pd.factorize(df['cluster_id'])
+    ts_codes, timestamps = pd.factorize(df['timestamp'], sort=True)
+    n_frozen = min(frozen_clusters, len(clusters))
+    if n_frozen <= 0:
+        return
+
+    frozen = rng.choice(len(clusters), size=n_frozen, replace=False)
+    columns = rng.integers(len(actual_cols), size=n_frozen)
+    starts = rng.integers(len(timestamps), size=n_frozen)
+    low, high = freeze_length if isinstance(freeze_length, tuple) else (freeze_length, freeze_length)
+    lengths = rng.integers(low, high + 1, size=n_frozen)
+    ends = np.where(lengths > 0, starts + lengths, len(timestamps))
+
+    # Paramètres indexés par code de cluster (-1 : cluster non bloqué)
+    frozen_col = np.full(len(clusters), -1)
+    frozen_col[frozen] = columns
+    start_of = np.zeros(len(clusters), dtype=np.int64)
+    start_of[frozen] = starts
+    end_of = np.zeros(len(clusters), dtype=np.int64)
+    end_of[frozen] = ends
+
+    row_cols = frozen_col[cluster_codes]
+    rows = np.flatnonzero((row_cols >= 0) & (ts_codes >= start_of[cluster_codes]) & (ts_codes < end_of[cluster_codes]))
+    if len(rows) == 0:
+        return
+    row_clusters = cluster_codes[rows]
+
+    # Première ligne de chaque fenêtre (ordre du fichier) : valeur gelée de son cluster
+    _, first = np.unique(row_clusters, return_index=True)
+    freeze_value = np.full(len(clusters), np.nan)
+    freeze_value[row_clusters[first]] = values[rows[first], row_cols[rows[first]]]
+    values[rows, row_cols[rows]] = freeze_value[row_clusters]
+
+    for c, col, start, end in zip(frozen, columns, starts, ends):
+        print(f"⚠️ Le capteur {clusters[c]} a buggé sur la colonne {actual_cols[col]} "
+              f"de {timestamps[start]} à {timestamps[min(end, len(timestamps)) - 1]}")
+        print(f"   ❄️ Valeur gelée initiale: {freeze_value[c]}")
+
+
+def introduce_chaos(df, rng=None, frozen_clusters=FROZEN_CLUSTERS, freeze_length=FREEZE_LENGTH):
+    """Bruit, outliers, NaN et capteurs bloqués, par masques sur tout le tableau (devices x métriques)"""
+    rng = np.random.default_rng(rng)
+    df_dirty = df.drop(columns=[c for c in ('x', 'y') if c in df.columns])
+
+    actual_cols = [c for c in SENSOR_COLS if c in df.columns]
+    values = df_dirty[actual_cols].to_numpy(dtype=float)
+
     print("--- 1. Ajout de Bruit de fond (Léger) ---")
-    for col in actual_cols:
-        # Bruit normal (Sigma variable selon la colonne)
-        noise_level = df[col].std() * 0.1 # 10% de l'écart type
-        noise = np.random.normal(0, noise_level, size=len(df))
-        df_dirty[col] += noise
+    # Bruit normal (Sigma variable selon la colonne)
+    noise_levels = np.nanstd(values, axis=0, ddof=1) * NOISE_RATIO
+    values += rng.normal(0, 1, size=values.shape) * noise_levels
 
     print("--- 2. Injection d'Anomalies ---")
-    for i in range(len(df_dirty)):
-        # On parcourt chaque ligne
-        for col in actual_cols:
-            dice = random.random()
-            
-            # A. Valeur Aberrante (Outlier)
-            if dice < PROB_OUTLIER:
-                # Soit negatif, soit tres grand, soit tres petit
-                factor = random.choice([-1, 0.2, 5])
-                print(f"⚠️ Outlier injecté à l'index {i}, colonne {col}")
-                df_dirty.at[i, col] = df_dirty.at[i, col] * factor
-            
-            # B. Donnée manquante
-            elif dice < PROB_OUTLIER + PROB_MISSING:
-                df_dirty.at[i, col] = np.nan
+    dice = rng.random(values.shape)
+    # A. Valeur Aberrante (Outlier)
+    outliers = dice < PROB_OUTLIER
+    values[outliers] *= rng.choice(OUTLIER_FACTORS, size=int(outliers.sum()))
+    # B. Donnée manquante
+    missing = (dice >= PROB_OUTLIER) & (dice < PROB_OUTLIER + PROB_MISSING)
+    values[missing] = np.nan
+    print(f"⚠️ {int(outliers.sum())} outliers et {int(missing.sum())} valeurs manquantes injectés "
+          f"sur {values.size} valeurs")
 
     print("--- 3. Simulation Capteurs Bloqués (Freeze) ---")
-    # On choisit un cluster au hasard qui va "bugger" a un moment donné
-    broken_cluster = random.choice(df['cluster_id'].unique())
-    bugged_col = random.choice(actual_cols)
-    timestampStop = random.choice(df_dirty['timestamp'].unique())
-    print(f"⚠️ Le capteur {broken_cluster} a buggé sur la colonne {bugged_col} à partir de {timestampStop}")
-
-    freeze_value = None
-    for i in range(len(df_dirty)):
-        row = df_dirty.iloc[i]
-        if row['cluster_id'] == broken_cluster and row['timestamp'] >= timestampStop:
-            if freeze_value is None:
-                freeze_value = row[bugged_col]
-                print(f"   ❄️ Valeur gelée initiale: {freeze_value}")
-            df_dirty.at[i, bugged_col] = freeze_value
+    freeze_sensors(df_dirty, values, actual_cols, rng, frozen_clusters, freeze_length)
+
+    df_dirty[actual_cols] = values
     return df_dirty
 
-# Exécution
-try:
-    df = pd.read_csv(INPUT_FILE)
-    
-    df_out = introduce_chaos(df)
-    
+
+def parse_length(text):
+    """"30" -> 30, "10:60" -> (10, 60)"""
+    if ":" in text:
+        low, high = (int(v) for v in text.split(":", 1))
+        return low, high
+    return int(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un fichier de capteurs bruité (outliers, NaN, gels)")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--seed", type=int, help="Graine du générateur (résultat reproductible)")
+    parser.add_argument("--frozen-clusters", type=int, default=FROZEN_CLUSTERS, help="Nombre de capteurs bloqués")
+    parser.add_argument("--freeze-length", type=parse_length, default=FREEZE_LENGTH, metavar="N | MIN:MAX",
+                        help="Durée des blocages en timestamps (0 : jusqu'à la fin)")
+    args = parser.parse_args()
+
+    try:
+        df = pd.read_csv(args.input)
+    except FileNotFoundError:
+        print(f"❌ Erreur: Le fichier {args.input} n'existe pas. Créez-le d'abord.")
+        return
+
+    df_out = introduce_chaos(df, args.seed, args.frozen_clusters, args.freeze_length)
+
     # Arrondir pour faire "vrai capteur"
     df_out = df_out.round(2)
-    
-    df_out.to_csv(OUTPUT_FILE, index=False)
-    print(f"✅ Fichier bruité généré : {OUTPUT_FILE}")
+
+    df_out.to_csv(args.output, index=False)
+    print(f"✅ Fichier bruité généré : {args.output}")
     print(df_out.head(10))
 
-except FileNotFoundError:
-    print(f"❌ Erreur: Le fichier {INPUT_FILE} n'existe pas. Créez-le d'abord.")
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
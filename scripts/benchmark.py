@@ -0,0 +1,230 @@
+"""
+Benchmark de bout en bout sur la doublure locale FIWARE (scripts/fiware_standin.py).
+
+Démarre la doublure, les services IA et Notification (uvicorn), crée les souscriptions de setup.sh,
+puis rejoue le fichier de la gateway (cleaner.py) pendant que le service de Décision tourne en
+boucle. Affiche pour chaque étape le nombre de messages, le débit et les latences p50/p95/p99.
+
+    python scripts/benchmark.py
+    python scripts/benchmark.py --rows 500 --gateway-env ASYNC_SEND=true --json bench.json
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from fiware_standin import FiwareStandIn
+
+ROOT = Path(__file__).resolve().parent.parent
+GATEWAY_DIR = ROOT / "gateway"
+SERVICE_IA_DIR = ROOT / "docker" / "serviceIA"
+SERVICE_NOTIF_DIR = ROOT / "docker" / "serviceNotif"
+SERVICE_DECISION_FILE = ROOT / "docker" / "serviceDecision" / "main.py"
+
+API_KEY = "benchmark"
+
+
+def subscriptions(ai_url, notif_url):
+    """Mêmes souscriptions que scripts/setup.sh (hors QuantumLeap), vers les services locaux"""
+    return [
+        {
+            "description": "service IA",
+            "subject": {
+                "entities": [{"idPattern": ".*", "type": "Cluster"}],
+                "condition": {"attrs": ["temperature", "humidity", "soilMoisture", "soilTemperature"]},
+            },
+            "notification": {
+                "http": {"url": ai_url},
+                "attrs": ["temperature", "soilTemperature", "humidity", "soilMoisture"],
+            },
+        },
+        {
+            "description": "service Notif",
+            "subject": {
+                "entities": [{"idPattern": ".*", "type": "Cluster"}],
+                "condition": {"attrs": ["irrigationrecommendation", "state"]},
+            },
+            "notification": {
+                "http": {"url": notif_url},
+                "attrs": ["irrigationrecommendation", "state"],
+            },
+        },
+    ]
+
+
+def start_service(name, directory, port, env, log_dir):
+    """Lance un service FastAPI avec uvicorn et attend son /health"""
+    log = open(log_dir / f"{name}.log", "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=directory, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Le service {name} s'est arrêté au démarrage (voir {log.name})")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                print(f"   ✅ {name} prêt sur le port {port}")
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Le service {name} ne répond pas (voir {log.name})")
+
+
+def load_decision_service(orion_base):
+    """Importe serviceDecision/main.py (sans lancer sa boucle) en le pointant sur la doublure"""
+    os.environ["ORION_HOST"] = f"{orion_base}/v2/entities"
+    spec = importlib.util.spec_from_file_location("service_decision", SERVICE_DECISION_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.logger.setLevel(logging.WARNING)  # une ligne par zone et par cycle sinon
+    return module
+
+
+def run_decision_loop(decision, stats, interval, stop_event):
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        decision.run_decision_cycle()
+        stats.record("cycle service Décision", start)
+        stop_event.wait(interval)
+
+
+def prepare_input(path, rows, work_dir):
+    """Copie des `rows` premières lignes du fichier (tout le fichier si rows vaut 0)"""
+    if not rows:
+        return path
+    subset = work_dir / f"input_{rows}.csv"
+    with open(path) as src, open(subset, "w") as dst:
+        for i, line in enumerate(src):
+            if i > rows:
+                break
+            dst.write(line)
+    return subset
+
+
+def print_report(summary, duration, measures):
+    print(f"\n📊 Résultats ({measures} mesures en {duration:.1f} s, {measures / duration:.0f} mesures/s de bout en bout)")
+    width = max(len(stage) for stage in summary) if summary else 10
+    print(f"   {'Étape':<{width}} {'msgs':>7} {'msg/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage in sorted(summary):
+        s = summary[stage]
+        rate = f"{s['rate']:.1f}" if s["rate"] else "-"
+        print(f"   {stage:<{width}} {s['count']:>7} {rate:>9} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local gateway -> FIWARE -> services")
+    parser.add_argument("--input", default=str(GATEWAY_DIR / "sensor_data_raw_dirty.csv"),
+                        help="Fichier rejoué par la gateway")
+    parser.add_argument("--rows", type=int, default=0, help="Limite le nombre de lignes rejouées (0 : tout)")
+    parser.add_argument("--port", type=int, default=17026, help="Port de la doublure FIWARE")
+    parser.add_argument("--ai-port", type=int, default=18001)
+    parser.add_argument("--notif-port", type=int, default=18002)
+    parser.add_argument("--notify-workers", type=int, default=4, help="Threads de notification de la doublure")
+    parser.add_argument("--tick-interval", type=float, default=0, help="TICK_INTERVAL de la gateway")
+    parser.add_argument("--decision-interval", type=float, default=1.0, help="Secondes entre deux cycles de Décision")
+    parser.add_argument("--gateway-env", action="append", default=[], metavar="CLE=VALEUR",
+                        help="Variable d'environnement supplémentaire pour cleaner.py (répétable)")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="Attente max des notifications restantes")
+    parser.add_argument("--json", help="Écrit aussi le résultat dans ce fichier JSON")
+    parser.add_argument("--log-dir", help="Dossier des logs des processus (temporaire par défaut)")
+    args = parser.parse_args()
+
+    log_dir = Path(args.log_dir or tempfile.mkdtemp(prefix="smartfarm-bench-"))
+    log_dir.mkdir(parents=True, exist_ok=True)
+    base = f"http://127.0.0.1:{args.port}"
+
+    print(f"🧪 Doublure FIWARE sur {base} (logs dans {log_dir})")
+    standin = FiwareStandIn(notify_workers=args.notify_workers)
+    servers = standin.serve([args.port])
+
+    services = []
+    stop_event = threading.Event()
+    decision_thread = None
+    try:
+        print("🚀 Démarrage des services...")
+        services.append(start_service("serviceIA", SERVICE_IA_DIR, args.ai_port, {"ORION_URL": base}, log_dir))
+        services.append(start_service("serviceNotif", SERVICE_NOTIF_DIR, args.notif_port,
+                                      {"SEND_DISCORD": "false"}, log_dir))
+        for subscription in subscriptions(f"http://127.0.0.1:{args.ai_port}/v2/notify",
+                                          f"http://127.0.0.1:{args.notif_port}/v2/notify"):
+            requests.post(f"{base}/v2/subscriptions", json=subscription).raise_for_status()
+
+        decision = load_decision_service(base)
+        decision_thread = threading.Thread(
+            target=run_decision_loop, args=(decision, standin.stats, args.decision_interval, stop_event),
+            name="decision", daemon=True,
+        )
+
+        input_file = prepare_input(Path(args.input).resolve(), args.rows, log_dir)
+        extra_env = dict(item.split("=", 1) for item in args.gateway_env)
+        iota_resource = "/iot/d" if extra_env.get("PAYLOAD_FORMAT") == "ultralight" else "/iot/json"
+        gateway_env = {
+            **os.environ,
+            "API_KEY": API_KEY,
+            "INPUT_DIRTY_FILE": str(input_file),
+            "IOTA_HTTP_URL": f"{base}{iota_resource}",
+            "IOTA_ADMIN_URL": f"{base}/iot/devices",
+            "ORION_URL": f"{base}/v2/entities",
+            "ORION_BATCH_URL": f"{base}/v2/op/update",
+            "DEVICE_REGISTRY_FILE": str(log_dir / "devices_registry.json"),
+            "SPOOL_FILE": "",
+            "CHECKPOINT_FILE": "",
+            "REPLAY_CURSOR_FILE": "",
+            "PAUSE_KEY": "false",
+            "TICK_INTERVAL": str(args.tick_interval),
+        }
+        gateway_env.update(extra_env)
+
+        print(f"▶️  Rejeu de {input_file} par la gateway...")
+        start = time.perf_counter()
+        decision_thread.start()
+        with open(log_dir / "gateway.log", "w") as log:
+            code = subprocess.run([sys.executable, "cleaner.py"], cwd=GATEWAY_DIR, env=gateway_env,
+                                  stdout=log, stderr=subprocess.STDOUT).returncode
+        if code != 0:
+            print(f"⚠️ La gateway s'est terminée avec le code {code} (voir {log_dir / 'gateway.log'})")
+
+        if not standin.wait_notifications(args.drain_timeout):
+            print(f"⚠️ {standin.pending_notifications()} notifications encore en file après {args.drain_timeout} s")
+        stop_event.set()
+        decision_thread.join()
+        duration = time.perf_counter() - start
+
+        summary = standin.stats.summary()
+        print_report(summary, duration, standin.measures)
+        if standin.measures:
+            route = "/v2/op/update" if "orion POST /v2/op/update" in summary else iota_resource
+            print(f"   Corps des requêtes : {standin.measure_bytes / standin.measures:.0f} octets par mesure ({route})")
+        if standin.notify_errors:
+            print(f"⚠️ {standin.notify_errors} notifications en erreur")
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"duration_s": duration, "stages": summary, "notify_errors": standin.notify_errors,
+                           "measures": standin.measures, "measure_bytes": standin.measure_bytes},
+                          f, indent=2)
+    finally:
+        stop_event.set()
+        for process in services:
+            process.terminate()
+            process.wait()
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
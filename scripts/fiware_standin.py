@@ -0,0 +1,559 @@
+"""
+Doublure locale de la plateforme FIWARE (IoT Agent JSON + Orion), sans Kubernetes.
+
+Implémente uniquement ce que le projet utilise :
+- IoT Agent : POST /iot/services, POST /iot/devices, POST /iot/json?k=&i= (objet ou tableau de mesures),
+              POST /iot/d?k=&i= (UltraLight 2.0, mesures séparées par `#`)
+- Orion     : GET/POST /v2/entities, GET/DELETE /v2/entities/{id}, POST /v2/entities/{id}/attrs,
+              POST /v2/op/update, GET/POST /v2/subscriptions
+- Notifications des souscriptions (POST {"subscriptionId", "data"} vers l'URL abonnée), envoyées
+  par un pool de threads comme Orion, uniquement quand un attribut surveillé change vraiment.
+
+Chaque requête est chronométrée par étape (voir StageStats), consultable sur GET /bench/stats
+et remise à zéro par POST /bench/reset. Utilisé par scripts/benchmark.py.
+
+    python scripts/fiware_standin.py               # écoute sur 7896, 4041 et 1026
+    python scripts/fiware_standin.py --port 8080   # tout sur un seul port
+"""
+import argparse
+import itertools
+import json
+import math
+import queue
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import requests
+
+DEFAULT_PORTS = (7896, 4041, 1026)  # IoT Agent (mesures), IoT Agent (admin), Orion
+DEFAULT_ENTITY_TYPE = "Cluster"
+
+# Attributs écrits en retour par les services (le délai mesure -> écriture est suivi de bout en bout)
+FEEDBACK_ATTRS = ("fieldState",)
+
+
+def percentile(sorted_values, q):
+    """Percentile au rang le plus proche (valeurs déjà triées)"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class StageStats:
+    """Durées par étape : nombre, débit (messages/s sur la fenêtre observée) et p50/p95/p99"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.durations = defaultdict(list)
+            self.first_start = {}
+            self.last_end = {}
+
+    def record(self, stage, start, end=None):
+        end = time.perf_counter() if end is None else end
+        with self.lock:
+            self.durations[stage].append(end - start)
+            self.first_start.setdefault(stage, start)
+            self.last_end[stage] = max(end, self.last_end.get(stage, end))
+
+    def summary(self):
+        with self.lock:
+            stages = {stage: sorted(values) for stage, values in self.durations.items()}
+            windows = {stage: self.last_end[stage] - self.first_start[stage] for stage in stages}
+
+        summary = {}
+        for stage, values in stages.items():
+            window = windows[stage]
+            summary[stage] = {
+                "count": len(values),
+                "rate": len(values) / window if len(values) > 1 and window > 0 else None,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+        return summary
+
+
+def to_attribute(value, attr_type=None):
+    """Attribut NGSI-v2 normalisé (accepte aussi une valeur brute, comme options=keyValues)"""
+    if isinstance(value, dict) and "value" in value:
+        attr = {"type": value.get("type") or attr_type or infer_type(value["value"]), "value": value["value"]}
+        attr["metadata"] = value.get("metadata", {})
+        return attr
+    return {"type": attr_type or infer_type(value), "value": value, "metadata": {}}
+
+
+def parse_ultralight(text):
+    """Corps UltraLight 2.0 -> liste de mesures {object_id: texte}"""
+    measures = []
+    for group in text.strip().split("#"):
+        fields = group.split("|")
+        if len(fields) % 2:
+            raise ValueError(f"Mesure UltraLight invalide : {group!r}")
+        measures.append(dict(zip(fields[::2], fields[1::2])))
+    return measures
+
+
+def autocast(value, attr_type):
+    """Valeurs texte (UltraLight) converties selon le type provisionné, comme IOTA_AUTOCAST"""
+    if not isinstance(value, str):
+        return value
+    if attr_type == "Number":
+        return float(value)
+    if attr_type == "Integer":
+        return int(value)
+    return value
+
+
+def infer_type(value):
+    if isinstance(value, bool):
+        return "Boolean"
+    if isinstance(value, (int, float)):
+        return "Number"
+    if isinstance(value, dict):
+        return "StructuredValue"
+    return "Text"
+
+
+class FiwareStandIn:
+    """État partagé (devices, entités, souscriptions) et envoi des notifications"""
+
+    def __init__(self, notify_workers=4, notify_timeout=10, entity_type=DEFAULT_ENTITY_TYPE,
+                 feedback_attrs=FEEDBACK_ATTRS):
+        self.entity_type = entity_type
+        self.feedback_attrs = set(feedback_attrs)
+        self.notify_timeout = notify_timeout
+
+        self.lock = threading.Lock()
+        self.devices = {}        # device_id -> configuration de provisioning
+        self.entities = {}       # entity_id -> {"id", "type", attribut: {...}}
+        self.subscriptions = {}  # subscription_id -> souscription NGSI-v2
+        self.measured_at = {}    # entity_id -> instant de la dernière mesure sans retour des services
+        self.subscription_ids = itertools.count(1)
+
+        self.stats = StageStats()
+        self.notified = 0
+        self.notify_errors = 0
+        self.measures = 0        # mesures reçues (IoT Agent, ou entités de /v2/op/update en mode orion_batch)
+        self.measure_bytes = 0   # taille cumulée des corps de requêtes de mesures
+
+        # Une file par worker : les notifications d'une même entité restent ordonnées
+        self.notify_queues = [queue.Queue() for _ in range(notify_workers)]
+        self.notify_threads = [
+            threading.Thread(target=self._notify_loop, args=(q,), name=f"notify-{i}", daemon=True)
+            for i, q in enumerate(self.notify_queues)
+        ]
+        for thread in self.notify_threads:
+            thread.start()
+
+    # --- IoT Agent ---
+
+    def provision(self, devices):
+        """Retourne la liste des device_id déjà existants (aucun n'est créé dans ce cas, comme l'IoT Agent)"""
+        with self.lock:
+            duplicates = [d["device_id"] for d in devices if d["device_id"] in self.devices]
+            if duplicates:
+                return duplicates
+            for device in devices:
+                self.devices[device["device_id"]] = device
+        return []
+
+    def measure(self, device_id, payload):
+        """Mesure IoT Agent (JSON ou UltraLight décodé) : mapping object_id -> attribut puis mise à jour de l'entité"""
+        with self.lock:
+            self.measures += 1
+            device = self.devices.get(device_id)
+            if device is None:
+                # Auto-provisioning par le service group, comme l'IoT Agent
+                device = self.devices[device_id] = {
+                    "device_id": device_id,
+                    "entity_name": f"{self.entity_type}:{device_id}",
+                    "entity_type": self.entity_type,
+                    "attributes": [],
+                }
+        by_object_id = {attr["object_id"]: attr for attr in device.get("attributes", []) if "object_id" in attr}
+        by_name = {attr["name"]: attr for attr in device.get("attributes", [])}
+
+        attrs = {}
+        for key, value in payload.items():
+            if value is None:
+                continue
+            attr = by_object_id.get(key) or by_name.get(key)
+            if attr is not None:
+                attrs[attr["name"]] = to_attribute(autocast(value, attr["type"]), attr["type"])
+            else:
+                attrs[key] = to_attribute(value)
+
+        entity_id = device.get("entity_name") or f"{self.entity_type}:{device_id}"
+        static = {a["name"]: to_attribute(a["value"], a["type"]) for a in device.get("static_attributes", [])}
+        self.update_entity(entity_id, device.get("entity_type", self.entity_type), attrs,
+                           create=True, static=static, measure=True)
+
+    # --- Orion ---
+
+    def update_entity(self, entity_id, entity_type, attrs, create=False, static=None, measure=False):
+        """Ajoute / met à jour des attributs. Retourne False si l'entité n'existe pas (et create=False)"""
+        now = time.perf_counter()
+        with self.lock:
+            entity = self.entities.get(entity_id)
+            created = entity is None
+            if created:
+                if not create:
+                    return False
+                entity = self.entities[entity_id] = {"id": entity_id, "type": entity_type or self.entity_type}
+                entity.update(static or {})
+
+            changed = set()
+            for name, attr in attrs.items():
+                if entity.get(name) != attr:
+                    entity[name] = attr
+                    changed.add(name)
+
+            if measure:
+                self.measured_at[entity_id] = now
+            elif changed & self.feedback_attrs and entity_id in self.measured_at:
+                self.stats.record("bout en bout mesure -> fieldState", self.measured_at.pop(entity_id), now)
+
+            if created:
+                changed = set(entity) - {"id", "type"}
+            notifications = self._matching_notifications(entity, changed)
+
+        for subscription, data in notifications:
+            self._enqueue_notification(entity_id, subscription, data)
+        return True
+
+    def create_entity(self, body):
+        entity_id = body.get("id")
+        with self.lock:
+            exists = entity_id in self.entities
+        if not entity_id or exists:
+            return False
+        attrs = {k: to_attribute(v) for k, v in body.items() if k not in ("id", "type")}
+        return self.update_entity(entity_id, body.get("type"), attrs, create=True)
+
+    def delete_entity(self, entity_id):
+        with self.lock:
+            self.measured_at.pop(entity_id, None)
+            return self.entities.pop(entity_id, None) is not None
+
+    def query(self, entity_type=None, id_pattern=None, limit=20, offset=0, key_values=False):
+        with self.lock:
+            entities = [e for e in self.entities.values() if entity_type is None or e["type"] == entity_type]
+            if id_pattern:
+                pattern = re.compile(id_pattern)
+                entities = [e for e in entities if pattern.fullmatch(e["id"])]
+            entities = [dict(e) for e in entities[offset:offset + limit]]
+        if key_values:
+            return [{k: (v["value"] if isinstance(v, dict) else v) for k, v in e.items()} for e in entities]
+        return entities
+
+    def get_entity(self, entity_id, key_values=False):
+        result = self.query(id_pattern=re.escape(entity_id), limit=1, key_values=key_values)
+        return result[0] if result else None
+
+    # --- Souscriptions ---
+
+    def subscribe(self, body):
+        subscription_id = f"{next(self.subscription_ids):024x}"
+        subject = body.get("subject", {})
+        with self.lock:
+            self.subscriptions[subscription_id] = {
+                "id": subscription_id,
+                "description": body.get("description", ""),
+                "entities": subject.get("entities", [{"idPattern": ".*"}]),
+                "condition_attrs": set(subject.get("condition", {}).get("attrs", [])),
+                "url": body["notification"]["http"]["url"],
+                "attrs": body["notification"].get("attrs", []),
+            }
+        return subscription_id
+
+    def _matching_notifications(self, entity, changed):
+        """Souscriptions déclenchées par les attributs modifiés (appelé sous le verrou)"""
+        if not changed:
+            return []
+        notifications = []
+        for subscription in self.subscriptions.values():
+            if subscription["condition_attrs"] and not changed & subscription["condition_attrs"]:
+                continue
+            if not any(self._entity_matches(entity, selector) for selector in subscription["entities"]):
+                continue
+            data = {"id": entity["id"], "type": entity["type"]}
+            for name, attr in entity.items():
+                if name not in ("id", "type") and (not subscription["attrs"] or name in subscription["attrs"]):
+                    data[name] = attr
+            notifications.append((subscription, data))
+        return notifications
+
+    @staticmethod
+    def _entity_matches(entity, selector):
+        if "type" in selector and selector["type"] != entity["type"]:
+            return False
+        if "id" in selector:
+            return selector["id"] == entity["id"]
+        return re.fullmatch(selector.get("idPattern", ".*"), entity["id"]) is not None
+
+    def _enqueue_notification(self, entity_id, subscription, data):
+        partition = zlib.crc32(entity_id.encode()) % len(self.notify_queues)
+        self.notify_queues[partition].put((subscription, data, time.perf_counter()))
+
+    def _notify_loop(self, notify_queue):
+        session = requests.Session()
+        while True:
+            subscription, data, queued = notify_queue.get()
+            stage = f"notify {subscription['description'] or subscription['url']}"
+            start = time.perf_counter()
+            try:
+                body = {"subscriptionId": subscription["id"], "data": [data]}
+                res = session.post(subscription["url"], json=body, timeout=self.notify_timeout)
+                ok = res.status_code < 400
+            except requests.RequestException:
+                ok = False
+            end = time.perf_counter()
+            self.stats.record(stage, start, end)
+            self.stats.record(f"{stage} (attente incluse)", queued, end)
+            with self.lock:
+                self.notified += 1
+                self.notify_errors += not ok
+            notify_queue.task_done()
+
+    def pending_notifications(self):
+        return sum(q.unfinished_tasks for q in self.notify_queues)
+
+    def wait_notifications(self, timeout=None):
+        """Attend que toutes les notifications en file soient parties. Retourne False au timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending_notifications():
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    # --- Serveur HTTP ---
+
+    def serve(self, ports, host="127.0.0.1"):
+        """Démarre un serveur par port (mêmes données derrière chacun). Retourne les serveurs"""
+        handler = type("Handler", (StandInHandler,), {"standin": self})
+        servers = []
+        for port in ports:
+            server = ThreadingHTTPServer((host, port), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name=f"standin-{port}", daemon=True).start()
+            servers.append(server)
+        return servers
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, comme les vrais composants
+    standin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        data = b"" if body is None else json.dumps(body).encode()
+        self.status = status
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, error, description):
+        self._reply(status, {"error": error, "description": description})
+
+    def _raw_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _body(self):
+        return json.loads(self._raw_body() or b"{}")
+
+    def _route(self, method):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        path = unquote(url.path).rstrip("/")
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            stage = self.dispatch(method, path, params)
+        except (ValueError, KeyError, TypeError) as e:
+            stage = None
+            self._error(400, "BadRequest", str(e))
+        if stage:
+            # Réponses en erreur (404 d'une entité inconnue...) comptées à part, pas dans le débit de l'étape
+            if self.status >= 400:
+                stage = f"{stage} (HTTP {self.status})"
+            self.standin.stats.record(stage, start)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    def dispatch(self, method, path, params):
+        """Traite la requête et retourne le nom de l'étape à chronométrer (None : pas de mesure)"""
+        standin = self.standin
+        key_values = "keyValues" in params.get("options", "")
+
+        if method == "POST" and path in ("/iot/json", "/iot/d"):
+            if "i" not in params:
+                self._error(400, "MANDATORY_PARAMS_NOT_FOUND", "Parameter i is missing")
+                return None
+            body = self._raw_body()
+            if path == "/iot/d":
+                measures = parse_ultralight(body.decode())
+            else:
+                payload = json.loads(body or b"{}")
+                measures = payload if isinstance(payload, list) else [payload]
+            with standin.lock:
+                standin.measure_bytes += len(body)
+            for payload in measures:
+                standin.measure(params["i"], payload)
+            self._reply(200, {})
+            return f"iota {path}"
+
+        if method == "POST" and path == "/iot/devices":
+            duplicates = standin.provision(self._body().get("devices", []))
+            if duplicates:
+                self._error(409, "DUPLICATE_DEVICE_ID", f"Duplicate device id: {duplicates[0]}")
+            else:
+                self._reply(201, {})
+            return "iota /iot/devices"
+
+        if method == "POST" and path == "/iot/services":
+            self._reply(201, {})
+            return None
+
+        if path == "/v2/entities":
+            if method == "GET":
+                entities = standin.query(
+                    params.get("type"), params.get("idPattern"),
+                    int(params.get("limit", 20)), int(params.get("offset", 0)), key_values,
+                )
+                self._reply(200, entities)
+                return "orion GET /v2/entities"
+            if method == "POST":
+                if standin.create_entity(self._body()):
+                    self._reply(201)
+                else:
+                    self._error(422, "Unprocessable", "Already Exists")
+                return "orion POST /v2/entities"
+
+        match = re.fullmatch(r"/v2/entities/([^/]+)(/attrs)?", path)
+        if match:
+            entity_id, attrs = match.groups()
+            if method == "POST" and attrs:
+                body = {name: to_attribute(value) for name, value in self._body().items()}
+                if standin.update_entity(entity_id, None, body):
+                    self._reply(204)
+                else:
+                    self._error(404, "NotFound", "The requested entity has not been found. Check type and id")
+                return "orion POST /v2/entities/{id}/attrs"
+            if method == "GET" and not attrs:
+                entity = standin.get_entity(entity_id, key_values)
+                if entity is None:
+                    self._error(404, "NotFound", "The requested entity has not been found. Check type and id")
+                else:
+                    self._reply(200, entity)
+                return "orion GET /v2/entities/{id}"
+            if method == "DELETE" and not attrs:
+                if standin.delete_entity(entity_id):
+                    self._reply(204)
+                else:
+                    self._error(404, "NotFound", "The requested entity has not been found. Check type and id")
+                return None
+
+        if method == "POST" and path == "/v2/op/update":
+            raw = self._raw_body()
+            body = json.loads(raw or b"{}")
+            measures = 0
+            for entity in body.get("entities", []):
+                attrs = {k: to_attribute(v) for k, v in entity.items() if k not in ("id", "type")}
+                # Écriture en retour des services (fieldState seul) : fin de la mesure de bout en bout
+                is_measure = not set(attrs) <= standin.feedback_attrs
+                standin.update_entity(entity["id"], entity.get("type"), attrs,
+                                      create=body.get("actionType", "append") != "update",
+                                      measure=is_measure)
+                measures += is_measure
+            if measures:
+                with standin.lock:
+                    standin.measures += measures
+                    standin.measure_bytes += len(raw)
+            self._reply(204)
+            return "orion POST /v2/op/update"
+
+        if path == "/v2/subscriptions":
+            if method == "POST":
+                subscription_id = standin.subscribe(self._body())
+                self._reply(201, headers={"Location": f"/v2/subscriptions/{subscription_id}"})
+                return None
+            if method == "GET":
+                with standin.lock:
+                    subscriptions = [
+                        {**s, "condition_attrs": sorted(s["condition_attrs"])} for s in standin.subscriptions.values()
+                    ]
+                self._reply(200, subscriptions)
+                return None
+
+        if path == "/bench/stats" and method == "GET":
+            self._reply(200, {
+                "stages": standin.stats.summary(),
+                "pending_notifications": standin.pending_notifications(),
+                "notify_errors": standin.notify_errors,
+                "measures": standin.measures,
+                "measure_bytes": standin.measure_bytes,
+            })
+            return None
+
+        if path == "/bench/reset" and method == "POST":
+            standin.stats.reset()
+            with standin.lock:
+                standin.measures = standin.measure_bytes = 0
+            self._reply(204)
+            return None
+
+        if path == "/version" and method == "GET":
+            self._reply(200, {"orion": {"version": "standin"}})
+            return None
+
+        self._error(404, "NotFound", f"{method} {path} non géré par la doublure")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Doublure locale IoT Agent + Orion")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, action="append",
+                        help="Port d'écoute (répétable, défaut : 7896, 4041 et 1026)")
+    parser.add_argument("--notify-workers", type=int, default=4, help="Threads d'envoi des notifications")
+    args = parser.parse_args()
+
+    standin = FiwareStandIn(notify_workers=args.notify_workers)
+    ports = args.port or list(DEFAULT_PORTS)
+    standin.serve(ports, args.host)
+    print(f"🧪 Doublure FIWARE à l'écoute sur {args.host}:{', '.join(map(str, ports))}")
+    print(f"   Statistiques : http://{args.host}:{ports[0]}/bench/stats")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n👋 Arrêt de la doublure.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,21 @@
-import pandas as pd
 import requests
 import time
 from dotenv import load_dotenv
 import os
 
+from smartfarm_replay import iter_replay
+
 load_dotenv()  # charge le .env à la racine
 
 API_KEY = os.getenv("API_KEY")
 IOT_AGENT_URL = "http://localhost:7896/iot/json"
-CSV_FILE = "docker/serviceIA/donnees_spatiales_cluster.csv"
-
-# Chargement
-df = pd.read_csv(CSV_FILE)
-df['timestamp'] = pd.to_datetime(df['timestamp'])
+# CSV ou dossier colonnaire (python -m smartfarm_replay convert <csv> <dossier>), lu en continu
+CSV_FILE = os.getenv("CSV_FILE", "docker/serviceIA/donnees_spatiales_cluster.csv")
+REPLAY_START = os.getenv("REPLAY_START") or None  # Premier timestamp envoyé (ISO)
 
 print(f"🚀 Simulation avec horodatage réel...")
 
-for timestamp, group in df.groupby('timestamp'):
+for timestamp, group in iter_replay(CSV_FILE, start=REPLAY_START):
     # On convertit le timestamp en string ISO 8601
     # Ex: "2024-01-15T14:30:00.000Z"
     iso_date = timestamp.isoformat()